@@ -1,10 +1,5 @@
 import scrapy
 import re
-import time
-import random
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -15,8 +10,74 @@ from selenium.common.exceptions import (
     ElementClickInterceptedException,
     StaleElementReferenceException,
 )
-from webdriver_manager.chrome import ChromeDriverManager
-from scrapy_selenium import SeleniumRequest
+
+from goodreads_scraper import embedded
+from goodreads_scraper.items import ReviewItem
+from goodreads_scraper.pagination import next_review_page, repeats_previous_page
+
+# Clicks every "show more" button of the first arguments[2] cards (all when
+# null) at once, then reports back (through the async script callback) after
+# the DOM has produced no mutations for arguments[0] ms, or after
+# arguments[1] ms at the latest.
+EXPAND_REVIEWS_JS = """
+const [quietMs, timeoutMs, limit, done] = arguments;
+const cards = Array.from(
+    document.querySelectorAll("article.ReviewCard, div.ReviewCard")
+).slice(0, limit === null ? undefined : limit);
+const buttons = cards.flatMap((card) =>
+    Array.from(card.querySelectorAll('button[aria-label="Tap to show more review"]'))
+);
+let quietTimer = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(finish, quietMs);
+});
+const hardTimer = setTimeout(finish, timeoutMs);
+function finish() {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(hardTimer);
+    done(buttons.length);
+}
+observer.observe(document.body, {
+    childList: true,
+    subtree: true,
+    attributes: true,
+    characterData: true,
+});
+buttons.forEach((button) => button.click());
+quietTimer = setTimeout(finish, quietMs);
+"""
+
+# Reads the first arguments[0] review cards (all when null) in a single
+# WebDriver round trip. Each field tries the same selectors, in the same
+# order, as the per-card find_element chains in
+# GoodreadsReviewsSpider.extract_reviews.
+EXTRACT_REVIEWS_JS = """
+const limit = arguments[0];
+const first = (card, selectors) => {
+    for (const selector of selectors) {
+        const el = card.querySelector(selector);
+        if (el) return el;
+    }
+    return null;
+};
+return Array.from(
+    document.querySelectorAll("article.ReviewCard, div.ReviewCard")
+).slice(0, limit === null ? undefined : limit).map((card) => {
+    const reviewer = first(card, [".ReviewerProfile__name", "a.user"]);
+    const rating = card.querySelector("span[aria-label]");
+    const date = first(card, [".Text__metadata, .ReviewCard-date"]);
+    const text = first(card, [".TruncatedContent_text--expanded", ".ReviewText"]);
+    return {
+        id: card.id || null,
+        reviewer: reviewer ? reviewer.innerText : null,
+        rating: rating ? rating.getAttribute("aria-label") : null,
+        date: date ? date.innerText : null,
+        text: (text || card).innerText,
+    };
+});
+"""
 
 
 class GoodreadsReviewsSpider(scrapy.Spider):
@@ -32,6 +93,12 @@ class GoodreadsReviewsSpider(scrapy.Spider):
     DEBUG = False
     HEADLESS = True
     CHROME_BINARY_PATH = "/usr/bin/google-chrome-beta"
+    BROWSER_POOL_SIZE = 2  # Chrome instances rendering books in parallel
+    BROWSER_MAX_PAGES_PER_DRIVER = 50  # Restart a driver after this many pages
+    SCRIPT_EXTRACTION = True  # Read all review cards in one execute_script call
+    BATCH_EXPANSION = True  # Click all "show more" buttons in one script call
+    EXPANSION_QUIET_MS = 300  # DOM must stay unchanged this long after clicking
+    EXPANSION_TIMEOUT_MS = 5000
 
     custom_settings = {
         "FEEDS": {
@@ -52,119 +119,211 @@ class GoodreadsReviewsSpider(scrapy.Spider):
                 "overwrite": True,
             },
         },
-        "DOWNLOAD_DELAY": 0,  # We handle delays manually with Selenium
-        "CONCURRENT_REQUESTS": 1,
-        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
-        "DOWNLOADER_MIDDLEWARES": {"scrapy_selenium.SeleniumMiddleware": 800},
-        "SELENIUM_DRIVER_NAME": "chrome",
-        "SELENIUM_DRIVER_EXECUTABLE_PATH": None,  # Will be set by ChromeDriverManager
-        "SELENIUM_DRIVER_ARGUMENTS": [],  # Will be configured in spider
+        # Politeness delay between books, randomized to 0.5x-1.5x by Scrapy
+        "DOWNLOAD_DELAY": (DELAY_MIN + DELAY_MAX) / 2,
+        "RANDOMIZE_DOWNLOAD_DELAY": True,
+        "CONCURRENT_REQUESTS": BROWSER_POOL_SIZE,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": BROWSER_POOL_SIZE,
+        "DOWNLOADER_MIDDLEWARES": {
+            "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+            "goodreads_scraper.middlewares.StatusRetryMiddleware": 550,
+            "goodreads_scraper.middlewares.BrowserEscalationMiddleware": 700,
+        },
+        "DOWNLOAD_HANDLERS": {
+            "http": "goodreads_scraper.browser.BrowserDownloadHandler",
+            "https": "goodreads_scraper.browser.BrowserDownloadHandler",
+        },
+        "MAX_REVIEWS_PER_BOOK": MAX_REVIEWS_PER_BOOK,
+        # Render in Chrome only when the HTTP response lacks full reviews
+        "BROWSER_ESCALATION_ENABLED": True,
+        "BROWSER_POOL_SIZE": BROWSER_POOL_SIZE,
+        "BROWSER_MAX_PAGES_PER_DRIVER": BROWSER_MAX_PAGES_PER_DRIVER,
+        "BROWSER_WAIT_TIME": 15,
+        "BROWSER_BINARY_PATH": CHROME_BINARY_PATH,
+        "BROWSER_DRIVER_ARGUMENTS": [
+            "--incognito",
+            "--disable-extensions",
+            "--disable-plugins",
+            "--disable-popup-blocking",
+            *(["--headless=new"] if HEADLESS else []),
+            "--disable-blink-features=AutomationControlled",
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            "--window-size=1280,720",
+            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+        ],
     }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.driver = None
-        self.setup_selenium()
-
-    def setup_selenium(self):
-        """Configure Chrome WebDriver - preserving original setup logic"""
-        options = Options()
-        options.binary_location = self.CHROME_BINARY_PATH
-        options.add_argument("--incognito")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-plugins")
-        options.add_argument("--disable-popup-blocking")
-
-        if self.HEADLESS:
-            options.add_argument("--headless=new")
-
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--window-size=1280,720")
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+    async def start(self):
+        # Scrapy 2.13+; start_requests() is kept for the ID range
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        """Generate plain HTTP requests for all book IDs"""
+        for book_id in range(self.START_ID, self.END_ID + 1):
+            yield self.book_request(book_id)
+
+    def book_request(self, book_id):
+        """Request for one book page (FrontierMiddleware builds them this way)"""
+        url = f"https://www.goodreads.com/book/show/{book_id}"
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_book_http,
+            meta={
+                "book_id": book_id,
+                "browser_callback": "parse_book_page",
+                "browser_actions": "render_book_page",
+                "browser_wait_for": 'h1[data-testid="bookTitle"], h1.Text__title1',
+            },
         )
 
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
+    def parse_book_http(self, response):
+        """Parse book page from the server-rendered HTML and embedded JSON"""
+        book_id = response.meta["book_id"]
 
-        # Update custom settings for scrapy-selenium
-        self.custom_settings["SELENIUM_DRIVER_ARGUMENTS"] = [
-            arg for arg in options.arguments
-        ]
+        if "Page not found" in response.text:
+            self.logger.info(f"⏩ Skipped book {book_id} - Page not found")
+            response.meta["not_found"] = True
+            return
 
-        # Store options for manual driver creation if needed
-        self.chrome_options = options
+        self.logger.info(f"Processing book ID: {book_id}")
 
-    def start_requests(self):
-        """Generate Selenium requests for all book IDs"""
-        for book_id in range(self.START_ID, self.END_ID + 1):
-            url = f"https://www.goodreads.com/book/show/{book_id}"
-            yield SeleniumRequest(
-                url=url,
-                callback=self.parse_book_page,
-                meta={"book_id": book_id},
-                dont_filter=True,
-                wait_time=15,
-                wait_until=EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, 'h1[data-testid="bookTitle"], h1.Text__title1')
-                ),
-            )
+        book = embedded.extract_book(response, book_id) or {}
+        title = book.get("title") or response.css("h1.Text__title1::text").get()
+        author = book.get("author") or response.css(
+            "span.ContributorLink__name::text"
+        ).get()
+        avg_rating = book.get("avg_rating") or response.css(
+            ".RatingStatistics__rating::text"
+        ).get()
+        ratings_count = book.get("ratings_count")
+        if not ratings_count:
+            count = response.css('[data-testid="ratingsCount"]::text').get()
+            ratings_count = count.split()[0] if count else None
+
+        title = title or "Unknown Title"
+        self.logger.info(f"📖 Book: {title} by {author}")
+        self.logger.info(f"⭐ Avg Rating: {avg_rating} ({ratings_count} ratings)")
+
+        reviews = self.extract_reviews_http(response, book_id)
+
+        self.logger.info(f"📝 Found {len(reviews)} reviews on the page")
+
+        book_fields = {
+            "book_title": self.clean_text(title),
+            "book_author": self.clean_text(author) or "Unknown Author",
+            "book_avg_rating": avg_rating or "N/A",
+            "book_ratings_count": ratings_count or "0",
+        }
+        items = [ReviewItem(**review, **book_fields) for review in reviews]
+        yield from items
+
+        # Further review listing pages, followed over HTTP
+        yield from self.review_page_requests(response, items, book_fields)
+
+        self.logger.info(f"✅ Completed book ID {book_id}: {title}")
+
+    def parse_review_page_http(self, response):
+        """Parse one review listing page of a book"""
+        book_id = response.meta["book_id"]
+        page = response.meta["review_page"]
+
+        reviews = self.extract_reviews_http(
+            response, book_id, limit=response.meta["review_limit"]
+        )
+        self.logger.info(f"📝 Found {len(reviews)} reviews on page {page} of {book_id}")
+
+        book_fields = response.meta["book_fields"]
+        items = [ReviewItem(**review, **book_fields) for review in reviews]
+        if repeats_previous_page(self, response, [i.review_id for i in items]):
+            return
+        yield from items
+
+        yield from self.review_page_requests(response, items, book_fields)
+
+    def review_page_requests(self, response, reviews, book_fields):
+        """Request the next review listing page of the book, if any"""
+        request = next_review_page(
+            self,
+            response,
+            [review.review_id for review in reviews],
+            self.parse_review_page_http,
+            max_reviews=self.review_limit(),
+            book_fields=book_fields,
+        )
+        if request is not None:
+            yield request
+
+    def render_book_page(self, driver, request):
+        """Expand and extract the live page - runs on a browser pool thread"""
+        book_id = request.meta["book_id"]
+
+        # Expand reviews safely - preserving original logic
+        self.expand_reviews_on_page(driver)
+
+        # Extract book details using original Selenium logic
+        return {
+            "title": self.extract_book_title(driver),
+            "author": self.extract_book_author(driver),
+            "avg_rating": self.extract_avg_rating(driver),
+            "ratings_count": self.extract_ratings_count(driver),
+            "reviews_count": self.extract_reviews_count(driver),
+            "reviews": self.extract_reviews(driver, book_id),
+        }
 
     def parse_book_page(self, response):
-        """Parse book page with Selenium - preserving original parsing logic"""
+        """Parse a browser-rendered book page - preserving original parsing logic"""
         book_id = response.meta["book_id"]
-        driver = response.meta["driver"]
+        data = response.meta.get("browser_data")
 
         self.logger.info(f"Processing book ID: {book_id}")
 
-        try:
-            # Expand reviews safely - preserving original logic
-            self.expand_reviews_on_page(driver)
-            time.sleep(2)
-
-            # Extract book details using original Selenium logic
-            title = self.extract_book_title(driver)
-            author = self.extract_book_author(driver)
-            avg_rating = self.extract_avg_rating(driver)
-            ratings_count = self.extract_ratings_count(driver)
-            reviews_count = self.extract_reviews_count(driver)
-
-            self.logger.info(f"📖 Book: {title} by {author}")
-            self.logger.info(f"⭐ Avg Rating: {avg_rating} ({ratings_count} ratings)")
-
-            # Extract reviews - preserving original logic
-            reviews = self.extract_reviews(driver, book_id)
-
-            self.logger.info(f"📝 Found {len(reviews)} reviews on the page")
-
-            # Yield each review with book details
-            for review in reviews:
-                review.update(
-                    {
-                        "book_title": self.clean_text(title),
-                        "book_author": self.clean_text(author),
-                        "book_avg_rating": avg_rating,
-                        "book_ratings_count": ratings_count,
-                    }
-                )
-                yield review
+        if not data:
+            self.logger.error(f"Error processing book {book_id}: page not rendered")
+            return
 
-            self.logger.info(f"✅ Completed book ID {book_id}: {title}")
+        title = data["title"]
+        self.logger.info(f"📖 Book: {title} by {data['author']}")
+        self.logger.info(
+            f"⭐ Avg Rating: {data['avg_rating']} ({data['ratings_count']} ratings)"
+        )
 
-            # Manual delay between books
-            time.sleep(self.get_random_delay() * 2)
+        reviews = data["reviews"]
+        self.logger.info(f"📝 Found {len(reviews)} reviews on the page")
+
+        # Yield each review with book details
+        for review in reviews:
+            yield ReviewItem(
+                **review,
+                book_title=self.clean_text(title),
+                book_author=self.clean_text(data["author"]),
+                book_avg_rating=data["avg_rating"],
+                book_ratings_count=data["ratings_count"],
+            )
 
-        except Exception as e:
-            self.logger.error(f"Error processing book {book_id}: {str(e)}")
+        self.logger.info(f"✅ Completed book ID {book_id}: {title}")
 
     def expand_reviews_on_page(self, driver):
         """Click 'Show more' buttons safely - preserving original logic"""
+        if self.BATCH_EXPANSION:
+            try:
+                return self.expand_reviews_batch(driver)
+            except WebDriverException as e:
+                self.logger.info(f"Batch expansion failed, clicking singly: {str(e)}")
+
         try:
-            expand_buttons = driver.find_elements(
-                By.CSS_SELECTOR, 'button[aria-label="Tap to show more review"]'
-            )
+            # Only the cards that will be extracted, as in EXPAND_REVIEWS_JS
+            cards = driver.find_elements(
+                By.CSS_SELECTOR, "article.ReviewCard, div.ReviewCard"
+            )[: self.review_limit()]
+            expand_buttons = [
+                button
+                for card in cards
+                for button in card.find_elements(
+                    By.CSS_SELECTOR, 'button[aria-label="Tap to show more review"]'
+                )
+            ]
 
             self.logger.info(
                 f"Found {len(expand_buttons)} safe expand buttons on the page"
@@ -173,17 +332,17 @@ class GoodreadsReviewsSpider(scrapy.Spider):
             for i, button in enumerate(expand_buttons):
                 try:
                     driver.execute_script(
-                        "arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});",
-                        button,
+                        "arguments[0].scrollIntoView({block: 'center'});", button
                     )
-                    time.sleep(0.3)
-
                     driver.execute_script("arguments[0].click();", button)
                     self.logger.info(
                         f"Clicked safe expand button {i + 1}/{len(expand_buttons)}"
                     )
 
-                    time.sleep(random.uniform(1.0, 2.0))
+                    # Wait for this card to expand instead of sleeping
+                    WebDriverWait(driver, 5).until(
+                        lambda d, b=button: self.is_expanded(b)
+                    )
                 except Exception as e:
                     self.logger.info(f"Skipping button: {str(e)}")
                     continue
@@ -193,6 +352,33 @@ class GoodreadsReviewsSpider(scrapy.Spider):
             self.logger.error(f"Error expanding reviews: {str(e)}")
             return False
 
+    def expand_reviews_batch(self, driver):
+        """Click every 'Show more' button in one call and wait for the DOM to settle
+
+        The clicks only toggle already-loaded text, so no extra requests are
+        made against the site's per-domain rate.
+        """
+        driver.set_script_timeout(self.EXPANSION_TIMEOUT_MS / 1000 + 5)
+        clicked = driver.execute_async_script(
+            EXPAND_REVIEWS_JS,
+            self.EXPANSION_QUIET_MS,
+            self.EXPANSION_TIMEOUT_MS,
+            self.review_limit(),
+        )
+        self.logger.info(f"Expanded {clicked} reviews in one batch")
+        return True
+
+    def is_expanded(self, button):
+        """True once a 'show more' button has toggled or left the DOM"""
+        try:
+            return button.get_attribute("aria-label") != "Tap to show more review"
+        except StaleElementReferenceException:
+            return True
+
+    def review_limit(self):
+        """Per-book review budget from MAX_REVIEWS_PER_BOOK (None = unlimited)"""
+        return self.settings.getint("MAX_REVIEWS_PER_BOOK") or None
+
     def extract_book_title(self, driver):
         """Extract book title - preserving original logic"""
         try:
@@ -263,21 +449,25 @@ class GoodreadsReviewsSpider(scrapy.Spider):
 
     def extract_reviews(self, driver, book_id):
         """Extract reviews - preserving original parsing logic"""
+        if self.SCRIPT_EXTRACTION:
+            try:
+                return self.extract_reviews_script(driver, book_id)
+            except WebDriverException as e:
+                self.logger.info(f"Script extraction failed, using cards: {str(e)}")
+
         reviews = []
 
         try:
             review_cards = driver.find_elements(
                 By.CSS_SELECTOR, "article.ReviewCard, div.ReviewCard"
-            )
+            )[: self.review_limit()]
             self.logger.info(f"Found {len(review_cards)} review cards on the page")
 
             for i, card in enumerate(review_cards):
                 try:
                     driver.execute_script(
-                        "arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});",
-                        card,
+                        "arguments[0].scrollIntoView({block: 'center'});", card
                     )
-                    time.sleep(0.2)
 
                     # Reviewer
                     try:
@@ -325,7 +515,7 @@ class GoodreadsReviewsSpider(scrapy.Spider):
                             review_text = card.text
 
                     review_text = self.clean_text(review_text)
-                    review_id = card.get_attribute("id") or f"review_{book_id}_{i}"
+                    review_id = card.get_attribute("id")
 
                     reviews.append(
                         {
@@ -351,6 +541,92 @@ class GoodreadsReviewsSpider(scrapy.Spider):
 
         return reviews
 
+    def extract_reviews_http(self, response, book_id, limit=None):
+        """Extract reviews without a browser, preferring embedded full text"""
+        reviews = []
+
+        limit = limit or self.review_limit()
+        embedded_reviews = embedded.extract_reviews(response, book_id, limit=limit)
+        for review in embedded_reviews:
+            reviews.append(
+                {
+                    "review_id": review["review_id"],
+                    "book_id": book_id,
+                    "reviewer": review["reviewer"] or "Anonymous",
+                    "rating": review["rating"],
+                    "date": review["date"] or "Unknown date",
+                    "review_text": self.clean_text(
+                        re.sub(r"<[^>]+>", " ", review["review_text"])
+                    ),
+                }
+            )
+        if reviews:
+            return reviews
+
+        cards = response.css("article.ReviewCard, div.ReviewCard")[:limit]
+        for card in cards:
+            reviewer = card.css(".ReviewerProfile__name a::text").get()
+
+            rating = None
+            rating_label = card.css("span.RatingStars__small::attr(aria-label)").get()
+            if rating_label:
+                match = re.search(r"(\d+\.?\d*)", rating_label)
+                if match:
+                    rating = float(match.group(1))
+
+            date = card.css("span.Text__body3 a::text").get()
+            review_text = " ".join(card.css(".ReviewText__content ::text").getall())
+
+            reviews.append(
+                {
+                    "review_id": self.extract_review_id(card),
+                    "book_id": book_id,
+                    "reviewer": reviewer or "Anonymous",
+                    "rating": rating,
+                    "date": self.clean_text(date) or "Unknown date",
+                    "review_text": self.clean_text(review_text),
+                }
+            )
+
+        return reviews
+
+    def extract_reviews_script(self, driver, book_id):
+        """Extract all reviews with one execute_script round trip"""
+        cards = driver.execute_script(EXTRACT_REVIEWS_JS, self.review_limit()) or []
+        self.logger.info(f"Found {len(cards)} review cards on the page")
+
+        reviews = []
+        for card in cards:
+            rating = None
+            if card["rating"]:
+                match = re.search(r"(\d+\.?\d*)", card["rating"])
+                if match:
+                    rating = float(match.group(1))
+
+            reviews.append(
+                {
+                    "review_id": card["id"],
+                    "book_id": book_id,
+                    "reviewer": card["reviewer"] or "Anonymous",
+                    "rating": rating,
+                    "date": card["date"] or "Unknown date",
+                    "review_text": self.clean_text(card["text"]),
+                }
+            )
+
+        return reviews
+
+    def extract_review_id(self, card):
+        """Goodreads' own review ID for a card selector, or None if it has none"""
+        review_id = card.attrib.get("id")
+        if review_id:
+            return review_id
+        link = card.css('a[href*="/review/show/"]::attr(href)').get()
+        match = re.search(r"/review/show/(\d+)", link or "")
+        if match:
+            return match.group(1)
+        return None
+
     def extract_rating(self, rating_element):
         """Extract numeric rating - preserving original logic"""
         if not rating_element:
@@ -372,16 +648,6 @@ class GoodreadsReviewsSpider(scrapy.Spider):
         text = re.sub(r"\s+", " ", text).strip()
         return text
 
-    def get_random_delay(self):
-        """Return a random delay - preserving original logic"""
-        return random.uniform(self.DELAY_MIN, self.DELAY_MAX)
-
-    def close(self, reason):
-        """Clean up when spider closes"""
-        if self.driver:
-            self.driver.quit()
-            self.logger.info("Browser closed")
-
 
 # Pipeline for processing scraped reviews
 class GoodreadsReviewsPipeline:
@@ -0,0 +1,146 @@
+# ===============================================
+# bloom.py - Persistent Bloom Filter
+# ===============================================
+#
+# Remembering every review ever scraped, across runs, as exact hashes would
+# take gigabytes at 100M+ reviews. A Bloom filter answers "seen before?" in a
+# fixed number of bits per entry (about 14 for a 0.1% false positive rate),
+# at the cost of occasionally reporting an unseen entry as seen.
+#
+# The bit array lives in a memory-mapped file, so it is not held in the
+# Python heap, survives restarts, and is written back by the OS as pages
+# change; flush() forces it to disk. Processes sharing the file (shards of
+# one crawl) add keys through update(), which holds an exclusive lock on the
+# file while it sets bits; the stored count is only ever raised by the keys
+# a process added itself, under the same lock.
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking between processes
+    fcntl = None
+
+MAGIC = b"GRBF1"
+HEADER = struct.Struct("<5sQIQ")  # magic, bits, hashes, count
+
+
+def optimal_size(capacity, error_rate):
+    """Return (bits, hashes) for ``capacity`` entries at ``error_rate``"""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class BloomFilter:
+    """Bloom filter over byte strings, stored in a memory-mapped file"""
+
+    def __init__(self, path, capacity=100_000_000, error_rate=0.001):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            self.file = open(path, "r+b")
+            magic, self.bits, self.hashes, self.count = HEADER.unpack(
+                self.file.read(HEADER.size)
+            )
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+        else:
+            self.bits, self.hashes = optimal_size(capacity, error_rate)
+            self.count = 0
+            self.file = open(path, "w+b")
+            # Sparse on most filesystems: untouched pages take no disk space
+            self.file.truncate(HEADER.size + (self.bits + 7) // 8)
+            self.write_header()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        # Keys added since the stored count was last raised
+        self.unsaved = 0
+
+    def positions(self, key):
+        """Bit positions for ``key`` (double hashing of one 128-bit digest)"""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        offset = HEADER.size
+        return all(
+            self.map[offset + bit // 8] >> (bit % 8) & 1
+            for bit in self.positions(key)
+        )
+
+    def add(self, key):
+        """Add ``key``; return True if it was (probably) not present before"""
+        offset = HEADER.size
+        added = False
+        for bit in self.positions(key):
+            index = offset + bit // 8
+            mask = 1 << (bit % 8)
+            if not self.map[index] & mask:
+                self.map[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+            self.unsaved += 1
+        return added
+
+    @contextmanager
+    def locked(self):
+        """Hold an exclusive lock on the file (a no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def update(self, keys):
+        """Add ``keys`` under the file lock and flush
+
+        Returns the number of keys that were (probably) new.
+        """
+        with self.locked():
+            added = sum(self.add(key) for key in keys)
+            self.save()
+        return added
+
+    def __len__(self):
+        """Approximate number of distinct keys added"""
+        return self.count
+
+    @property
+    def error_rate(self):
+        """Current false positive probability given the keys added so far"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def write_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.bits, self.hashes, self.count))
+        self.file.flush()
+
+    def save(self):
+        # Other processes may have raised the stored count since it was read
+        stored = HEADER.unpack(self.map[: HEADER.size])[3]
+        self.count = stored + self.unsaved
+        self.unsaved = 0
+        self.map[: HEADER.size] = HEADER.pack(
+            MAGIC, self.bits, self.hashes, self.count
+        )
+        self.map.flush()
+
+    def flush(self):
+        with self.locked():
+            self.save()
+
+    def close(self):
+        self.flush()
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,348 @@
+# ===============================================
+# browser.py - Pooled Headless Browser Downloads
+# ===============================================
+#
+# BrowserDownloadHandler replaces the single scrapy_selenium driver with a
+# pool of reusable Chrome instances. Requests flagged with ``meta["browser"]``
+# are rendered on a worker thread so the reactor keeps running while pages
+# load; all other requests go through Scrapy's normal HTTP handler.
+#
+# Request meta understood by the handler:
+#   browser          - render this request in the pool
+#   browser_wait_for - CSS selector to wait for after the page loads
+#   browser_actions  - name of a spider method called as
+#                      ``method(driver, request)`` on the worker thread while
+#                      the page is live; its return value is stored in
+#                      ``meta["browser_data"]``
+#
+# Images, fonts, stylesheets and third-party scripts are never read, so the
+# handler can tell Chrome not to fetch them (BROWSER_BLOCK_RESOURCE_TYPES and
+# BROWSER_BLOCK_URL_PATTERNS, applied through the DevTools protocol).
+# Blocked requests are counted per resource type. A blocked request never
+# reports its size, so every BROWSER_BLOCKING_SAMPLE_EVERY-th page is loaded
+# without blocking, and the size of what would have been blocked there gives
+# the browser/blocked_bytes_estimate stat.
+
+import fnmatch
+import json
+import queue
+import threading
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.http import HtmlResponse
+from twisted.internet import defer, threads
+
+# Network.setBlockedURLs matches URL wildcards only, so resource types are
+# expressed as the file extensions that Chrome would classify that way
+RESOURCE_TYPE_PATTERNS = {
+    "Image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "Font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "Stylesheet": ["*.css*"],
+    "Media": ["*.mp4*", "*.webm*", "*.mp3*", "*.m3u8*"],
+}
+
+
+class BrowserPool:
+    """A bounded pool of WebDriver instances recycled after ``max_pages``"""
+
+    def __init__(self, driver_factory, size=2, max_pages=50, inc_stat=None):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.max_pages = max_pages
+        self.inc_stat = inc_stat
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def acquire(self):
+        """Return an idle driver, starting one if the pool is not full
+
+        Blocks while every driver is busy, so only call it off the reactor
+        thread.
+        """
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                start_new = self._created < self.size
+                if start_new:
+                    self._created += 1
+            if start_new:
+                break
+
+            # Re-check periodically: a busy driver may be discarded instead
+            # of returned, freeing a slot for a new one
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        self._pages[id(driver)] = 0
+        self._inc_stat("browser/drivers_started")
+        return driver
+
+    def release(self, driver, broken=False):
+        """Return ``driver`` to the pool, recycling it when worn out or broken"""
+        self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+        if broken or self._closed or self._pages[id(driver)] >= self.max_pages:
+            self._discard(driver)
+            if not broken:
+                self._inc_stat("browser/drivers_recycled")
+            return
+        self._idle.put(driver)
+
+    def close(self):
+        """Quit every idle driver; busy ones are quit when released"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def _discard(self, driver):
+        self._pages.pop(id(driver), None)
+        with self._lock:
+            self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _inc_stat(self, key):
+        if self.inc_stat is not None:
+            self.inc_stat(key)
+
+
+def blocked_url_patterns(settings):
+    """Return the URL wildcards Chrome should refuse to fetch"""
+    patterns = []
+    for resource_type in settings.getlist("BROWSER_BLOCK_RESOURCE_TYPES"):
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    patterns.extend(settings.getlist("BROWSER_BLOCK_URL_PATTERNS"))
+    return patterns
+
+
+def build_chrome_driver(settings):
+    """Create a Chrome WebDriver configured from the BROWSER_* settings"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    if settings.get("BROWSER_BINARY_PATH"):
+        options.binary_location = settings.get("BROWSER_BINARY_PATH")
+    for argument in settings.getlist("BROWSER_DRIVER_ARGUMENTS"):
+        options.add_argument(argument)
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    if settings.getbool("BROWSER_NETWORK_STATS"):
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    # Without an explicit path Selenium Manager locates a matching driver
+    service = Service(settings.get("BROWSER_DRIVER_EXECUTABLE_PATH") or None)
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(settings.getint("BROWSER_PAGE_LOAD_TIMEOUT", 30))
+
+    patterns = blocked_url_patterns(settings)
+    if patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    return driver
+
+
+def matches_any(url, patterns):
+    """True if ``url`` matches one of the Network.setBlockedURLs wildcards"""
+    return any(fnmatch.fnmatchcase(url, pattern) for pattern in patterns)
+
+
+def network_stats(driver, patterns=()):
+    """Summarize (and drain) the driver's performance log since the last call
+
+    Returns a dict with the requests Chrome blocked per resource type
+    (``blocked``), the encoded bytes it transferred (``transferred``) and,
+    of those, the requests and bytes whose URL matches one of ``patterns``
+    (``blockable``, ``blockable_bytes``) - only non-zero on a page loaded
+    without blocking.
+    """
+    result = {"blocked": {}, "transferred": 0, "blockable": 0, "blockable_bytes": 0}
+    urls = {}
+    for entry in driver.get_log("performance"):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        params = message.get("params", {})
+        method = message.get("method")
+        if method == "Network.requestWillBeSent":
+            urls[params.get("requestId")] = params.get("request", {}).get("url", "")
+        elif method == "Network.loadingFailed":
+            if params.get("blockedReason"):
+                resource_type = params.get("type", "Other")
+                result["blocked"][resource_type] = (
+                    result["blocked"].get(resource_type, 0) + 1
+                )
+        elif method == "Network.loadingFinished":
+            size = int(params.get("encodedDataLength", 0))
+            result["transferred"] += size
+            if matches_any(urls.get(params.get("requestId"), ""), patterns):
+                result["blockable"] += 1
+                result["blockable_bytes"] += size
+    return result
+
+
+class BrowserDownloadHandler:
+    """Download handler rendering ``meta["browser"]`` requests in a pool"""
+
+    lazy = False
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.wait_time = settings.getint("BROWSER_WAIT_TIME", 15)
+        self.network_stats = settings.getbool("BROWSER_NETWORK_STATS")
+        self.blocked_patterns = blocked_url_patterns(settings)
+        self.sample_every = (
+            settings.getint("BROWSER_BLOCKING_SAMPLE_EVERY")
+            if self.network_stats and self.blocked_patterns
+            else 0
+        )
+        self._renders = 0
+        self._lock = threading.Lock()
+        self.http_handler = HTTP11DownloadHandler.from_crawler(crawler)
+        self.pool = BrowserPool(
+            lambda: build_chrome_driver(settings),
+            size=settings.getint("BROWSER_POOL_SIZE", 2),
+            max_pages=settings.getint("BROWSER_MAX_PAGES_PER_DRIVER", 50),
+            inc_stat=self.inc_stat,
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def download_request(self, request, spider):
+        if not request.meta.get("browser"):
+            return self.http_handler.download_request(request, spider)
+        return threads.deferToThread(self.render, request, spider)
+
+    def render(self, request, spider):
+        """Load ``request`` in a pooled driver; runs on a worker thread"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = self.pool.acquire()
+        broken = False
+        sample = self.next_is_sample()
+        try:
+            if sample:
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+            try:
+                driver.get(request.url)
+                if request.meta.get("browser_wait_for"):
+                    WebDriverWait(driver, self.wait_time).until(
+                        EC.presence_of_element_located(
+                            (By.CSS_SELECTOR, request.meta["browser_wait_for"])
+                        )
+                    )
+                self.record_page_stats(driver, sample)
+            finally:
+                if sample:
+                    driver.execute_cdp_cmd(
+                        "Network.setBlockedURLs", {"urls": self.blocked_patterns}
+                    )
+            if request.meta.get("browser_actions"):
+                actions = getattr(spider, request.meta["browser_actions"])
+                request.meta["browser_data"] = actions(driver, request)
+            body = driver.page_source
+            url = driver.current_url
+        except Exception as e:
+            # A slow page does not mean the driver itself is unusable
+            broken = not isinstance(e, TimeoutException)
+            raise
+        finally:
+            self.pool.release(driver, broken=broken)
+
+        self.inc_stat("browser/pages_rendered")
+        return HtmlResponse(url, body=body, encoding="utf-8", request=request)
+
+    def next_is_sample(self):
+        """True for every BROWSER_BLOCKING_SAMPLE_EVERY-th page rendered"""
+        if not self.sample_every:
+            return False
+        with self._lock:
+            self._renders += 1
+            return self._renders % self.sample_every == 0
+
+    def record_page_stats(self, driver, sample=False):
+        """Record load time and network usage of the page just loaded
+
+        A sample page (loaded without blocking) only records what blocking
+        would have saved, so the other stats describe normal pages.
+        """
+        if self.network_stats:
+            stats = network_stats(driver, self.blocked_patterns if sample else ())
+            if sample:
+                self.inc_stat("browser/sampled_pages")
+                self.inc_stat("browser/sampled_blockable_requests", stats["blockable"])
+                self.inc_stat("browser/sampled_blockable_bytes", stats["blockable_bytes"])
+                self.call_in_reactor(self.estimate_blocked_bytes)
+                return
+            for resource_type, count in stats["blocked"].items():
+                self.inc_stat("browser/blocked_requests", count)
+                self.inc_stat(f"browser/blocked_requests/{resource_type}", count)
+            self.inc_stat("browser/response_bytes", stats["transferred"])
+            self.call_in_reactor(self.estimate_blocked_bytes)
+
+        load_ms = driver.execute_script(
+            "const nav = performance.getEntriesByType('navigation')[0];"
+            "return nav ? Math.round(nav.duration) : null;"
+        )
+        if load_ms:
+            self.inc_stat("browser/page_load_ms", int(load_ms))
+            self.max_stat("browser/page_load_ms_max", int(load_ms))
+
+    def estimate_blocked_bytes(self):
+        """Blocked requests times the mean size of a blockable sampled request
+
+        Runs on the reactor thread after each page's stats are updated.
+        """
+        stats = self.crawler.stats
+        sampled = stats.get_value("browser/sampled_blockable_requests", 0)
+        if sampled:
+            mean_size = stats.get_value("browser/sampled_blockable_bytes", 0) / sampled
+            stats.set_value(
+                "browser/blocked_bytes_estimate",
+                round(stats.get_value("browser/blocked_requests", 0) * mean_size),
+            )
+
+    def call_in_reactor(self, function, *args):
+        """Run ``function`` on the reactor thread (stats are not thread-safe)"""
+        from twisted.internet import reactor
+
+        reactor.callFromThread(function, *args)
+
+    def inc_stat(self, key, count=1):
+        self.call_in_reactor(self.crawler.stats.inc_value, key, count)
+
+    def max_stat(self, key, value):
+        self.call_in_reactor(self.crawler.stats.max_value, key, value)
+
+    @defer.inlineCallbacks
+    def close(self):
+        yield self.http_handler.close()
+        yield threads.deferToThread(self.pool.close)
@@ -0,0 +1,277 @@
+# ===============================================
+# checkpoint.py - Resumable Crawl State
+# ===============================================
+#
+# A crawl over a range of book IDs records which IDs are finished (scraped
+# or confirmed missing) in two compact bitmaps, flushed to disk every few
+# seconds. When a crawl is restarted the stored IDs are skipped and the
+# output feeds are appended to instead of being truncated. The checkpoint
+# is deleted once a crawl finishes normally, so the next run starts fresh.
+#
+# NegativeCache outlives individual crawls: it remembers book IDs that did
+# not exist or redirected to another book, so later runs skip them until
+# their re-check TTL expires.
+
+import os
+import re
+import sqlite3
+import struct
+import time
+import zlib
+
+from scrapy.exceptions import NotConfigured
+
+MAGIC = b"GRCK1"
+
+# Sent right before the checkpoint file is written, so buffered output can be
+# made durable first: a book must never be checkpointed as done while its
+# items are still only in memory
+checkpoint_saving = object()
+
+# Sent right after the checkpoint file was written: everything scraped so far
+# is on disk
+checkpoint_saved = object()
+
+
+class IdBitmap:
+    """Growable bitmap of non-negative integer IDs (one bit per ID)"""
+
+    def __init__(self, data=b""):
+        self.bits = bytearray(data)
+
+    def add(self, n):
+        index = n >> 3
+        if index >= len(self.bits):
+            # Grow geometrically so sequential IDs do not reallocate each time
+            self.bits.extend(bytes(max(index + 1 - len(self.bits), len(self.bits))))
+        self.bits[index] |= 1 << (n & 7)
+
+    def __contains__(self, n):
+        index = n >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (n & 7)))
+
+    def __len__(self):
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def to_bytes(self):
+        """Serialize compressed; runs of finished or unseen IDs shrink to little"""
+        return zlib.compress(bytes(self.bits), 6)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(zlib.decompress(data))
+
+
+class Checkpoint:
+    """Completed and not-found book IDs for one crawl, stored in one file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = IdBitmap()
+        self.not_found = IdBitmap()
+        self.dirty = False
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Read the checkpoint file if there is one; return True if loaded"""
+        if not self.exists():
+            return False
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{self.path} is not a crawl checkpoint")
+        offset = len(MAGIC)
+        done_len, missing_len = struct.unpack_from("<II", data, offset)
+        offset += struct.calcsize("<II")
+        self.done = IdBitmap.from_bytes(data[offset : offset + done_len])
+        offset += done_len
+        self.not_found = IdBitmap.from_bytes(data[offset : offset + missing_len])
+        return True
+
+    def save(self):
+        """Atomically replace the checkpoint file with the current state"""
+        done = self.done.to_bytes()
+        missing = self.not_found.to_bytes()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<II", len(done), len(missing)))
+            f.write(done)
+            f.write(missing)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
+
+    def mark_done(self, book_id):
+        self.done.add(book_id)
+        self.dirty = True
+
+    def mark_not_found(self, book_id):
+        self.not_found.add(book_id)
+        self.dirty = True
+
+    def is_finished(self, book_id):
+        return book_id in self.done or book_id in self.not_found
+
+
+def checkpoint_path(settings, spider_name):
+    """Checkpoint file for a spider: CHECKPOINT_FILE or CHECKPOINT_DIR/<name>.ckpt"""
+    return settings.get("CHECKPOINT_FILE") or os.path.join(
+        settings.get("CHECKPOINT_DIR", "checkpoints"), f"{spider_name}.ckpt"
+    )
+
+
+class PendingPages:
+    """Holds back a book's outcome until its review listing pages are done
+
+    A book is finished only once its /book/show page and every review page
+    requested for it have been handled, so a crash never loses pages of a
+    book that is already recorded. ``add`` counts a requested page,
+    ``page_done`` / ``page_failed`` settle one and ``book_done`` records the
+    book page's outcome. Each returns the book's final outcome once nothing
+    is outstanding (None until then); if any page failed that is
+    ``failed``.
+    """
+
+    def __init__(self, failed=None):
+        self.failed_outcome = failed
+        self.pending = {}
+        self.outcomes = {}
+        self.failed = set()
+
+    def add(self, book_id):
+        self.pending[book_id] = self.pending.get(book_id, 0) + 1
+
+    def book_done(self, book_id, outcome):
+        if self.pending.get(book_id):
+            self.outcomes[book_id] = outcome
+            return None
+        return self.settle(book_id, outcome)
+
+    def page_done(self, book_id):
+        left = self.pending.get(book_id, 0) - 1
+        if left > 0:
+            self.pending[book_id] = left
+            return None
+        self.pending.pop(book_id, None)
+        if book_id not in self.outcomes:
+            return None
+        return self.settle(book_id, self.outcomes.pop(book_id))
+
+    def page_failed(self, book_id):
+        self.failed.add(book_id)
+        return self.page_done(book_id)
+
+    def settle(self, book_id, outcome):
+        if book_id in self.failed:
+            self.failed.discard(book_id)
+            return self.failed_outcome
+        return outcome
+
+
+class CheckpointAddon:
+    """Append to existing feeds instead of truncating them when resuming
+
+    Runs before the feed exporter reads its settings, which is too early for
+    a middleware. Sets CHECKPOINT_RESUMING for components that write their
+    own output.
+    """
+
+    def __init__(self, crawler):
+        self.spider_name = crawler.spidercls.name
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def update_settings(self, settings):
+        if not settings.getbool("CHECKPOINT_ENABLED"):
+            raise NotConfigured
+        if not os.path.exists(checkpoint_path(settings, self.spider_name)):
+            return
+
+        # The existing files already start with a CSV header line
+        feeds = {
+            uri: {
+                **options,
+                "overwrite": False,
+                "item_export_kwargs": {
+                    **options.get("item_export_kwargs", {}),
+                    "include_headers_line": False,
+                },
+            }
+            for uri, options in settings.getdict("FEEDS").items()
+        }
+        settings.set("FEEDS", feeds, priority=settings.getpriority("FEEDS"))
+        settings.set("CHECKPOINT_RESUMING", True, priority="addon")
+
+
+BOOK_URL_RE = re.compile(r"/book/show/(\d+)")
+
+
+def book_id_from_url(url):
+    """Return the numeric book ID of a /book/show/ URL, or None"""
+    match = BOOK_URL_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+class NegativeCache:
+    """Persistent record of dead and redirected book IDs with a re-check TTL"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.pending = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_books ("
+            "book_id INTEGER PRIMARY KEY, reason TEXT, checked_at REAL)"
+        )
+
+    def load_fresh(self):
+        """Return an IdBitmap of IDs checked within the TTL"""
+        fresh = IdBitmap()
+        rows = self.db.execute(
+            "SELECT book_id FROM dead_books WHERE checked_at >= ?",
+            (time.time() - self.ttl,),
+        )
+        for (book_id,) in rows:
+            fresh.add(book_id)
+        return fresh
+
+    def mark_dead(self, book_id, reason):
+        self.pending[book_id] = (reason, time.time())
+
+    def mark_alive(self, book_id):
+        self.pending[book_id] = None
+
+    def flush(self):
+        """Write pending changes in one transaction"""
+        if not self.pending:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO dead_books VALUES (?, ?, ?)",
+                [(i, *v) for i, v in self.pending.items() if v is not None],
+            )
+            self.db.executemany(
+                "DELETE FROM dead_books WHERE book_id = ?",
+                [(i,) for i, v in self.pending.items() if v is None],
+            )
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,234 @@
+# ===============================================
+# dupefilter.py - Compact Duplicate Request Filter
+# ===============================================
+#
+# Scrapy's default dupefilter keeps a 40-character hex SHA1 per request in a
+# Python set, well over 100 bytes each. Almost every request this project
+# makes is for a numeric book ID, so those are tracked in a bitmap (one bit
+# per ID) and review listing pages (``?after=<cursor>``) as a book ID packed
+# with a hash of the cursor, in an open-addressing table of 64-bit slots. Any
+# other request, including book URLs with a slug, falls back to a 64-bit
+# prefix of its fingerprint in the same table.
+#
+# With JOBDIR set the seen state is saved on close and loaded on open, as
+# RFPDupeFilter does with its requests.seen file.
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import zlib
+from array import array
+from urllib.parse import parse_qs, urlparse
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.job import job_dir
+
+from goodreads_scraper.checkpoint import IdBitmap
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GRDF1"
+STATE_FILE = "requests.seen.compact"
+
+BOOK_PATH_RE = re.compile(r"/book/show/(\d+)")
+REVIEW_PATH_RE = re.compile(r"/book/show/(\d+)/reviews")
+
+# Keys of review pages have the top bit clear, fingerprint prefixes have it set
+FINGERPRINT_BIT = 1 << 63
+CURSOR_BITS = 34
+
+
+def cursor_hash(cursor):
+    """CURSOR_BITS-wide hash of a review listing cursor (0 for the first page)"""
+    if cursor is None:
+        return 0
+    digest = hashlib.blake2b(cursor.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % ((1 << CURSOR_BITS) - 1) + 1
+
+
+class CompactIntSet:
+    """Set of 64-bit integers in a flat array (linear probing, 16 B/entry)"""
+
+    EMPTY = 0
+    MAX_LOAD = 0.5
+
+    def __init__(self, capacity=1024):
+        self.table = array("Q", bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.count = 0
+        self.has_zero = False
+
+    def _slot(self, value):
+        # Fibonacci hashing spreads sequential keys over the table
+        return ((value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 20 & self.mask
+
+    def add(self, value):
+        """Add ``value``; return True if it was not present before"""
+        if value == self.EMPTY:
+            added = not self.has_zero
+            self.has_zero = True
+            return added
+
+        slot = self._slot(value)
+        while True:
+            current = self.table[slot]
+            if current == value:
+                return False
+            if current == self.EMPTY:
+                break
+            slot = (slot + 1) & self.mask
+        self.table[slot] = value
+        self.count += 1
+        if self.count > len(self.table) * self.MAX_LOAD:
+            self._grow()
+        return True
+
+    def __contains__(self, value):
+        if value == self.EMPTY:
+            return self.has_zero
+        slot = self._slot(value)
+        while True:
+            current = self.table[slot]
+            if current == value:
+                return True
+            if current == self.EMPTY:
+                return False
+            slot = (slot + 1) & self.mask
+
+    def __len__(self):
+        return self.count + self.has_zero
+
+    def __iter__(self):
+        if self.has_zero:
+            yield 0
+        for value in self.table:
+            if value != self.EMPTY:
+                yield value
+
+    def _grow(self):
+        values = [value for value in self.table if value != self.EMPTY]
+        self.table = array("Q", bytes(16 * len(self.table)))
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for value in values:
+            self.add(value)
+
+    @property
+    def nbytes(self):
+        return self.table.itemsize * len(self.table)
+
+
+class CompactDupeFilter(BaseDupeFilter):
+    """Dupefilter keyed on book IDs and review pages instead of SHA1 hex
+
+    Two review cursors of one book can share a hash, dropping a listing page;
+    at CURSOR_BITS that is about one in three million books with a hundred
+    pages. Book IDs too large to pack fall back to fingerprints.
+    """
+
+    def __init__(self, path=None, debug=False, fingerprinter=None, stats=None):
+        self.path = os.path.join(path, STATE_FILE) if path else None
+        self.debug = debug
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+        self.books = IdBitmap()
+        self.others = CompactIntSet()
+        self.logdupes = True
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            job_dir(crawler.settings),
+            debug=crawler.settings.getbool("DUPEFILTER_DEBUG"),
+            fingerprinter=crawler.request_fingerprinter,
+            stats=crawler.stats,
+        )
+
+    def request_key(self, request):
+        """Return ("book", book_id) or ("other", 64-bit key) for a request"""
+        parsed = urlparse(request.url)
+        if request.method == "GET" and not request.body:
+            match = BOOK_PATH_RE.fullmatch(parsed.path)
+            if match and not parsed.query:
+                return "book", int(match.group(1))
+
+            match = REVIEW_PATH_RE.fullmatch(parsed.path)
+            query = parse_qs(parsed.query)
+            if match and set(query) <= {"after"}:
+                book_id = int(match.group(1))
+                if book_id < 1 << 63 - CURSOR_BITS:
+                    cursor = query.get("after", [None])[-1]
+                    return "other", book_id << CURSOR_BITS | cursor_hash(cursor)
+
+        fingerprint = self.fingerprinter.fingerprint(request)
+        return "other", int.from_bytes(fingerprint[:8], "big") | FINGERPRINT_BIT
+
+    def request_seen(self, request):
+        kind, key = self.request_key(request)
+        if kind == "book":
+            if key in self.books:
+                return True
+            self.books.add(key)
+            return False
+        return not self.others.add(key)
+
+    @property
+    def nbytes(self):
+        return self.books.nbytes + self.others.nbytes
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{self.path} is not a dupefilter state file")
+        offset = len(MAGIC)
+        books_len, others_len = struct.unpack_from("<II", data, offset)
+        offset += struct.calcsize("<II")
+        self.books = IdBitmap.from_bytes(data[offset : offset + books_len])
+        offset += books_len
+        others = array("Q", zlib.decompress(data[offset : offset + others_len]))
+        for value in others:
+            self.others.add(value)
+        logger.info(
+            f"Loaded dupefilter state: {len(self.books)} books, "
+            f"{len(self.others)} other requests"
+        )
+
+    def save(self):
+        """Atomically write the seen state (values only, not empty slots)"""
+        books = self.books.to_bytes()
+        others = zlib.compress(array("Q", self.others).tobytes(), 6)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<II", len(books), len(others)))
+            f.write(books)
+            f.write(others)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self, reason):
+        if self.stats is not None:
+            self.stats.set_value("dupefilter/memory_bytes", self.nbytes)
+            self.stats.set_value("dupefilter/seen_books", len(self.books))
+            self.stats.set_value("dupefilter/seen_other", len(self.others))
+        if self.path:
+            self.save()
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug(
+                f"Filtered duplicate request: {request}", extra={"spider": spider}
+            )
+        elif self.logdupes:
+            logger.debug(
+                f"Filtered duplicate request: {request} - no more duplicates "
+                "will be shown (see DUPEFILTER_DEBUG to show all duplicates)",
+                extra={"spider": spider},
+            )
+            self.logdupes = False
+        spider.crawler.stats.inc_value("dupefilter/filtered", spider=spider)
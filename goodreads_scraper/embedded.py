@@ -0,0 +1,280 @@
+# ===============================================
+# embedded.py - Embedded Structured Data Parsing
+# ===============================================
+#
+# Goodreads book pages are server-rendered by Next.js and ship the data they
+# were rendered from in a ``<script id="__NEXT_DATA__">`` block (an Apollo
+# client cache keyed by ``Typename:kca://...`` references) plus a schema.org
+# JSON-LD block. Parsing these once is much cheaper than running a dozen CSS
+# queries against the DOM, and they carry fields (ISBN, publisher) that the
+# rendered ``.FeaturedDetails`` section frequently omits.
+#
+# One response is read by several helpers in turn (escalation middleware,
+# spider callback, pagination), so each block is decoded once per response
+# and the result shared; callers must not modify it.
+
+import functools
+import json
+import weakref
+from datetime import datetime, timezone
+
+# Decoded blocks per response, dropped with the response
+_parsed = weakref.WeakKeyDictionary()
+
+
+def parsed_once(parse):
+    """Cache ``parse(response)`` on the response it was called with"""
+
+    @functools.wraps(parse)
+    def wrapper(response):
+        results = _parsed.setdefault(response, {})
+        if parse.__name__ not in results:
+            results[parse.__name__] = parse(response)
+        return results[parse.__name__]
+
+    return wrapper
+
+
+@parsed_once
+def load_next_data(response):
+    """Return the decoded ``__NEXT_DATA__`` payload, or None"""
+    raw = response.xpath('//script[@id="__NEXT_DATA__"]/text()').get()
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def load_apollo_state(response):
+    """Return the Apollo cache from ``__NEXT_DATA__``, or None"""
+    data = load_next_data(response)
+    if not data:
+        return None
+    state = data.get("props", {}).get("pageProps", {}).get("apolloState")
+    return state or None
+
+
+@parsed_once
+def load_json_ld(response):
+    """Return the first JSON-LD object describing a Book, or None"""
+    for raw in response.xpath('//script[@type="application/ld+json"]/text()').getall():
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        for entry in data if isinstance(data, list) else [data]:
+            if isinstance(entry, dict) and entry.get("@type") == "Book":
+                return entry
+    return None
+
+
+def resolve(state, value):
+    """Follow an Apollo ``{"__ref": key}`` pointer, returning {} when missing"""
+    if isinstance(value, dict) and "__ref" in value:
+        return state.get(value["__ref"]) or {}
+    return value or {}
+
+
+def find_book_key(state, book_id):
+    """Apollo cache key of the Book entry for ``book_id``, or None
+
+    The page's own query (``ROOT_QUERY["getBookByLegacyId({...})"]``) points
+    at the book it was rendered for; otherwise the Book whose ``legacyId``
+    matches is used. Other Book entries (series, related editions) are
+    never picked.
+    """
+    root = state.get("ROOT_QUERY") or {}
+    for field, value in root.items():
+        name, _, args = field.partition("(")
+        if name != "getBookByLegacyId" or not isinstance(value, dict):
+            continue
+        try:
+            legacy_id = json.loads(args.rstrip(")")).get("legacyId")
+        except (ValueError, AttributeError):
+            continue
+        if str(legacy_id) == str(book_id) and value.get("__ref") in state:
+            return value["__ref"]
+
+    for key, value in state.items():
+        if key.startswith("Book:") and isinstance(value, dict):
+            if str(value.get("legacyId")) == str(book_id):
+                return key
+    return None
+
+
+def find_book(state, book_id):
+    """Find the Book entry for ``book_id`` in the Apollo cache, or None"""
+    key = find_book_key(state, book_id)
+    return state[key] if key else None
+
+
+def format_count(value):
+    """Format an integer the way the rendered page does ("3,562,057")"""
+    if value is None:
+        return None
+    try:
+        return f"{int(value):,}"
+    except (TypeError, ValueError):
+        return None
+
+
+def format_rating(value):
+    """Format an average rating the way the rendered page does ("4.58")"""
+    if value is None:
+        return None
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_book(response, book_id):
+    """Build the book fields from embedded data
+
+    Returns a dict with the same keys and string formatting as the CSS
+    extraction in ``GoodreadsBooksSpider``, or None when the page carries no
+    usable embedded data so the caller can fall back to selectors.
+    """
+    state = load_apollo_state(response)
+    ld = load_json_ld(response) or {}
+
+    book = find_book(state, book_id) if state else None
+    if not book and not ld:
+        return None
+
+    book = book or {}
+    details = book.get("details") or {}
+    work = resolve(state, book.get("work")) if state else {}
+    stats = work.get("stats") or {}
+    aggregate = ld.get("aggregateRating") or {}
+
+    title = book.get("title") or ld.get("name")
+    if not title:
+        return None
+
+    author = None
+    contributor = book.get("primaryContributorEdge") or {}
+    if state and contributor.get("node"):
+        author = resolve(state, contributor["node"]).get("name")
+    if not author:
+        ld_authors = ld.get("author") or []
+        if isinstance(ld_authors, dict):
+            ld_authors = [ld_authors]
+        if ld_authors:
+            author = ld_authors[0].get("name")
+
+    genres = []
+    for entry in book.get("bookGenres") or []:
+        name = resolve(state, entry.get("genre")).get("name") if state else None
+        if name:
+            genres.append(name)
+
+    pages = details.get("numPages") or ld.get("numberOfPages")
+
+    return {
+        "title": title.strip(),
+        "author": author.strip() if author else None,
+        "avg_rating": format_rating(
+            stats.get("averageRating") or aggregate.get("ratingValue")
+        ),
+        "ratings_count": format_count(
+            stats.get("ratingsCount") or aggregate.get("ratingCount")
+        ),
+        "reviews_count": format_count(
+            stats.get("textReviewsCount") or aggregate.get("reviewCount")
+        ),
+        "isbn": details.get("isbn13") or details.get("isbn") or ld.get("isbn"),
+        "pages": str(pages) if pages else None,
+        "publisher": details.get("publisher"),
+        "genres": ", ".join(genres) if genres else None,
+    }
+
+
+def format_review_date(value):
+    """Format a ``createdAt`` epoch-milliseconds value like the review card"""
+    if not value:
+        return None
+    try:
+        date = datetime.fromtimestamp(float(value) / 1000, tz=timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return f"{date:%B} {date.day}, {date.year}"
+
+
+def extract_reviews(response, book_id, limit=None):
+    """Build review fields from the Review entries of the Apollo cache
+
+    The cache holds the complete review text, so no "show more" expansion is
+    needed. Returns a list of at most ``limit`` dicts with ``review_id``,
+    ``reviewer``, ``rating``, ``date`` and ``review_text`` (still HTML); the
+    list is empty when the page carries no embedded reviews.
+    """
+    state = load_apollo_state(response)
+    if not state:
+        return []
+
+    book_key = find_book_key(state, book_id)
+
+    reviews = []
+    for key, value in state.items():
+        if limit and len(reviews) >= limit:
+            break
+        if not key.startswith("Review:") or not isinstance(value, dict):
+            continue
+        if not value.get("text"):
+            continue
+        book_ref = (value.get("book") or {}).get("__ref")
+        if book_key and book_ref and book_ref != book_key:
+            continue
+
+        creator = resolve(state, value.get("creator"))
+        rating = value.get("rating")
+        reviews.append(
+            {
+                "review_id": value.get("id") or key.split(":", 1)[1],
+                "reviewer": creator.get("name"),
+                "rating": float(rating) if rating else None,
+                "date": format_review_date(value.get("createdAt")),
+                "review_text": value["text"],
+            }
+        )
+    return reviews
+
+
+def find_review_connection(state):
+    """The page's review listing (``ROOT_QUERY["getReviews(...)"]``), or None"""
+    root = state.get("ROOT_QUERY") or {}
+    for field, value in root.items():
+        if field.partition("(")[0] == "getReviews" and isinstance(value, dict):
+            if "pageInfo" in value:
+                return value
+    return None
+
+
+def next_review_cursor(response):
+    """Cursor of the review listing page after this one, or None at the end"""
+    state = load_apollo_state(response)
+    connection = find_review_connection(state) if state else None
+    if not connection:
+        return None
+    return (connection.get("pageInfo") or {}).get("nextPageToken") or None
+
+
+def is_last_review_page(response):
+    """True if the page embeds its review listing and no page follows it"""
+    state = load_apollo_state(response)
+    connection = find_review_connection(state) if state else None
+    return connection is not None and not next_review_cursor(response)
+
+
+def has_truncated_reviews(response, book_id, limit=None):
+    """True when review cards are collapsed and no embedded text covers them
+
+    Only the first ``limit`` cards are considered when a budget is given.
+    """
+    for card in response.css(".ReviewCard")[:limit]:
+        if card.css('button[aria-label="Tap to show more review"]'):
+            return not extract_reviews(response, book_id, limit=1)
+    return False
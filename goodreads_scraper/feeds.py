@@ -0,0 +1,389 @@
+# ===============================================
+# feeds.py - Feed Exporters and Storage
+# ===============================================
+#
+# CSV is slow and fragile to load once review text full of commas, quotes
+# and newlines runs to hundreds of millions of rows. ParquetItemExporter
+# writes the same items as typed, compressed Parquet instead:
+#
+#   - column types come from the BookItem / ReviewItem dataclass fields, so
+#     counts stay integers and ratings floats without any parsing on load
+#   - rows are buffered and written PARQUET_BUFFERED_ROW_GROUPS row groups of
+#     PARQUET_ROW_GROUP_SIZE rows at a time
+#   - repetitive text columns (authors, publishers, genres) are dictionary
+#     encoded; free text such as review_text is not
+#
+# Use it with "format": "parquet" in FEEDS. pyarrow is an optional
+# dependency (pip install pyarrow), needed only for this format.
+#
+# RollingFeedExporter replaces Scrapy's FeedExporter extension so feeds can
+# also be rolled over to a new file by size ("batch_max_bytes" in a feed's
+# options, or FEED_EXPORT_BATCH_MAX_BYTES), not only by item count. Rolling
+# over needs FeedExporter internals (written against Scrapy 2.13); they are
+# only used in RollingFeedExporter.roll_over, and checked for on startup so
+# a Scrapy release without them disables size-based batches instead of
+# failing mid-crawl.
+#
+# FEEDS are the only output of a crawl. BufferedFileFeedStorage, which
+# handles local file feeds, collects the serialized items in memory and
+# hands them to a writer thread once FEED_BUFFER_BYTES or FEED_BUFFER_SECONDS
+# is reached, so the reactor never waits on the disk. Before a checkpoint is
+# saved every open feed is written out and fsynced.
+
+import dataclasses
+import io
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from scrapy.exceptions import NotConfigured
+from scrapy.exporters import BaseItemExporter
+from scrapy.extensions.feedexport import FeedExporter, FileFeedStorage
+from twisted.internet.threads import deferToThread
+
+from itemadapter import ItemAdapter
+
+from goodreads_scraper.checkpoint import checkpoint_saving
+from goodreads_scraper.items import value_type
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# FeedExporter internals RollingFeedExporter.roll_over relies on
+FEED_EXPORTER_INTERNALS = ("_get_uri_params", "_close_slot", "_start_new_batch")
+
+
+def arrow_type(annotation):
+    """Arrow type for an item field annotation (text for anything else)"""
+    return {int: pyarrow.int64(), float: pyarrow.float64()}.get(
+        value_type(annotation), pyarrow.string()
+    )
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """Write items as Parquet row groups (needs pyarrow)"""
+
+    def __init__(
+        self,
+        file,
+        row_group_size=50000,
+        buffered_row_groups=1,
+        compression="zstd",
+        compression_level=None,
+        dictionary_columns=None,
+        **kwargs,
+    ):
+        if pyarrow is None:
+            raise NotConfigured("The parquet feed format requires pyarrow")
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.row_group_size = row_group_size
+        self.buffer_rows = row_group_size * max(1, buffered_row_groups)
+        self.compression = compression
+        self.compression_level = compression_level
+        self.dictionary_columns = list(dictionary_columns or [])
+        self.sink = None
+        self.writer = None
+        self.schema = None
+        self.rows = []
+
+    @classmethod
+    def from_crawler(cls, crawler, file, **kwargs):
+        """Take defaults from PARQUET_* settings; feed options still win"""
+        settings = crawler.settings
+        kwargs.setdefault("row_group_size", settings.getint("PARQUET_ROW_GROUP_SIZE"))
+        kwargs.setdefault(
+            "buffered_row_groups", settings.getint("PARQUET_BUFFERED_ROW_GROUPS")
+        )
+        kwargs.setdefault("compression", settings.get("PARQUET_COMPRESSION"))
+        kwargs.setdefault(
+            "compression_level", settings.get("PARQUET_COMPRESSION_LEVEL")
+        )
+        kwargs.setdefault(
+            "dictionary_columns", settings.getlist("PARQUET_DICTIONARY_COLUMNS")
+        )
+        return cls(file, **kwargs)
+
+    @property
+    def bytes_written(self):
+        """Bytes flushed to the file so far (buffered rows not included)"""
+        return self.sink.tell() if self.sink is not None else 0
+
+    def build_schema(self, item):
+        """Schema from the item's dataclass fields (or inferred from values)"""
+        adapter = ItemAdapter(item)
+        names = list(self.fields_to_export or adapter.field_names())
+        if dataclasses.is_dataclass(item):
+            types = {f.name: f.type for f in dataclasses.fields(item)}
+            return pyarrow.schema(
+                [(name, arrow_type(types.get(name))) for name in names]
+            )
+        return pyarrow.Table.from_pylist([self.to_row(item, names)]).schema
+
+    def to_row(self, item, names):
+        adapter = ItemAdapter(item)
+        return {name: self.serialize(name, adapter.get(name)) for name in names}
+
+    def serialize(self, name, value):
+        if isinstance(value, (list, tuple)):
+            # Multi-valued fields are joined as the CSV feeds do
+            return ", ".join(str(v) for v in value)
+        return value
+
+    def export_item(self, item):
+        if self.schema is None:
+            self.schema = self.build_schema(item)
+        self.rows.append(self.to_row(item, self.schema.names))
+        if len(self.rows) >= self.buffer_rows:
+            self.flush()
+
+    def open_writer(self):
+        self.sink = pyarrow.PythonFile(self.file, mode="w")
+        self.writer = pyarrow.parquet.ParquetWriter(
+            self.sink,
+            self.schema,
+            compression=self.compression,
+            compression_level=self.compression_level,
+            use_dictionary=[
+                name for name in self.dictionary_columns if name in self.schema.names
+            ],
+        )
+
+    def flush(self):
+        """Write the buffered rows out as row groups"""
+        if self.writer is None:
+            self.open_writer()
+        if self.rows:
+            table = pyarrow.Table.from_pylist(self.rows, schema=self.schema)
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+            self.rows = []
+
+    def finish_exporting(self):
+        if self.schema is None:
+            # Nothing was exported; an empty file is not valid Parquet, so
+            # write one with no columns
+            self.schema = pyarrow.schema([])
+        self.flush()
+        self.writer.close()
+
+
+class RollingFeedExporter(FeedExporter):
+    """FeedExporter that also starts a new batch file once one is big enough
+
+    A feed with "batch_max_bytes" (default FEED_EXPORT_BATCH_MAX_BYTES, 0 for
+    no limit) rolls over to %(batch_id)d + 1 once its current file reaches
+    that size, in addition to Scrapy's item count based batches.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        default = self.settings.getint("FEED_EXPORT_BATCH_MAX_BYTES")
+        missing = [
+            name for name in FEED_EXPORTER_INTERNALS if not hasattr(self, name)
+        ]
+        for uri, options in self.feeds.items():
+            options.setdefault("batch_max_bytes", default)
+            if options["batch_max_bytes"] and missing:
+                logger.warning(
+                    f"This Scrapy version's FeedExporter lacks {', '.join(missing)}; "
+                    f"ignoring batch_max_bytes for {uri}"
+                )
+                options["batch_max_bytes"] = 0
+            if options["batch_max_bytes"] and not re.search(
+                r"%\(batch_time\)s|%\(batch_id\)", uri
+            ):
+                logger.error(
+                    f"%(batch_time)s or %(batch_id)d must be in the feed URI "
+                    f"({uri}) when batch_max_bytes is set"
+                )
+                raise NotConfigured
+
+    def _exporter_supported(self, format):
+        # Only improves the error message; if Scrapy stops calling this hook
+        # the generic "unsupported format" error is logged instead
+        if self.exporters.get(format) is ParquetItemExporter and pyarrow is None:
+            logger.error(
+                f"The {format} feed format requires pyarrow (pip install pyarrow)"
+            )
+            return False
+        return super()._exporter_supported(format)
+
+    def batch_full(self, slot):
+        """True once the slot's file has reached its feed's batch_max_bytes"""
+        max_bytes = self.feeds[slot.uri_template]["batch_max_bytes"]
+        if not max_bytes:
+            return False
+        written = getattr(slot.exporter, "bytes_written", None)
+        if written is None:
+            try:
+                written = slot.file.tell()
+            except (AttributeError, OSError):
+                return False
+        return written >= max_bytes
+
+    def item_scraped(self, item, spider):
+        super().item_scraped(item, spider)
+        self.slots = [
+            self.roll_over(slot, spider)
+            if slot.itemcount and self.batch_full(slot)
+            else slot
+            for slot in self.slots
+        ]
+
+    def roll_over(self, slot, spider):
+        """Close ``slot`` and return the slot of its feed's next batch
+
+        Mirrors FeedExporter.item_scraped's item count rollover; the only
+        place the FEED_EXPORTER_INTERNALS are called.
+        """
+        options = self.feeds[slot.uri_template]
+        uri_params = self._get_uri_params(spider, options["uri_params"], slot)
+        self._close_slot(slot, spider)
+        return self._start_new_batch(
+            batch_id=slot.batch_id + 1,
+            uri=slot.uri_template % uri_params,
+            feed_options=options,
+            spider=spider,
+            uri_template=slot.uri_template,
+        )
+
+
+class BufferedFeedFile(io.RawIOBase):
+    """Write-only file that batches writes and performs them on a thread
+
+    Writes are collected in memory and queued for the writer thread once
+    ``max_bytes`` are pending or ``max_seconds`` have passed since the last
+    hand-off. ``sync()`` waits until everything queued is on disk; a write
+    error in the thread is raised by the next write, sync or close.
+    """
+
+    def __init__(self, file, max_bytes=1024 * 1024, max_seconds=5.0):
+        super().__init__()
+        self.file = file
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer = bytearray()
+        self.position = 0
+        self.last_handoff = time.monotonic()
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run, name=f"feed-writer:{file.name}", daemon=True
+        )
+        self.thread.start()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.check()
+        self.buffer += data
+        self.position += len(data)
+        if (
+            len(self.buffer) >= self.max_bytes
+            or time.monotonic() - self.last_handoff >= self.max_seconds
+        ):
+            self.handoff()
+        return len(data)
+
+    def handoff(self):
+        """Queue the pending bytes for the writer thread"""
+        if self.buffer:
+            self.queue.put(bytes(self.buffer))
+            self.buffer.clear()
+        self.last_handoff = time.monotonic()
+
+    def flush(self):
+        # Called by wrappers such as TextIOWrapper; does not wait for the disk
+        if not self.closed:
+            self.handoff()
+
+    def sync(self):
+        """Write out and fsync everything written so far (blocking)"""
+        if self.closed:
+            return
+        self.handoff()
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+        self.check()
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            try:
+                if isinstance(chunk, threading.Event):
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                    chunk.set()
+                elif self.error is None:
+                    self.file.write(chunk)
+            except Exception as e:
+                self.error = e
+                if isinstance(chunk, threading.Event):
+                    chunk.set()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.sync()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            self.file.close()
+            super().close()
+
+
+class BufferedFileFeedStorage(FileFeedStorage):
+    """Local file feed storage writing through a BufferedFeedFile"""
+
+    def __init__(
+        self, uri, *, feed_options=None, max_bytes=1024 * 1024, max_seconds=5.0
+    ):
+        super().__init__(uri, feed_options=feed_options)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.file = None
+
+    @classmethod
+    def from_crawler(cls, crawler, uri, *, feed_options=None):
+        s = cls(
+            uri,
+            feed_options=feed_options,
+            max_bytes=crawler.settings.getint("FEED_BUFFER_BYTES"),
+            max_seconds=crawler.settings.getfloat("FEED_BUFFER_SECONDS"),
+        )
+        crawler.signals.connect(s.sync, signal=checkpoint_saving)
+        return s
+
+    def open(self, spider):
+        self.file = BufferedFeedFile(
+            super().open(spider), self.max_bytes, self.max_seconds
+        )
+        return self.file
+
+    def sync(self):
+        if self.file is not None:
+            self.file.sync()
+
+    def store(self, file):
+        # Draining the last batch and the fsync happen off the reactor thread
+        return deferToThread(file.close)
@@ -0,0 +1,169 @@
+# ===============================================
+# frontier.py - Shared Lease-Based Work Queue
+# ===============================================
+#
+# Instead of each worker crawling a fixed START_ID..END_ID slice, workers
+# lease small batches of book IDs from one SQLite file that every process
+# (or machine, over a shared disk) can open. A lease expires unless its
+# worker keeps renewing it, so IDs held by a crashed worker return to the
+# queue. Workers report each ID's outcome back; failures are re-queued until
+# they reach the attempt limit.
+#
+# The file uses SQLite's default rollback journal rather than WAL, which
+# relies on shared memory and does not work on network filesystems.
+
+import os
+import socket
+import sqlite3
+import time
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+NOT_FOUND = "not_found"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def worker_name():
+    """Identify this process across machines sharing the queue"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Frontier:
+    """SQLite-backed queue of book IDs handed out under expiring leases"""
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3, worker=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker = worker or worker_name()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly where needed
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                book_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state, lease_until);
+            CREATE TABLE IF NOT EXISTS seeded (
+                start_id INTEGER, end_id INTEGER, PRIMARY KEY (start_id, end_id)
+            );
+            """
+        )
+
+    def seed(self, start_id, end_id, batch_size=10000):
+        """Add [start_id, end_id] to the queue once, however many workers ask"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO seeded VALUES (?, ?)", (start_id, end_id)
+            )
+            if cursor.rowcount:
+                for low in range(start_id, end_id + 1, batch_size):
+                    high = min(low + batch_size, end_id + 1)
+                    self.db.executemany(
+                        "INSERT OR IGNORE INTO frontier (book_id) VALUES (?)",
+                        ((i,) for i in range(low, high)),
+                    )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return bool(cursor.rowcount)
+
+    def lease(self, count):
+        """Lease up to ``count`` pending or expired IDs to this worker
+
+        An expired lease that used the last attempt is marked FAILED instead.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(
+                "UPDATE frontier SET state = ?, worker = NULL, lease_until = NULL,"
+                " updated_at = ? WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts),
+            )
+            ids = [
+                row[0]
+                for row in self.db.execute(
+                    "SELECT book_id FROM frontier"
+                    " WHERE (state = ? OR (state = ? AND lease_until < ?))"
+                    " AND attempts < ? ORDER BY book_id LIMIT ?",
+                    (PENDING, LEASED, now, self.max_attempts, count),
+                )
+            ]
+            self.db.executemany(
+                "UPDATE frontier SET state = ?, worker = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE book_id = ?",
+                [(LEASED, self.worker, now + self.lease_seconds, now, i) for i in ids],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return ids
+
+    def renew(self):
+        """Extend every lease this worker holds; returns how many"""
+        now = time.time()
+        cursor = self.db.execute(
+            "UPDATE frontier SET lease_until = ? WHERE state = ? AND worker = ?",
+            (now + self.lease_seconds, LEASED, self.worker),
+        )
+        return cursor.rowcount
+
+    def report(self, results):
+        """Record ``{book_id: state}`` outcomes for IDs this worker leased
+
+        FAILED IDs go back to the queue while they have attempts left.
+        """
+        if not results:
+            return
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "UPDATE frontier SET state = CASE"
+                " WHEN ? = ? AND attempts < ? THEN ? ELSE ? END,"
+                " worker = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE book_id = ? AND worker = ?",
+                [
+                    (state, FAILED, self.max_attempts, PENDING, state, now, i, self.worker)
+                    for i, state in results.items()
+                ],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def release(self):
+        """Hand this worker's unfinished leases back to the queue
+
+        The attempt is still counted, so an ID whose download keeps failing
+        is marked FAILED once it has used the last one.
+        """
+        cursor = self.db.execute(
+            "UPDATE frontier SET state = CASE WHEN attempts < ? THEN ? ELSE ? END,"
+            " worker = NULL, lease_until = NULL, updated_at = ?"
+            " WHERE state = ? AND worker = ?",
+            (self.max_attempts, PENDING, FAILED, time.time(), LEASED, self.worker),
+        )
+        return cursor.rowcount
+
+    def counts(self):
+        """Number of IDs in each state"""
+        return dict(
+            self.db.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state")
+        )
+
+    def close(self):
+        self.db.close()
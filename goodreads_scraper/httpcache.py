@@ -0,0 +1,275 @@
+# ===============================================
+# httpcache.py - Compressed SQLite HTTP Cache
+# ===============================================
+#
+# Scrapy's filesystem cache writes several small files per response, which
+# for a crawl over millions of book IDs means millions of inodes and a cache
+# directory that is slow to list or clean up. SqliteCacheStorage keeps every
+# response in one indexed SQLite file per spider instead:
+#
+#   - bodies are zlib-compressed and stored once per distinct content hash,
+#     so identical pages (e.g. "Page not found") cost one row
+#   - HTTPCACHE_MAX_BYTES bounds the compressed size of the cache; the least
+#     recently used entries are evicted once it is exceeded
+#   - httpcache/hit_rate and httpcache/bytes stats are reported on close
+#
+# Shards of one spider (run_spiders.py) share its cache file. Reads and
+# access-time updates are autocommitted, and every store runs in its own
+# short write transaction that also keeps the cache's total size, so the
+# byte budget and eviction hold across processes.
+# RevalidatingCachePolicy serves cached pages for HTTPCACHE_FRESHNESS_SECS and
+# afterwards revalidates them with a conditional request (If-None-Match /
+# If-Modified-Since). A 304, or a 200 whose body hashes the same as the
+# cached one, marks the response ``meta["cache_unchanged"]`` so
+# UnchangedPageMiddleware can skip parsing it again.
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteCacheStorage:
+    """HTTPCACHE_STORAGE backend keeping compressed responses in SQLite"""
+
+    # Fraction of the budget to free at once, so eviction does not run on
+    # every store once the cache is full
+    EVICT_HEADROOM = 0.1
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"])
+        # Shards start together; data_path(createdir=True) races on mkdir
+        os.makedirs(self.cachedir, exist_ok=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.max_bytes = settings.getint("HTTPCACHE_MAX_BYTES")
+        self.compression_level = settings.getint("HTTPCACHE_COMPRESSION_LEVEL", 6)
+        self.db = None
+        self.stats = None
+        self.fingerprinter = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f"{spider.name}.sqlite")
+        # Autocommit mode; stores open their own transaction
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS bodies (
+                hash BLOB PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                refs INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint BLOB PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers BLOB NOT NULL,
+                body_hash BLOB NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_size
+                SELECT 0, COALESCE(SUM(size), 0) FROM bodies;
+            """
+        )
+        self.stats = spider.crawler.stats
+        self.fingerprinter = spider.crawler.request_fingerprinter
+        logger.debug(f"Using SQLite cache storage in {path}", extra={"spider": spider})
+
+    def close_spider(self, spider):
+        total_bytes = self.total_bytes()
+        self.db.close()
+        hits = self.stats.get_value("httpcache/hit", 0, spider=spider)
+        misses = self.stats.get_value("httpcache/miss", 0, spider=spider)
+        if hits + misses:
+            self.stats.set_value(
+                "httpcache/hit_rate", round(hits / (hits + misses), 4), spider=spider
+            )
+        self.stats.set_value("httpcache/bytes", total_bytes, spider=spider)
+
+    def total_bytes(self):
+        """Compressed size of all stored bodies, as kept by every writer"""
+        return self.db.execute("SELECT bytes FROM cache_size").fetchone()[0]
+
+    def add_bytes(self, size):
+        self.db.execute("UPDATE cache_size SET bytes = bytes + ?", (size,))
+
+    def retrieve_response(self, spider, request):
+        fingerprint = self.fingerprinter.fingerprint(request)
+        row = self.db.execute(
+            "SELECT r.url, r.status, r.headers, r.stored_at, b.data"
+            " FROM responses r JOIN bodies b ON b.hash = r.body_hash"
+            " WHERE r.fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None  # not cached
+        url, status, raw_headers, stored_at, data = row
+        if 0 < self.expiration_secs < time.time() - stored_at:
+            return None  # expired
+
+        try:
+            self.db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE fingerprint = ?",
+                (time.time(), fingerprint),
+            )
+        except sqlite3.OperationalError as e:
+            # Only affects eviction order; never fail a cache hit over it
+            logger.debug(f"Could not update cache access time: {e}")
+        headers = Headers(headers_raw_to_dict(zlib.decompress(raw_headers)))
+        body = zlib.decompress(data)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        fingerprint = self.fingerprinter.fingerprint(request)
+        body_hash = hashlib.sha1(response.body).digest()
+        headers = zlib.compress(headers_dict_to_raw(response.headers))
+        now = time.time()
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.release_body(fingerprint)
+            updated = self.db.execute(
+                "UPDATE bodies SET refs = refs + 1 WHERE hash = ?", (body_hash,)
+            ).rowcount
+            if updated:
+                self.stats.inc_value("httpcache/deduplicated", spider=spider)
+            else:
+                data = zlib.compress(response.body, self.compression_level)
+                self.db.execute(
+                    "INSERT INTO bodies VALUES (?, ?, ?, 1)",
+                    (body_hash, data, len(data)),
+                )
+                self.add_bytes(len(data))
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    fingerprint,
+                    response.url,
+                    response.status,
+                    headers,
+                    body_hash,
+                    now,
+                    now,
+                ),
+            )
+            if self.max_bytes and self.total_bytes() > self.max_bytes:
+                self.evict(spider)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def release_body(self, fingerprint):
+        """Drop one reference to the body an entry points at, if any"""
+        row = self.db.execute(
+            "SELECT body_hash FROM responses WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM responses WHERE fingerprint = ?", (fingerprint,))
+        self.db.execute("UPDATE bodies SET refs = refs - 1 WHERE hash = ?", row)
+        freed = self.db.execute(
+            "SELECT size FROM bodies WHERE hash = ? AND refs <= 0", row
+        ).fetchone()
+        if freed:
+            self.db.execute("DELETE FROM bodies WHERE hash = ?", row)
+            self.add_bytes(-freed[0])
+
+    def evict(self, spider):
+        """Delete least recently used entries until under budget (with headroom)"""
+        target = self.max_bytes * (1 - self.EVICT_HEADROOM)
+        evicted = 0
+        while self.total_bytes() > target:
+            rows = self.db.execute(
+                "SELECT fingerprint FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for (fingerprint,) in rows:
+                self.release_body(fingerprint)
+                evicted += 1
+                if self.total_bytes() <= target:
+                    break
+        self.stats.inc_value("httpcache/evicted", evicted, spider=spider)
+
+
+class RevalidatingCachePolicy:
+    """HTTPCACHE_POLICY that revalidates stale pages instead of refetching"""
+
+    def __init__(self, settings):
+        self.freshness_secs = settings.getint("HTTPCACHE_FRESHNESS_SECS")
+        self.ignore_schemes = settings.getlist("HTTPCACHE_IGNORE_SCHEMES")
+        self.ignore_http_codes = {
+            int(x) for x in settings.getlist("HTTPCACHE_IGNORE_HTTP_CODES")
+        }
+
+    def should_cache_request(self, request):
+        return (
+            request.method == "GET"
+            and urlparse_cached(request).scheme not in self.ignore_schemes
+        )
+
+    def should_cache_response(self, response, request):
+        # Server errors and throttling are retried, never served from cache
+        return (
+            response.status < 500
+            and response.status not in (304, 429)
+            and response.status not in self.ignore_http_codes
+        )
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        """Fresh for HTTPCACHE_FRESHNESS_SECS after the cached Date header
+
+        A stale response gets the request's conditional headers set, so the
+        server can answer 304 instead of resending the page.
+        """
+        try:
+            date = parsedate_to_datetime(
+                cachedresponse.headers.get("Date", b"").decode("latin-1")
+            ).timestamp()
+        except (TypeError, ValueError):
+            date = 0
+        if time.time() - date < self.freshness_secs:
+            return True
+
+        if b"ETag" in cachedresponse.headers:
+            request.headers[b"If-None-Match"] = cachedresponse.headers[b"ETag"]
+        if b"Last-Modified" in cachedresponse.headers:
+            request.headers[b"If-Modified-Since"] = cachedresponse.headers[
+                b"Last-Modified"
+            ]
+        return False
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        """True for a 304, or a full response with an unchanged body"""
+        if response.status == 304:
+            unchanged = True
+        else:
+            unchanged = (
+                response.status == cachedresponse.status
+                and hashlib.sha1(response.body).digest()
+                == hashlib.sha1(cachedresponse.body).digest()
+            )
+        if unchanged:
+            request.meta["cache_unchanged"] = True
+        return unchanged
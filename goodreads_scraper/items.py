@@ -3,6 +3,12 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+import hashlib
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Union, get_args, get_origin
+
 import scrapy
 
 
@@ -10,3 +16,153 @@ class GoodreadsScraperItem(scrapy.Item):
     # define the fields for your item here like:
     # name = scrapy.Field()
     pass
+
+
+MISSING = {"", "N/A", "Unknown date"}
+
+
+def value_type(annotation):
+    """The value type of a field annotation: ``int`` for ``Optional[int]``"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def to_text(value):
+    """Strip text; placeholders such as "N/A" become None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value in MISSING else value
+
+
+def to_int(value):
+    """Parse "3,562,057" or "652 pages" as an int (None when missing)"""
+    if isinstance(value, int) or value is None:
+        return value
+    match = re.search(r"\d[\d,]*", str(value))
+    return int(match.group().replace(",", "")) if match else None
+
+
+def to_float(value):
+    """Parse "4.58" as a float (None when missing)"""
+    if isinstance(value, float) or value is None:
+        return value
+    match = re.search(r"\d+(?:\.\d+)?", str(value))
+    return float(match.group()) if match else None
+
+
+def to_iso_date(value):
+    """Normalize "September 13, 2020" or "Sep 13, 2020" to 2020-09-13
+
+    Dates in any other format are kept as scraped rather than dropped.
+    """
+    value = to_text(value)
+    if value is None:
+        return None
+    for fmt in ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+class NormalizedItem:
+    """Base for item dataclasses whose fields are converted when set
+
+    Subclasses map field names to converters in ``CONVERTERS``; unlisted
+    fields are stored as given. Conversion happens in ``__setattr__``, so it
+    applies to the constructor as well as to later updates.
+    """
+
+    __slots__ = ()
+    CONVERTERS = {}
+
+    def __setattr__(self, name, value):
+        convert = self.CONVERTERS.get(name)
+        object.__setattr__(self, name, convert(value) if convert else value)
+
+    def update(self, fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+@dataclass(slots=True)
+class BookItem(NormalizedItem):
+    """Book details scraped from /book/show/{id}"""
+
+    book_id: int
+    url: Optional[str] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    avg_rating: Optional[float] = None
+    ratings_count: Optional[int] = None
+    reviews_count: Optional[int] = None
+    isbn: Optional[str] = None
+    pages: Optional[int] = None
+    publisher: Optional[str] = None
+    genres: Optional[str] = None
+    scraped_at: Optional[str] = None
+
+    CONVERTERS = {
+        "book_id": to_int,
+        "title": to_text,
+        "author": to_text,
+        "avg_rating": to_float,
+        "ratings_count": to_int,
+        "reviews_count": to_int,
+        "isbn": to_text,
+        "pages": to_int,
+        "publisher": to_text,
+        "genres": to_text,
+    }
+
+
+@dataclass(slots=True)
+class ReviewItem(NormalizedItem):
+    """A single review card together with its book's summary fields"""
+
+    # None when the card has no ID of its own; derived in __post_init__
+    review_id: Optional[str]
+    book_id: int
+    reviewer: Optional[str] = None
+    rating: Optional[float] = None
+    date: Optional[str] = None
+    review_text: Optional[str] = None
+    book_title: Optional[str] = None
+    book_author: Optional[str] = None
+    book_avg_rating: Optional[float] = None
+    book_ratings_count: Optional[int] = None
+
+    CONVERTERS = {
+        "review_id": to_text,
+        "book_id": to_int,
+        "reviewer": to_text,
+        "rating": to_float,
+        "date": to_iso_date,
+        "book_title": to_text,
+        "book_author": to_text,
+        "book_avg_rating": to_float,
+        "book_ratings_count": to_int,
+    }
+
+    def __post_init__(self):
+        # Cards without an ID of their own get one derived from their
+        # content, which stays the same whatever order the reviews come in
+        if self.review_id is None:
+            self.review_id = f"review_{self.book_id}_{self.content_hash().hex()[:16]}"
+
+    def content_hash(self):
+        """128-bit hash of book, reviewer, date and whitespace-normalized text"""
+        parts = [
+            str(self.book_id),
+            (self.reviewer or "").casefold(),
+            self.date or "",
+            " ".join((self.review_text or "").split()).casefold(),
+        ]
+        return hashlib.blake2b(
+            "\x1f".join(parts).encode("utf-8"), digest_size=16
+        ).digest()
@@ -3,11 +3,66 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
 from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import NotConfigured
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.response import response_status_message
+from twisted.internet import task
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from goodreads_scraper import embedded, frontier
+from goodreads_scraper.items import BookItem
+from goodreads_scraper.recrawl import RecrawlHistory, parse_timestamp
+from goodreads_scraper.checkpoint import (
+    Checkpoint,
+    IdBitmap,
+    NegativeCache,
+    PendingPages,
+    book_id_from_url,
+    checkpoint_path,
+    checkpoint_saved,
+    checkpoint_saving,
+)
+
+logger = logging.getLogger(__name__)
+
+# Statuses meaning a page does not exist, as opposed to a failed fetch
+MISSING_STATUSES = (404, 410)
+
+
+def review_page_book_id(request):
+    """Book ID of a review listing page request, None for anything else"""
+    if isinstance(request, Request) and "review_page" in request.meta:
+        return request.meta.get("book_id")
+    return None
+
+
+def is_missing(response, exception=None):
+    """True for a 404/410 answer (or one a callback flagged as not found)"""
+    if exception is not None and not isinstance(exception, HttpError):
+        return False
+    return response.meta.get("not_found") or response.status in MISSING_STATUSES
+
+
+def redirected_to(response):
+    """ID of the other book a book page redirected to, or None"""
+    final_id = book_id_from_url(response.url)
+    if response.meta.get("redirect_urls") and final_id != response.meta["book_id"]:
+        return final_id
+    return None
+
 
 class GoodreadsScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +156,740 @@ class GoodreadsScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class BrowserEscalationMiddleware:
+    """Fetch with the normal downloader first, escalate to a browser on demand
+
+    Responses that lack the content a review spider needs (no ``.ReviewCard``
+    elements, or collapsed review text not covered by embedded data) are
+    re-queued with ``meta["browser"]`` set so ``BrowserDownloadHandler``
+    renders them. Everything else is passed through untouched, so the browser
+    cost is paid only on the pages that need it.
+
+    Enable with ``BROWSER_ESCALATION_ENABLED``. A request can name a different
+    callback for its rendered response with ``meta["browser_callback"]``.
+    Rendered requests bypass the HTTP cache: they share the plain request's
+    fingerprint, so a cache hit would hand back the page that was just found
+    lacking.
+    """
+
+    def __init__(self, stats, max_reviews=None):
+        self.stats = stats
+        self.max_reviews = max_reviews
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("BROWSER_ESCALATION_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            crawler.stats,
+            max_reviews=crawler.settings.getint("MAX_REVIEWS_PER_BOOK") or None,
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_response(self, request, response, spider):
+        if request.meta.get("browser_escalated") or response.status != 200:
+            return response
+        if not isinstance(response, HtmlResponse):
+            return response
+
+        self.stats.inc_value("browser_escalation/checked", spider=spider)
+        if not self.needs_browser(response, request.meta.get("book_id")):
+            return response
+
+        self.stats.inc_value("browser_escalation/escalated", spider=spider)
+        spider.logger.info(f"🔁 Escalating {request.url} to the browser")
+        return self.browser_request(request, spider)
+
+    def needs_browser(self, response, book_id):
+        """True when the plain HTTP response lacks full review content"""
+        if "Page not found" in response.text:
+            return False
+        if embedded.has_truncated_reviews(response, book_id, limit=self.max_reviews):
+            return True
+        if response.css(".ReviewCard"):
+            return False
+        if embedded.extract_reviews(response, book_id):
+            return False
+        # A book without any reviews legitimately renders no cards
+        book = embedded.extract_book(response, book_id) or {}
+        return book.get("reviews_count") != "0"
+
+    def browser_request(self, request, spider):
+        """Copy ``request`` flagged for rendering by BrowserDownloadHandler"""
+        callback = request.callback
+        if request.meta.get("browser_callback"):
+            callback = getattr(spider, request.meta["browser_callback"])
+
+        return request.replace(
+            callback=callback,
+            meta={
+                **request.meta,
+                "browser": True,
+                "browser_escalated": True,
+                "dont_cache": True,
+            },
+            dont_filter=True,
+        )
+
+    def spider_closed(self, spider):
+        checked = self.stats.get_value("browser_escalation/checked", 0, spider=spider)
+        escalated = self.stats.get_value(
+            "browser_escalation/escalated", 0, spider=spider
+        )
+        if checked:
+            self.stats.set_value(
+                "browser_escalation/rate", round(escalated / checked, 4), spider=spider
+            )
+
+
+class CheckpointMiddleware:
+    """Skip finished book IDs on restart and record newly finished ones
+
+    A book counts as finished once the callback for its /book/show page and
+    those of all review listing pages (``meta["review_page"]``) requested
+    for it have been fully consumed; a failed review page leaves the book
+    for the next run. Missing books (404/410, or flagged by the callback
+    with ``meta["not_found"]``) are recorded separately. HTTP errors of
+    spiders without an errback are seen in process_spider_exception, before
+    HttpErrorMiddleware drops them. State is flushed every
+    CHECKPOINT_FLUSH_INTERVAL seconds and on close, and dropped once the
+    crawl finishes normally.
+    """
+
+    def __init__(self, crawler, flush_interval=30):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.flush_interval = flush_interval
+        self.checkpoint = None
+        self.pages = PendingPages()
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CHECKPOINT_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            crawler,
+            flush_interval=crawler.settings.getfloat("CHECKPOINT_FLUSH_INTERVAL", 30),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.request_dropped, signal=signals.request_dropped)
+        return s
+
+    def spider_opened(self, spider):
+        self.checkpoint = Checkpoint(
+            checkpoint_path(self.crawler.settings, spider.name)
+        )
+        if self.checkpoint.load():
+            spider.logger.info(
+                f"Resuming from {self.checkpoint.path}: "
+                f"{len(self.checkpoint.done)} done, "
+                f"{len(self.checkpoint.not_found)} not found"
+            )
+
+    async def process_start(self, start):
+        async for r in start:
+            book_id = r.meta.get("book_id")
+            if book_id is not None and self.checkpoint.is_finished(book_id):
+                self.stats.inc_value("checkpoint/skipped")
+                continue
+            yield r
+
+    def process_spider_output(self, response, result, spider):
+        for i in result:
+            self.track(i)
+            yield i
+        self.finish(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in result:
+            self.track(i)
+            yield i
+        self.finish(response, spider)
+
+    def track(self, output):
+        page_of = review_page_book_id(output)
+        if page_of is not None:
+            self.pages.add(page_of)
+
+    def finish(self, response, spider):
+        """Settle the page once its callback output has been consumed"""
+        book_id = response.meta.get("book_id")
+        if book_id is None:
+            return
+        if "review_page" in response.meta:
+            if response.status >= 400 and not is_missing(response):
+                self.record(book_id, self.pages.page_failed(book_id), spider)
+            else:
+                self.record(book_id, self.pages.page_done(book_id), spider)
+        elif is_missing(response):
+            self.record(book_id, self.pages.book_done(book_id, "not_found"), spider)
+        elif response.status < 400:
+            self.record(book_id, self.pages.book_done(book_id, "done"), spider)
+        # Errback output for other HTTP errors: leave it for the next run
+
+    def process_spider_exception(self, response, exception, spider):
+        book_id = response.meta.get("book_id")
+        if book_id is None:
+            return None
+        if "review_page" in response.meta:
+            if is_missing(response, exception):
+                self.record(book_id, self.pages.page_done(book_id), spider)
+            else:
+                self.record(book_id, self.pages.page_failed(book_id), spider)
+        elif is_missing(response, exception):
+            self.record(book_id, self.pages.book_done(book_id, "not_found"), spider)
+        return None
+
+    def request_dropped(self, request, spider):
+        # A review page the dupefilter dropped was already handled this run
+        book_id = review_page_book_id(request)
+        if book_id is not None:
+            self.record(book_id, self.pages.page_done(book_id), spider)
+
+    def record(self, book_id, outcome, spider):
+        """Checkpoint a book whose pages have all finished"""
+        if outcome == "not_found":
+            self.checkpoint.mark_not_found(book_id)
+        elif outcome == "done":
+            self.checkpoint.mark_done(book_id)
+        else:
+            return
+        self.stats.inc_value("checkpoint/marked", spider=spider)
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.checkpoint.dirty:
+            # Feed files are synced first; if that fails, keep the old
+            # checkpoint so the affected books are crawled again
+            results = self.crawler.signals.send_catch_log(signal=checkpoint_saving)
+            if any(isinstance(result, Failure) for _, result in results):
+                self.stats.inc_value("checkpoint/sync_failed")
+            else:
+                self.checkpoint.save()
+                self.stats.inc_value("checkpoint/flushes")
+                self.crawler.signals.send_catch_log(signal=checkpoint_saved)
+        self.last_flush = time.monotonic()
+
+    def spider_closed(self, spider, reason):
+        if reason == "finished":
+            self.checkpoint.remove()
+        else:
+            self.flush()
+
+
+class NegativeCacheMiddleware:
+    """Skip book IDs that were dead or redirected on a recent run
+
+    IDs answering 404/410, flagged ``meta["not_found"]`` by the callback, or
+    redirecting to a different book ID are stored in NEGATIVE_CACHE_FILE and
+    dropped from the start requests of later runs until NEGATIVE_CACHE_TTL
+    seconds have passed. An ID that answers normally again is forgotten.
+    Without an errback a 404/410 only reaches process_spider_exception.
+    """
+
+    def __init__(self, crawler, path, ttl):
+        self.stats = crawler.stats
+        self.cache = NegativeCache(path, ttl)
+        self.dead = IdBitmap()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("NEGATIVE_CACHE_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            crawler,
+            settings.get("NEGATIVE_CACHE_FILE"),
+            settings.getfloat("NEGATIVE_CACHE_TTL"),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.dead = self.cache.load_fresh()
+        spider.logger.info(f"Negative cache: skipping {len(self.dead)} dead book IDs")
+
+    async def process_start(self, start):
+        async for r in start:
+            if r.meta.get("book_id") in self.dead:
+                self.stats.inc_value("negative_cache/skipped")
+                continue
+            yield r
+
+    def process_spider_output(self, response, result, spider):
+        yield from result
+        self.finish(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in result:
+            yield i
+        self.finish(response, spider)
+
+    def finish(self, response, spider):
+        """Record a dead, redirected or revived book page"""
+        book_id = response.meta.get("book_id")
+        if book_id is None or "review_page" in response.meta:
+            return
+
+        final_id = redirected_to(response)
+        if is_missing(response):
+            self.cache.mark_dead(book_id, "not_found")
+        elif final_id is not None:
+            self.cache.mark_dead(book_id, f"redirected:{final_id}")
+        elif response.status == 200:
+            if book_id in self.dead:
+                self.cache.mark_alive(book_id)
+            return
+        else:
+            return
+        self.stats.inc_value("negative_cache/recorded", spider=spider)
+
+    def process_spider_exception(self, response, exception, spider):
+        book_id = response.meta.get("book_id")
+        if (
+            book_id is not None
+            and "review_page" not in response.meta
+            and is_missing(response, exception)
+        ):
+            self.cache.mark_dead(book_id, "not_found")
+            self.stats.inc_value("negative_cache/recorded", spider=spider)
+        return None
+
+    def spider_closed(self, spider):
+        self.cache.close()
+
+
+class StatusRetryMiddleware(RetryMiddleware):
+    """Retry by failure class, with backoff and a per-run retry budget
+
+    Statuses in RETRY_PERMANENT_HTTP_CODES (missing or forbidden pages) are
+    never retried, even if a spider lists them in RETRY_HTTP_CODES. Throttled
+    statuses (RETRY_THROTTLED_HTTP_CODES) wait for the server's Retry-After;
+    other transient statuses and download errors wait an exponential backoff
+    with full jitter. Every retry is charged to RETRY_BUDGET (0 = unlimited);
+    once it is spent, failures are passed on without retrying.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler.settings)
+        settings = crawler.settings
+        self.stats = crawler.stats
+        self.permanent_codes = {
+            int(x) for x in settings.getlist("RETRY_PERMANENT_HTTP_CODES")
+        }
+        self.throttled_codes = {
+            int(x) for x in settings.getlist("RETRY_THROTTLED_HTTP_CODES")
+        }
+        self.retry_http_codes = (
+            self.retry_http_codes | self.throttled_codes
+        ) - self.permanent_codes
+        self.backoff_base = settings.getfloat("RETRY_BACKOFF_BASE", 1.0)
+        self.backoff_max = settings.getfloat("RETRY_BACKOFF_MAX", 60.0)
+        self.budget = settings.getint("RETRY_BUDGET")
+        self.spent = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        if request.meta.get("dont_retry", False):
+            return response
+        if response.status in self.permanent_codes:
+            self.stats.inc_value("retry/permanent", spider=spider)
+            return response
+        if response.status not in self.retry_http_codes:
+            return response
+
+        if response.status in self.throttled_codes:
+            self.stats.inc_value("retry/throttled", spider=spider)
+            delay = self.retry_after(response)
+            if delay is None:
+                delay = self.backoff_delay(request)
+        else:
+            delay = self.backoff_delay(request)
+        reason = response_status_message(response.status)
+        return self.delayed_retry(request, reason, delay, spider) or response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get("dont_retry", False):
+            return None
+        if not isinstance(exception, self.exceptions_to_retry):
+            return None
+        return self.delayed_retry(
+            request, exception, self.backoff_delay(request), spider
+        )
+
+    def delayed_retry(self, request, reason, delay, spider):
+        """Charge the budget and return a Deferred firing the retry request"""
+        if self.budget and self.spent >= self.budget:
+            self.stats.inc_value("retry/budget_exhausted", spider=spider)
+            return None
+        retry_request = self._retry(request, reason, spider)
+        if retry_request is None:
+            return None
+
+        self.spent += 1
+        self.stats.set_value("retry/budget_spent", self.spent, spider=spider)
+        if self.budget:
+            self.stats.set_value(
+                "retry/budget_remaining", self.budget - self.spent, spider=spider
+            )
+        if delay <= 0:
+            return retry_request
+
+        self.stats.inc_value("retry/backoff_ms", int(delay * 1000), spider=spider)
+        from twisted.internet import reactor
+
+        return task.deferLater(reactor, delay, lambda: retry_request)
+
+    def backoff_delay(self, request):
+        """Exponential backoff with full jitter for the next attempt"""
+        attempt = request.meta.get("retry_times", 0)
+        cap = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(0, cap)
+
+    def retry_after(self, response):
+        """Seconds to wait per the Retry-After header (seconds or HTTP date)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        value = value.decode("latin-1").strip()
+        if value.isdigit():
+            return min(float(value), self.backoff_max)
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+        return min(max(delay, 0.0), self.backoff_max)
+
+
+class FrontierMiddleware:
+    """Crawl book IDs leased from a shared Frontier instead of a fixed range
+
+    Workers pointed at the same FRONTIER_FILE seed it with their spider's
+    START_ID..END_ID (once per range) and then lease FRONTIER_BATCH_SIZE IDs
+    at a time. Scrapy pulls start requests as fast as they come, so the next
+    batch is only leased once the scheduler has run dry (scheduler_empty):
+    a worker holds about one batch beyond what it is downloading, and one
+    stuck on heavy pages simply leases less. Requests
+    are built by the spider's ``book_request(book_id)`` and bypass the
+    duplicate filter, since a FAILED ID may come back to the worker that
+    already requested it. Outcomes are reported back once a book's page and
+    all of its review listing pages have been handled (a failed review page
+    fails the book), and leases are renewed while the worker runs and
+    released when it stops.
+    """
+
+    def __init__(self, crawler, store, batch_size, report_interval):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.frontier = store
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.results = {}
+        self.unscheduled = set()
+        self.pages = PendingPages(failed=frontier.FAILED)
+        self.wanted = None
+        self.heartbeat = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("FRONTIER_ENABLED"):
+            raise NotConfigured
+        store = frontier.Frontier(
+            settings.get("FRONTIER_FILE"),
+            lease_seconds=settings.getfloat("FRONTIER_LEASE_SECONDS"),
+            max_attempts=settings.getint("FRONTIER_MAX_ATTEMPTS"),
+        )
+        s = cls(
+            crawler,
+            store,
+            batch_size=settings.getint("FRONTIER_BATCH_SIZE"),
+            report_interval=settings.getfloat("FRONTIER_REPORT_INTERVAL"),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(s.request_dropped, signal=signals.request_dropped)
+        crawler.signals.connect(s.scheduler_empty, signal=signals.scheduler_empty)
+        return s
+
+    def spider_opened(self, spider):
+        if self.frontier.seed(spider.START_ID, spider.END_ID):
+            spider.logger.info(
+                f"Seeded frontier with book IDs {spider.START_ID}-{spider.END_ID}"
+            )
+        self.heartbeat = task.LoopingCall(self.report_and_renew)
+        self.heartbeat.start(self.report_interval, now=False)
+
+    async def process_start(self, start):
+        # The spider's own ID range is replaced by leased IDs
+        spider = self.crawler.spider
+        while True:
+            self.report_skipped()
+            ids = self.frontier.lease(self.batch_size)
+            if not ids:
+                break
+            self.stats.inc_value("frontier/leased", len(ids))
+            for book_id in ids:
+                self.unscheduled.add(book_id)
+                yield spider.book_request(book_id).replace(dont_filter=True)
+            # Each request is scheduled before the next one is pulled
+            self.wanted = Deferred()
+            await maybe_deferred_to_future(self.wanted)
+        self.report_skipped()
+
+    def scheduler_empty(self):
+        if self.wanted is not None and not self.wanted.called:
+            self.wanted.callback(None)
+
+    def request_scheduled(self, request, spider):
+        self.unscheduled.discard(request.meta.get("book_id"))
+
+    def request_dropped(self, request, spider):
+        book_id = request.meta.get("book_id")
+        if book_id is None:
+            return
+        if "review_page" in request.meta:
+            # Already fetched this run
+            self.record(book_id, self.pages.page_done(book_id))
+        else:
+            # Rejected by the scheduler: not crawled, so let it be leased again
+            self.unscheduled.discard(book_id)
+            self.results[book_id] = frontier.FAILED
+
+    def report_skipped(self):
+        """Report leased IDs that another middleware dropped before scheduling
+
+        Requests that pass every start-request filter are scheduled before
+        the next one is pulled, so by the time the next batch is leased,
+        anything still unscheduled was skipped (e.g. by the negative cache).
+        """
+        for book_id in self.unscheduled:
+            self.results[book_id] = frontier.SKIPPED
+        self.unscheduled.clear()
+
+    def process_spider_output(self, response, result, spider):
+        for i in result:
+            self.track(i)
+            yield i
+        self.finish(response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in result:
+            self.track(i)
+            yield i
+        self.finish(response)
+
+    def track(self, output):
+        page_of = review_page_book_id(output)
+        if page_of is not None:
+            self.pages.add(page_of)
+
+    def finish(self, response):
+        """Settle the page once its callback output has been consumed"""
+        book_id = response.meta.get("book_id")
+        if book_id is None:
+            return
+        if "review_page" in response.meta:
+            if response.status >= 400 and not is_missing(response):
+                self.record(book_id, self.pages.page_failed(book_id))
+            else:
+                self.record(book_id, self.pages.page_done(book_id))
+        elif is_missing(response):
+            self.record(book_id, self.pages.book_done(book_id, frontier.NOT_FOUND))
+        elif response.status >= 400:
+            self.record(book_id, self.pages.book_done(book_id, frontier.FAILED))
+        else:
+            self.record(book_id, self.pages.book_done(book_id, frontier.DONE))
+
+    def process_spider_exception(self, response, exception, spider):
+        book_id = response.meta.get("book_id")
+        if book_id is None:
+            return None
+        if "review_page" in response.meta:
+            if is_missing(response, exception):
+                self.record(book_id, self.pages.page_done(book_id))
+            else:
+                self.record(book_id, self.pages.page_failed(book_id))
+        elif is_missing(response, exception):
+            self.record(book_id, self.pages.book_done(book_id, frontier.NOT_FOUND))
+        else:
+            self.record(book_id, self.pages.book_done(book_id, frontier.FAILED))
+        return None
+
+    def record(self, book_id, state):
+        if state is not None:
+            self.results[book_id] = state
+
+    def report_and_renew(self):
+        self.report()
+        self.frontier.renew()
+
+    def report(self):
+        for state in self.results.values():
+            self.stats.inc_value(f"frontier/reported/{state}")
+        self.frontier.report(self.results)
+        self.results = {}
+
+    def spider_closed(self, spider):
+        if self.heartbeat and self.heartbeat.running:
+            self.heartbeat.stop()
+        self.report()
+        released = self.frontier.release()
+        if released:
+            spider.logger.info(f"Released {released} unfinished frontier leases")
+        spider.logger.info(f"Frontier state: {self.frontier.counts()}")
+        self.frontier.close()
+
+
+class UnchangedPageMiddleware:
+    """Skip callbacks for pages the HTTP cache revalidated as unchanged
+
+    RevalidatingCachePolicy flags ``meta["cache_unchanged"]`` when a stale
+    page came back 304 or with an identical body; its items were already
+    exported on an earlier run. Callbacks are generators, so not iterating
+    one means the page is never parsed. Outer middlewares (checkpoint,
+    frontier) still see the response and record the book as done.
+
+    The skipped items are missing from this run's feeds, so this is only
+    enabled when the delta export or the SQLite sink holds earlier records.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("HTTPCACHE_SKIP_UNCHANGED"):
+            raise NotConfigured
+        if not (
+            settings.getbool("DELTA_ENABLED") or settings.getbool("SQLITE_SINK_ENABLED")
+        ):
+            logger.warning(
+                "HTTPCACHE_SKIP_UNCHANGED needs DELTA_ENABLED or "
+                "SQLITE_SINK_ENABLED; parsing unchanged pages as usual"
+            )
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_spider_output(self, response, result, spider):
+        if not self.skipped(response, spider):
+            yield from result
+
+    async def process_spider_output_async(self, response, result, spider):
+        if not self.skipped(response, spider):
+            async for i in result:
+                yield i
+
+    def skipped(self, response, spider):
+        if response.meta.get("cache_unchanged"):
+            self.stats.inc_value("httpcache/unchanged_skipped", spider=spider)
+            return True
+        return False
+
+
+class RecrawlMiddleware:
+    """Record each book's change history and recrawl the likeliest changes
+
+    Every BookItem updates RecrawlHistory with its ratings and review
+    counts; pages the HTTP cache found unchanged count as visits without a
+    change. With RECRAWL_ENABLED the spider's ID range is replaced by the
+    RECRAWL_BUDGET known books most likely to have changed since their last
+    visit. Visits are written to the shared history file in batches of
+    COMMIT_EVERY.
+    """
+
+    COMMIT_EVERY = 100
+
+    def __init__(self, crawler, history, schedule, budget):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.history = history
+        self.schedule = schedule
+        self.budget = budget
+        self.pending = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("RECRAWL_HISTORY_ENABLED"):
+            raise NotConfigured
+        history = RecrawlHistory(
+            settings.get("RECRAWL_STATE_FILE"),
+            default_interval=settings.getfloat("RECRAWL_DEFAULT_INTERVAL"),
+        )
+        s = cls(
+            crawler,
+            history,
+            schedule=settings.getbool("RECRAWL_ENABLED"),
+            budget=settings.getint("RECRAWL_BUDGET"),
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_start(self, start):
+        if not self.schedule:
+            async for r in start:
+                yield r
+            return
+
+        spider = self.crawler.spider
+        book_ids = self.history.recrawl_list(self.budget)
+        spider.logger.info(f"Recrawling the {len(book_ids)} books most likely to have changed")
+        self.stats.set_value("recrawl/scheduled", len(book_ids))
+        for book_id in book_ids:
+            yield spider.book_request(book_id)
+
+    def process_spider_output(self, response, result, spider):
+        for i in result:
+            self.track(i)
+            yield i
+        self.finish(response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in result:
+            self.track(i)
+            yield i
+        self.finish(response)
+
+    def track(self, output):
+        if isinstance(output, BookItem):
+            self.observe(
+                output.book_id,
+                parse_timestamp(output.scraped_at),
+                output.ratings_count,
+                output.reviews_count,
+            )
+
+    def finish(self, response):
+        book_id = response.meta.get("book_id")
+        if book_id is not None and response.meta.get("cache_unchanged"):
+            if "review_page" not in response.meta:
+                self.observe(book_id, time.time())
+
+    def observe(self, book_id, visited_at, ratings_count=None, reviews_count=None):
+        self.pending.append((book_id, visited_at, ratings_count, reviews_count))
+        self.stats.inc_value("recrawl/observed")
+        if len(self.pending) >= self.COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.history.observe_many(self.pending)
+            self.pending = []
+
+    def spider_closed(self, spider):
+        self.flush()
+        self.history.close()
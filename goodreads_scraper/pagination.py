@@ -0,0 +1,97 @@
+# ===============================================
+# pagination.py - Review Listing Pagination
+# ===============================================
+#
+# A book page only carries the first page of its reviews. The rest are
+# listed at /book/show/{id}/reviews, one page per cursor: every page embeds
+# its review connection (``getReviews`` in the Apollo cache) together with
+# ``pageInfo.nextPageToken``, the cursor of the page after it. Both review
+# spiders follow those cursors through next_review_page, up to
+# REVIEW_PAGE_BUDGET pages and the per-book review budget.
+#
+# Cursors are opaque, so one book's pages are fetched one after another;
+# several books' pages are in flight at once. A site that ignores the cursor
+# would return the same reviews again, so a page repeating any review of the
+# page before it is dropped and ends the walk (repeats_previous_page).
+#
+# Once the last page of a book's listing has been read without hitting the
+# review budget, review_listing_complete is sent with the book's ID: every
+# current review of the book has then been seen this run.
+
+from urllib.parse import quote
+
+import scrapy
+
+from goodreads_scraper import embedded
+
+# Signal sent with ``book_id`` when a book's whole review listing was read
+review_listing_complete = object()
+
+
+def repeats_previous_page(spider, response, review_ids):
+    """True if a listing page holds reviews of the page before it
+
+    Then the site did not honour the cursor; the page's reviews are
+    duplicates and the walk must stop.
+    """
+    if not set(review_ids) & set(response.meta.get("previous_review_ids", ())):
+        return False
+    page = response.meta["review_page"]
+    spider.logger.warning(
+        f"⚠️ Review page {page} of {response.meta['book_id']} repeats page "
+        f"{page - 1}; the site ignored the cursor, stopping"
+    )
+    spider.crawler.stats.inc_value("reviews/cursor_ignored")
+    return True
+
+
+def next_review_page(spider, response, review_ids, callback, max_reviews=None, **meta):
+    """Request for the review listing page after ``response``, or None
+
+    ``review_ids`` are the reviews taken from ``response`` and
+    ``max_reviews`` the book's review budget (None = unlimited). Extra
+    keyword arguments are added to the request's meta, which also carries
+    ``review_page``, the remaining ``review_limit`` and the pages' IDs.
+    Sends review_listing_complete when ``response`` is the listing's last
+    page and the budget left none of its reviews out.
+    """
+    settings = spider.settings
+    book_id = response.meta["book_id"]
+    page = response.meta.get("review_page", 1)
+    collected = response.meta.get("reviews_collected", 0) + len(review_ids)
+    capped = max_reviews and collected >= max_reviews
+    if not capped and embedded.is_last_review_page(response):
+        spider.crawler.signals.send_catch_log(
+            review_listing_complete, book_id=book_id, spider=spider
+        )
+        return None
+
+    if not settings.getbool("REVIEW_PAGINATION_ENABLED") or not review_ids:
+        return None
+    if capped:
+        return None
+    if page >= settings.getint("REVIEW_PAGE_BUDGET", 10):
+        spider.crawler.stats.inc_value("reviews/page_budget_reached")
+        return None
+    cursor = embedded.next_review_cursor(response)
+    if not cursor:
+        return None
+
+    meta.update(
+        {
+            "book_id": book_id,
+            "review_page": page + 1,
+            "review_limit": max_reviews - collected if max_reviews else None,
+            "reviews_collected": collected,
+            "previous_review_ids": list(review_ids),
+        }
+    )
+    return scrapy.Request(
+        url=settings.get("REVIEW_PAGE_URL").format(
+            book_id=book_id, cursor=quote(cursor, safe="")
+        ),
+        callback=callback,
+        meta=meta,
+        # Finish a book's walk before starting new books
+        priority=1,
+    )
@@ -3,85 +3,435 @@
 # ===============================================
 
 import os
-import csv
+import dataclasses
+import hashlib
+import json
+import logging
+import sqlite3
 from datetime import datetime
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.misc import load_object
 
+from goodreads_scraper.bloom import BloomFilter
+from goodreads_scraper.checkpoint import checkpoint_saved, checkpoint_saving
+from goodreads_scraper.items import BookItem, ReviewItem, value_type
+from goodreads_scraper.middlewares import is_missing, redirected_to
+from goodreads_scraper.pagination import review_listing_complete
 
-class GoodreadsScraperPipeline:
-    """Pipeline for processing scraped Goodreads data"""
+logger = logging.getLogger(__name__)
 
-    def __init__(self):
-        self.files = {}
-        self.writers = {}
+
+class DeltaExportPipeline:
+    """Write only new, changed and deleted records to a per-run changelog
+
+    A content hash of every book and review (ignoring DELTA_IGNORE_FIELDS
+    such as ``scraped_at``, and the book fields copied onto reviews) is kept
+    per spider in DELTA_STATE_FILE. Each run appends
+    ``{"op": "insert" | "update" | "delete", ...}`` lines to
+    DELTA_CHANGELOG_DIR/<spider>-<timestamp>-<run>.jl. Deletes are only
+    reported for what the run could see: a book whose page is now missing
+    (404/410 or flagged ``meta["not_found"]`` by the callback) or redirects
+    to another book ID loses its records, and a book whose review listing
+    was read to the end (pagination.review_listing_complete) loses the
+    reviews that did not come back. Capped or partly fetched listings report
+    no deletes. Items scraped from a redirected page are not recorded under
+    the old ID.
+
+    The state is committed every COMMIT_EVERY records, after the changelog
+    lines are written out, so a run that dies part way repeats those changes
+    next time rather than losing them. With DELTA_FULL_SNAPSHOT off, items
+    stop here and the regular feeds stay empty.
+    """
+
+    KEYS = {BookItem: ("book", "book_id"), ReviewItem: ("review", "review_id")}
+    # Denormalised from the book: a new rating count is not a review update
+    REVIEW_BOOK_FIELDS = {
+        "book_title",
+        "book_author",
+        "book_avg_rating",
+        "book_ratings_count",
+    }
+    COMMIT_EVERY = 100
+
+    def __init__(self, state_file, changelog_dir, ignore_fields, full_snapshot):
+        self.state_file = state_file
+        self.changelog_dir = changelog_dir
+        self.ignore_fields = set(ignore_fields)
+        self.full_snapshot = full_snapshot
+        self.missing = set()
+        self.unresolved = {}
+        self.listed = set()
+        self.pending = {}
+        self.db = None
+        self.changelog = None
+        self.spider_name = None
+        self.run = None
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("DELTA_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            settings.get("DELTA_STATE_FILE"),
+            settings.get("DELTA_CHANGELOG_DIR"),
+            settings.getlist("DELTA_IGNORE_FIELDS"),
+            settings.getbool("DELTA_FULL_SNAPSHOT"),
+        )
+        s.stats = crawler.stats
+        crawler.signals.connect(s.response_received, signal=signals.response_received)
+        crawler.signals.connect(s.listing_complete, signal=review_listing_complete)
+        return s
 
     def open_spider(self, spider):
-        """Initialize files and writers for each spider"""
-        if spider.name == "goodreads_books":
-            self.setup_books_pipeline(spider)
-        elif spider.name == "goodreads_reviews":
-            self.setup_reviews_pipeline(spider)
-
-    def setup_books_pipeline(self, spider):
-        """Setup pipeline for books spider"""
-        filename = "goodreads_books.csv"
-        self.files[spider.name] = open(filename, "w", newline="", encoding="utf-8")
-
-        fieldnames = [
-            "book_id",
-            "url",
-            "title",
-            "author",
-            "avg_rating",
-            "ratings_count",
-            "reviews_count",
-            "isbn",
-            "pages",
-            "publisher",
-            "genres",
-            "scraped_at",
-        ]
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        os.makedirs(self.changelog_dir, exist_ok=True)
+        # Autocommit mode; shards share the file, so writes are short
+        # explicit transactions
+        self.db = sqlite3.connect(self.state_file, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                spider TEXT, kind TEXT, key TEXT, book_id INTEGER, hash BLOB,
+                run INTEGER, PRIMARY KEY (spider, kind, key)
+            );
+            CREATE INDEX IF NOT EXISTS records_book ON records (spider, book_id);
+            CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY, started_at TEXT);
+            """
+        )
+        self.spider_name = spider.name
+        started = datetime.now()
+        self.run = self.db.execute(
+            "INSERT INTO runs (started_at) VALUES (?)", (started.isoformat(),)
+        ).lastrowid
+        path = os.path.join(
+            self.changelog_dir,
+            f"{spider.name}-{started:%Y%m%dT%H%M%S}-{self.run}.jl",
+        )
+        self.changelog = open(path, "w", encoding="utf-8")
+        spider.logger.info(f"Writing changes since the previous run to {path}")
+
+    def response_received(self, response, request, spider):
+        """Remember books whose page is gone"""
+        book_id = request.meta.get("book_id")
+        if book_id is None or "review_page" in request.meta:
+            return
+        if is_missing(response) or redirected_to(response) is not None:
+            self.missing.add(book_id)
+        elif response.status == 200:
+            # The callback has yet to run and may flag meta["not_found"];
+            # checked on close unless the book yields an item first
+            self.unresolved[book_id] = request.meta
+
+    def listing_complete(self, book_id, spider):
+        """Remember books whose every current review was seen this run"""
+        self.listed.add(book_id)
+
+    def content_hash(self, kind, adapter):
+        ignored = self.ignore_fields
+        if kind == "review":
+            ignored = ignored | self.REVIEW_BOOK_FIELDS
+        fields = {k: v for k, v in adapter.items() if k not in ignored}
+        return hashlib.sha1(
+            json.dumps(fields, sort_keys=True, default=str).encode("utf-8")
+        ).digest()
+
+    def write_change(self, op, kind, key, book_id, item=None):
+        change = {"op": op, "type": kind, "key": key, "book_id": book_id}
+        if item is not None:
+            change["item"] = item
+        self.changelog.write(json.dumps(change, ensure_ascii=False) + "\n")
+        self.stats.inc_value(f"delta/{op}")
+
+    def stored_hash(self, kind, key):
+        if (kind, key) in self.pending:
+            return self.pending[(kind, key)][1]
+        row = self.db.execute(
+            "SELECT hash FROM records WHERE spider = ? AND kind = ? AND key = ?",
+            (self.spider_name, kind, key),
+        ).fetchone()
+        return row[0] if row else None
+
+    def process_item(self, item, spider):
+        if type(item) not in self.KEYS:
+            return item
+        adapter = ItemAdapter(item)
+        kind, key_field = self.KEYS[type(item)]
+        key = str(adapter.get(key_field))
+        book_id = adapter.get("book_id")
+        self.unresolved.pop(book_id, None)
+        if book_id in self.missing:
+            self.stats.inc_value("delta/redirected_skipped")
+            return self.passed_on(item)
+        digest = self.content_hash(kind, adapter)
+
+        stored = self.stored_hash(kind, key)
+        if stored is None:
+            self.write_change("insert", kind, key, book_id, adapter.asdict())
+        elif stored != digest:
+            self.write_change("update", kind, key, book_id, adapter.asdict())
+        else:
+            self.stats.inc_value("delta/unchanged")
+        self.pending[(kind, key)] = (book_id, digest)
+        if len(self.pending) >= self.COMMIT_EVERY:
+            self.commit()
+        return self.passed_on(item)
+
+    def passed_on(self, item):
+        if not self.full_snapshot:
+            raise DropItem("Delta mode without full snapshot", log_level="DEBUG")
+        return item
+
+    def commit(self, deleted=()):
+        """Write out the changelog, then store the pending hashes"""
+        self.changelog.flush()
+        os.fsync(self.changelog.fileno())
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (self.spider_name, kind, key, book_id, digest, self.run)
+                    for (kind, key), (book_id, digest) in self.pending.items()
+                ],
+            )
+            self.db.executemany(
+                "DELETE FROM records WHERE spider = ? AND kind = ? AND key = ?",
+                [(self.spider_name, kind, key) for kind, key, _ in deleted],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.pending.clear()
+
+    def stale_records(self, book_id, kinds):
+        """Stored records of ``book_id`` that did not come back this run"""
+        return self.db.execute(
+            "SELECT kind, key, book_id FROM records"
+            " WHERE spider = ? AND book_id = ? AND run < ?"
+            f" AND kind IN ({', '.join('?' * len(kinds))})",
+            (self.spider_name, book_id, self.run, *kinds),
+        ).fetchall()
+
+    def close_spider(self, spider):
+        self.commit()
+        for book_id, meta in self.unresolved.items():
+            if meta.get("not_found"):
+                self.missing.add(book_id)
+        stale = []
+        for book_id in self.missing:
+            stale.extend(self.stale_records(book_id, ("book", "review")))
+        for book_id in self.listed - self.missing:
+            stale.extend(self.stale_records(book_id, ("review",)))
+        for kind, key, book_id in stale:
+            self.write_change("delete", kind, key, book_id)
+        self.commit(deleted=stale)
+
+        self.changelog.close()
+        self.db.close()
+
+
+class ReviewDedupPipeline:
+    """Drop reviews already scraped by this or any earlier run
 
-        self.writers[spider.name] = csv.DictWriter(
-            self.files[spider.name], fieldnames=fieldnames
+    Each review's content hash (book, reviewer, date and normalized text,
+    see ``ReviewItem.content_hash``) is checked against a persistent Bloom
+    filter sized for REVIEW_DEDUP_CAPACITY reviews at REVIEW_DEDUP_ERROR_RATE
+    false positives. Runs after DeltaExportPipeline, so the changelog still
+    sees every review, and before anything that writes them out.
+
+    New hashes are staged in memory and only added to the filter once their
+    reviews are on disk: after each checkpoint save, and when the engine
+    stops. A crash therefore never leaves the filter claiming reviews that
+    no output holds. Since earlier runs' reviews are dropped, a feed that is
+    overwritten on each run only ever holds the new ones.
+    """
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.seen = None
+        self.staged = set()
+        self.overwritten_feeds = []
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("REVIEW_DEDUP_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            settings.get("REVIEW_DEDUP_FILE"),
+            settings.getint("REVIEW_DEDUP_CAPACITY"),
+            settings.getfloat("REVIEW_DEDUP_ERROR_RATE"),
         )
-        self.writers[spider.name].writeheader()
-
-    def setup_reviews_pipeline(self, spider):
-        """Setup pipeline for reviews spider"""
-        filename = "goodreads_reviews.csv"
-        self.files[spider.name] = open(filename, "w", newline="", encoding="utf-8")
-
-        fieldnames = [
-            "review_id",
-            "book_id",
-            "reviewer",
-            "rating",
-            "date",
-            "review_text",
-            "book_title",
-            "book_author",
-            "book_avg_rating",
-            "book_ratings_count",
+        s.stats = crawler.stats
+        s.overwritten_feeds = [
+            uri
+            for uri, options in settings.getdict("FEEDS").items()
+            if options.get("overwrite") and cls.exports_reviews(options)
         ]
+        crawler.signals.connect(s.apply, signal=checkpoint_saved)
+        crawler.signals.connect(s.engine_stopped, signal=signals.engine_stopped)
+        return s
+
+    @staticmethod
+    def exports_reviews(feed_options):
+        classes = feed_options.get("item_classes") or [ReviewItem]
+        return ReviewItem in [load_object(c) for c in classes]
 
-        self.writers[spider.name] = csv.DictWriter(
-            self.files[spider.name], fieldnames=fieldnames
+    def open_spider(self, spider):
+        self.seen = BloomFilter(self.path, self.capacity, self.error_rate)
+        spider.logger.info(
+            f"Review dedup: {len(self.seen)} reviews seen before "
+            f"(false positive rate {self.seen.error_rate:.2e})"
         )
-        self.writers[spider.name].writeheader()
 
     def process_item(self, item, spider):
-        """Process each scraped item"""
-        adapter = ItemAdapter(item)
+        if not isinstance(item, ReviewItem):
+            return item
+        for uri in self.overwritten_feeds:
+            logger.warning(
+                f"Review dedup is on and feed {uri} is overwritten: it will "
+                f"only hold reviews that no earlier run scraped"
+            )
+        self.overwritten_feeds = []
+        digest = item.content_hash()
+        if digest in self.staged or digest in self.seen:
+            self.stats.inc_value("review_dedup/dropped")
+            raise DropItem(f"Duplicate review {item.review_id}", log_level="DEBUG")
+        self.staged.add(digest)
+        return item
+
+    def apply(self):
+        """Add the staged hashes to the filter; their reviews are on disk"""
+        if self.staged:
+            self.seen.update(self.staged)
+            self.staged.clear()
+
+    def close_spider(self, spider):
+        # Feeds are only stored after this, so the filter stays open
+        self.stats.set_value("review_dedup/seen", len(self.seen) + len(self.staged))
+
+    def engine_stopped(self):
+        if self.seen is not None:
+            self.apply()
+            self.seen.close()
+
+
+class SqliteSinkPipeline:
+    """Upsert books and reviews into one SQLite database
+
+    Rows go into ``books`` (keyed on book_id) and ``reviews`` (keyed on
+    review_id), whose columns follow the item dataclasses. Items are
+    buffered and written SQLITE_SINK_BATCH_SIZE at a time with one
+    ``executemany`` per table inside a transaction. A record that already
+    exists is updated in place, so a recrawl refreshes rows instead of adding
+    duplicates. Pending rows are also written before every checkpoint save.
 
-        # Write to CSV
-        if spider.name in self.writers:
-            self.writers[spider.name].writerow(dict(adapter))
+    Secondary indexes are created when the spider closes, after the rows are
+    loaded; on later runs they already exist and are maintained as usual.
+    """
 
+    TABLES = {
+        BookItem: ("books", "book_id"),
+        ReviewItem: ("reviews", "review_id"),
+    }
+    INDEXES = {
+        "books": ["author"],
+        "reviews": ["book_id"],
+    }
+    SQL_TYPES = {int: "INTEGER", float: "REAL"}
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = {item_cls: [] for item_cls in self.TABLES}
+        self.pending_count = 0
+        self.db = None
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("SQLITE_SINK_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            settings.get("SQLITE_SINK_FILE"),
+            settings.getint("SQLITE_SINK_BATCH_SIZE", 1000),
+        )
+        s.stats = crawler.stats
+        crawler.signals.connect(s.flush, signal=checkpoint_saving)
+        return s
+
+    def columns(self, item_cls):
+        return [f.name for f in dataclasses.fields(item_cls)]
+
+    def open_spider(self, spider):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        for item_cls, (table, key) in self.TABLES.items():
+            columns = ", ".join(
+                f"{f.name} {self.SQL_TYPES.get(value_type(f.type), 'TEXT')}"
+                + (" PRIMARY KEY" if f.name == key else "")
+                for f in dataclasses.fields(item_cls)
+            )
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+        self.db.commit()
+
+    def upsert_sql(self, item_cls):
+        table, key = self.TABLES[item_cls]
+        columns = self.columns(item_cls)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)})"
+            f" VALUES ({', '.join('?' * len(columns))})"
+            f" ON CONFLICT ({key}) DO UPDATE SET {updates}"
+        )
+
+    def process_item(self, item, spider):
+        if type(item) not in self.TABLES:
+            return item
+        adapter = ItemAdapter(item)
+        self.pending[type(item)].append(
+            tuple(adapter.get(c) for c in self.columns(type(item)))
+        )
+        self.pending_count += 1
+        if self.pending_count >= self.batch_size:
+            self.flush()
         return item
 
+    def flush(self):
+        """Write every buffered row in one transaction"""
+        if not self.pending_count:
+            return
+        with self.db:
+            for item_cls, rows in self.pending.items():
+                if rows:
+                    self.db.executemany(self.upsert_sql(item_cls), rows)
+                    self.stats.inc_value(
+                        f"sqlite_sink/{self.TABLES[item_cls][0]}", len(rows)
+                    )
+                    rows.clear()
+        self.stats.inc_value("sqlite_sink/batches")
+        self.pending_count = 0
+
     def close_spider(self, spider):
-        """Clean up when spider closes"""
-        if spider.name in self.files:
-            self.files[spider.name].close()
-            spider.logger.info(f"Results saved to CSV file")
+        self.flush()
+        for table, columns in self.INDEXES.items():
+            for column in columns:
+                self.db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{column}"
+                    f" ON {table} ({column})"
+                )
+        self.db.commit()
+        self.db.close()
+        spider.logger.info(f"Upserted items into {self.path}")
@@ -27,8 +27,22 @@ AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching
 HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 3600
 HTTPCACHE_DIR = "httpcache"
+# Entries never expire outright (the byte budget below bounds the cache);
+# after HTTPCACHE_FRESHNESS_SECS a page is revalidated with ETag /
+# Last-Modified or its body hash
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_POLICY = "goodreads_scraper.httpcache.RevalidatingCachePolicy"
+HTTPCACHE_FRESHNESS_SECS = 3600
+# Don't parse unchanged pages again. Their items are then missing from the
+# (overwritten) CSV feeds, so this only takes effect together with
+# DELTA_ENABLED or SQLITE_SINK_ENABLED, which keep earlier runs' records
+HTTPCACHE_SKIP_UNCHANGED = False
+# One compressed SQLite file per spider, bodies deduplicated, least recently
+# used entries evicted beyond HTTPCACHE_MAX_BYTES (compressed, 0 = no limit)
+HTTPCACHE_STORAGE = "goodreads_scraper.httpcache.SqliteCacheStorage"
+HTTPCACHE_MAX_BYTES = 2 * 1024**3
+HTTPCACHE_COMPRESSION_LEVEL = 6
 
 # Default request headers
 DEFAULT_REQUEST_HEADERS = {
@@ -37,14 +51,183 @@ DEFAULT_REQUEST_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
 }
 
+# Resumable crawls: finished book IDs are checkpointed to CHECKPOINT_DIR and
+# skipped on restart, and feeds are appended to instead of overwritten
+CHECKPOINT_ENABLED = True
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_FLUSH_INTERVAL = 30
+
+# Book IDs found dead or redirected are skipped by later runs until their
+# re-check TTL (seconds) expires
+NEGATIVE_CACHE_ENABLED = True
+NEGATIVE_CACHE_FILE = "checkpoints/dead_books.sqlite"
+NEGATIVE_CACHE_TTL = 30 * 24 * 3600
+
+# Shared work queue (see goodreads_scraper.frontier): lease book IDs in
+# batches from FRONTIER_FILE instead of crawling START_ID..END_ID directly,
+# so several processes or machines balance the work between them
+FRONTIER_ENABLED = False
+FRONTIER_FILE = "checkpoints/frontier.sqlite"
+FRONTIER_BATCH_SIZE = 20
+FRONTIER_LEASE_SECONDS = 300
+FRONTIER_MAX_ATTEMPTS = 3
+FRONTIER_REPORT_INTERVAL = 30
+
+# Adaptive recrawl (see goodreads_scraper.recrawl): every run records each
+# book's change history; with RECRAWL_ENABLED the run visits only the
+# RECRAWL_BUDGET known books most likely to have changed (not combined with
+# the frontier, which supplies its own IDs)
+RECRAWL_HISTORY_ENABLED = True
+RECRAWL_ENABLED = False
+RECRAWL_STATE_FILE = "checkpoints/recrawl.sqlite"
+RECRAWL_BUDGET = 10000
+# Assumed change interval (seconds) for books visited only once
+RECRAWL_DEFAULT_INTERVAL = 30 * 24 * 3600
+
+ADDONS = {
+    "goodreads_scraper.checkpoint.CheckpointAddon": 0,
+}
+
+SPIDER_MIDDLEWARES = {
+    "goodreads_scraper.middlewares.CheckpointMiddleware": 100,
+    "goodreads_scraper.middlewares.NegativeCacheMiddleware": 110,
+    # Leased requests pass through the filters above
+    "goodreads_scraper.middlewares.FrontierMiddleware": 120,
+    "goodreads_scraper.middlewares.RecrawlMiddleware": 125,
+    # Closest to the spider, so the middlewares above still see skipped pages
+    "goodreads_scraper.middlewares.UnchangedPageMiddleware": 130,
+}
+
 # Configure pipelines
 ITEM_PIPELINES = {
-    "goodreads_scraper.pipelines.GoodreadsScraperPipeline": 300,
+    "goodreads_scraper.pipelines.DeltaExportPipeline": 200,
+    "goodreads_scraper.pipelines.ReviewDedupPipeline": 250,
+    "goodreads_scraper.pipelines.SqliteSinkPipeline": 300,
+}
+
+# Cross-run review dedup (see ReviewDedupPipeline): reviews whose content
+# hash was seen by any earlier run are dropped before they are written out.
+# The Bloom filter file is sized up front: about 14 bits per review at a 0.1%
+# false positive rate, ~180 MB for 100M reviews. Reviews enter it once they
+# are on disk (at checkpoint saves and at the end of the run). With the
+# default overwrite feeds a rerun's reviews CSV holds only new reviews
+REVIEW_DEDUP_ENABLED = False
+REVIEW_DEDUP_FILE = "checkpoints/reviews.bloom"
+REVIEW_DEDUP_CAPACITY = 100_000_000
+REVIEW_DEDUP_ERROR_RATE = 0.001
+
+# SQLite sink (see SqliteSinkPipeline): upsert books and reviews into
+# SQLITE_SINK_FILE keyed on book_id / review_id, so the data is queryable as
+# soon as the crawl ends and recrawls update rows in place
+SQLITE_SINK_ENABLED = False
+SQLITE_SINK_FILE = "goodreads.sqlite"
+SQLITE_SINK_BATCH_SIZE = 1000
+
+# Delta export (see DeltaExportPipeline): write new / changed / deleted
+# records to DELTA_CHANGELOG_DIR, comparing content hashes with the spider's
+# last run; reviews are only reported deleted for books whose whole review
+# listing was read. With DELTA_FULL_SNAPSHOT off the regular CSV feeds are
+# not written
+DELTA_ENABLED = False
+DELTA_STATE_FILE = "checkpoints/delta.sqlite"
+DELTA_CHANGELOG_DIR = "changelog"
+DELTA_IGNORE_FIELDS = ["scraped_at"]
+DELTA_FULL_SNAPSHOT = True
+
+# Parquet feeds (see goodreads_scraper.feeds): "format": "parquet" in FEEDS
+# writes typed, compressed columns; needs pyarrow. Rows are written
+# PARQUET_BUFFERED_ROW_GROUPS row groups at a time, and only the listed
+# repetitive columns are dictionary encoded
+FEED_EXPORTERS = {
+    "parquet": "goodreads_scraper.feeds.ParquetItemExporter",
+}
+PARQUET_ROW_GROUP_SIZE = 50000
+PARQUET_BUFFERED_ROW_GROUPS = 1
+PARQUET_COMPRESSION = "zstd"
+PARQUET_COMPRESSION_LEVEL = None
+PARQUET_DICTIONARY_COLUMNS = [
+    "author",
+    "publisher",
+    "genres",
+    "book_title",
+    "book_author",
+]
+
+# Feeds roll over to a new %(batch_id)d file once the current one reaches
+# this many bytes (0 = only FEED_EXPORT_BATCH_ITEM_COUNT); per feed with
+# "batch_max_bytes"
+FEED_EXPORT_BATCH_MAX_BYTES = 0
+
+# Local feed files are written in batches by a background thread once this
+# many bytes are pending or this many seconds have passed, and fsynced before
+# every checkpoint save
+FEED_BUFFER_BYTES = 1024 * 1024
+FEED_BUFFER_SECONDS = 5.0
+FEED_STORAGES = {
+    "": "goodreads_scraper.feeds.BufferedFileFeedStorage",
+    "file": "goodreads_scraper.feeds.BufferedFileFeedStorage",
+}
+EXTENSIONS = {
+    "scrapy.extensions.feedexport.FeedExporter": None,
+    "goodreads_scraper.feeds.RollingFeedExporter": 0,
 }
 
-# Retry settings
+# Stop expanding, extracting and paginating a book's reviews once this many
+# have been collected (0 = no limit); override per run with -s
+MAX_REVIEWS_PER_BOOK = 0
+
+# Deep review pagination: after the book page, follow the review listing's
+# cursor for up to REVIEW_PAGE_BUDGET pages per book (book page included)
+REVIEW_PAGINATION_ENABLED = False
+REVIEW_PAGE_BUDGET = 10
+REVIEW_PAGE_URL = "https://www.goodreads.com/book/show/{book_id}/reviews?after={cursor}"
+
+# Browser escalation (see BrowserEscalationMiddleware): re-render pages in a
+# headless browser only when the plain HTTP response lacks full review content
+BROWSER_ESCALATION_ENABLED = False
+
+# Browser pool (see goodreads_scraper.browser.BrowserDownloadHandler), used by
+# requests with meta["browser"] once the handler is set in DOWNLOAD_HANDLERS
+BROWSER_POOL_SIZE = 2
+BROWSER_MAX_PAGES_PER_DRIVER = 50
+BROWSER_WAIT_TIME = 15
+BROWSER_PAGE_LOAD_TIMEOUT = 30
+BROWSER_BINARY_PATH = None
+BROWSER_DRIVER_EXECUTABLE_PATH = None
+BROWSER_DRIVER_ARGUMENTS = ["--headless=new", "--no-sandbox", "--disable-dev-shm-usage"]
+# Resources Chrome is told not to fetch (we only read text), and whether to
+# record blocked requests / transferred bytes in the browser/* stats
+BROWSER_BLOCK_RESOURCE_TYPES = ["Image", "Font", "Stylesheet", "Media"]
+BROWSER_BLOCK_URL_PATTERNS = [
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*doubleclick.net*",
+    "*amazon-adsystem.com*",
+]
+BROWSER_NETWORK_STATS = True
+# Load every Nth rendered page without blocking to measure what blocking
+# saves (browser/blocked_bytes_estimate); 0 = never
+BROWSER_BLOCKING_SAMPLE_EVERY = 100
+
+# Retry settings (see StatusRetryMiddleware): permanent statuses are never
+# retried, throttled ones wait for Retry-After, other transient failures back
+# off exponentially; RETRY_BUDGET caps the retries of a whole run (0 = no cap)
 RETRY_TIMES = 3
-RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429, 403]
+RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429]
+RETRY_PERMANENT_HTTP_CODES = [400, 401, 403, 404, 410]
+RETRY_THROTTLED_HTTP_CODES = [429, 503]
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+RETRY_BUDGET = 500
+
+# Duplicate filtering on book IDs / (book ID, review cursor hash) instead of
+# SHA1 fingerprints (state is persisted under JOBDIR when one is set)
+DUPEFILTER_CLASS = "goodreads_scraper.dupefilter.CompactDupeFilter"
+
+DOWNLOADER_MIDDLEWARES = {
+    "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "goodreads_scraper.middlewares.StatusRetryMiddleware": 550,
+}
 
 # Log level
 LOG_LEVEL = "INFO"
@@ -3,6 +3,9 @@ import re
 from datetime import datetime
 from urllib.parse import urljoin
 
+from goodreads_scraper import embedded
+from goodreads_scraper.items import BookItem
+
 
 class GoodreadsBooksSpider(scrapy.Spider):
     name = "goodreads_books"
@@ -11,6 +14,7 @@ class GoodreadsBooksSpider(scrapy.Spider):
     # Configuration
     START_ID = 1
     END_ID = 1000
+    USE_EMBEDDED_JSON = True  # Parse __NEXT_DATA__/JSON-LD before CSS selectors
 
     custom_settings = {
         "FEEDS": {
@@ -45,17 +49,25 @@ class GoodreadsBooksSpider(scrapy.Spider):
         "RETRY_HTTP_CODES": [500, 502, 503, 504, 408, 429],
     }
 
+    async def start(self):
+        # Scrapy 2.13+; start_requests() is kept for the ID range
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         """Generate requests for all book IDs"""
         for book_id in range(self.START_ID, self.END_ID + 1):
-            url = f"https://www.goodreads.com/book/show/{book_id}"
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_book,
-                meta={"book_id": book_id},
-                dont_filter=True,
-                errback=self.handle_error,
-            )
+            yield self.book_request(book_id)
+
+    def book_request(self, book_id):
+        """Request for one book page (FrontierMiddleware builds them this way)"""
+        url = f"https://www.goodreads.com/book/show/{book_id}"
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_book,
+            meta={"book_id": book_id},
+            errback=self.handle_error,
+        )
 
     def parse_book(self, response):
         """Parse book details from Goodreads page - preserving original logic"""
@@ -64,9 +76,31 @@ class GoodreadsBooksSpider(scrapy.Spider):
         # Check if page exists
         if "Page not found" in response.text:
             self.logger.info(f"⏩ Skipped book {book_id} - Page not found")
+            response.meta["not_found"] = True
             return
 
-        # Extract book details using original selectors
+        fields = {}
+        if self.USE_EMBEDDED_JSON:
+            fields = embedded.extract_book(response, book_id) or {}
+        # Selectors fill in whatever the embedded data lacks, field by field
+        if not fields or not all(fields.values()):
+            css_fields = self.extract_book_css(response)
+            fields = {
+                key: fields.get(key) or value for key, value in css_fields.items()
+            }
+
+        book_data = BookItem(
+            book_id=book_id,
+            url=response.url,
+            **fields,
+            scraped_at=datetime.now().isoformat(),
+        )
+
+        self.logger.info(f"✅ Scraped book {book_id}: {fields['title']}")
+        yield book_data
+
+    def extract_book_css(self, response):
+        """Extract book details with CSS selectors (fallback for embedded data)"""
         title = self.extract_text(response, "h1.Text__title1")
         author = self.extract_text(response, ".ContributorLink__name")
 
@@ -113,9 +147,7 @@ class GoodreadsBooksSpider(scrapy.Spider):
         if genre_elements:
             genres = [genre.strip() for genre in genre_elements]
 
-        book_data = {
-            "book_id": book_id,
-            "url": response.url,
+        return {
             "title": title,
             "author": author,
             "avg_rating": avg_rating,
@@ -125,12 +157,8 @@ class GoodreadsBooksSpider(scrapy.Spider):
             "pages": pages,
             "publisher": pub_info,
             "genres": ", ".join(genres) if genres else None,
-            "scraped_at": datetime.now().isoformat(),
         }
 
-        self.logger.info(f"✅ Scraped book {book_id}: {title}")
-        yield book_data
-
     def extract_text(self, response, selector):
         """Helper method to extract text from CSS selector"""
         element = response.css(f"{selector}::text").get()
@@ -0,0 +1,83 @@
+import scrapy
+
+from goodreads_scraper.items import BookItem, ReviewItem
+from goodreads_scraper.spiders.goodreads_books import GoodreadsBooksSpider
+from goodreads_scraper.spiders.goodreads_review import GoodreadsReviewsSpider
+
+
+class GoodreadsCombinedSpider(GoodreadsBooksSpider, GoodreadsReviewsSpider):
+    """Fetch each /book/show/{id} page once and emit both books and reviews
+
+    Book parsing comes from GoodreadsBooksSpider and review parsing from
+    GoodreadsReviewsSpider; each item type is routed to its own feed.
+    """
+
+    name = "goodreads_combined"
+    allowed_domains = ["goodreads.com"]
+
+    # Configuration
+    START_ID = 1
+    END_ID = 1000
+
+    custom_settings = {
+        "FEEDS": {
+            "goodreads_books.csv": {
+                **GoodreadsBooksSpider.custom_settings["FEEDS"]["goodreads_books.csv"],
+                "item_classes": [BookItem],
+            },
+            "goodreads_reviews.csv": {
+                **GoodreadsReviewsSpider.custom_settings["FEEDS"][
+                    "goodreads_reviews.csv"
+                ],
+                "item_classes": [ReviewItem],
+            },
+        },
+        "DOWNLOAD_DELAY": 1.5,
+        "RANDOMIZE_DOWNLOAD_DELAY": 0.5,
+        "CONCURRENT_REQUESTS": 1,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+        "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+        "DEFAULT_REQUEST_HEADERS": {
+            "Accept-Language": "en-US,en;q=0.9",
+        },
+        "RETRY_TIMES": 3,
+        "RETRY_HTTP_CODES": [500, 502, 503, 504, 408, 429],
+        "FEED_EXPORT_ENCODING": "utf-8",
+    }
+
+    def book_request(self, book_id):
+        """Request for one book page, parsed for both books and reviews"""
+        url = f"https://www.goodreads.com/book/show/{book_id}"
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_page,
+            meta={"book_id": book_id},
+            errback=self.handle_error,
+        )
+
+    def parse_page(self, response):
+        """Emit the book item and then its reviews from the same response"""
+        book_id = response.meta["book_id"]
+
+        book = None
+        for book in self.parse_book(response):
+            yield book
+
+        # parse_book yields nothing for missing pages
+        if book is None:
+            return
+
+        reviews = self.extract_reviews(response, book_id)
+        self.logger.info(f"📝 Found {len(reviews)} reviews for book {book_id}")
+
+        book_fields = {
+            "book_title": book.title,
+            "book_author": book.author,
+            "book_avg_rating": book.avg_rating,
+            "book_ratings_count": book.ratings_count,
+        }
+        for review in reviews:
+            review.update(book_fields)
+            yield review
+
+        yield from self.review_page_requests(response, reviews, book_fields)
@@ -4,6 +4,10 @@ import time
 import random
 from urllib.parse import urljoin
 
+from goodreads_scraper import embedded
+from goodreads_scraper.items import ReviewItem
+from goodreads_scraper.pagination import next_review_page, repeats_previous_page
+
 
 class GoodreadsReviewsSpider(scrapy.Spider):
     name = "goodreads_reviews"
@@ -39,20 +43,28 @@ class GoodreadsReviewsSpider(scrapy.Spider):
         "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
         "ROBOTSTXT_OBEY": False,
         "RETRY_TIMES": 3,
-        "RETRY_HTTP_CODES": [500, 502, 503, 504, 400, 403, 404, 408],
+        "RETRY_HTTP_CODES": [500, 502, 503, 504, 408, 429],
         "FEED_EXPORT_ENCODING": "utf-8",
     }
 
+    async def start(self):
+        # Scrapy 2.13+; start_requests() is kept for the ID range
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         """Generate requests for all book IDs"""
         for book_id in range(self.START_ID, self.END_ID + 1):
-            url = f"https://www.goodreads.com/book/show/{book_id}"
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_book_page,
-                meta={"book_id": book_id},
-                dont_filter=True,
-            )
+            yield self.book_request(book_id)
+
+    def book_request(self, book_id):
+        """Request for one book page (FrontierMiddleware builds them this way)"""
+        url = f"https://www.goodreads.com/book/show/{book_id}"
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_book_page,
+            meta={"book_id": book_id},
+        )
 
     def parse_book_page(self, response):
         """Parse book page and extract reviews"""
@@ -74,23 +86,58 @@ class GoodreadsReviewsSpider(scrapy.Spider):
 
             self.logger.info(f"📝 Found {len(reviews)} reviews on the page")
 
+            book_fields = {
+                "book_title": self.clean_text(title),
+                "book_author": self.clean_text(author),
+                "book_avg_rating": avg_rating,
+                "book_ratings_count": ratings_count,
+            }
+
             # Yield each review with book details
             for review in reviews:
-                review.update(
-                    {
-                        "book_title": self.clean_text(title),
-                        "book_author": self.clean_text(author),
-                        "book_avg_rating": avg_rating,
-                        "book_ratings_count": ratings_count,
-                    }
-                )
+                review.update(book_fields)
                 yield review
 
+            yield from self.review_page_requests(response, reviews, book_fields)
+
             self.logger.info(f"✅ Completed book ID {book_id}: {title}")
 
         except Exception as e:
             self.logger.error(f"Error processing book {book_id}: {str(e)}")
 
+    def review_page_requests(self, response, reviews, book_fields):
+        """Request the next review listing page of the book, if any"""
+        request = next_review_page(
+            self,
+            response,
+            [review.review_id for review in reviews],
+            self.parse_review_page,
+            max_reviews=self.review_limit(),
+            book_fields=book_fields,
+        )
+        if request is not None:
+            yield request
+
+    def parse_review_page(self, response):
+        """Parse one review listing page of a book"""
+        book_id = response.meta["book_id"]
+        page = response.meta["review_page"]
+
+        reviews = self.extract_reviews(
+            response, book_id, limit=response.meta["review_limit"]
+        )
+        self.logger.info(f"📝 Found {len(reviews)} reviews on page {page} of {book_id}")
+        if repeats_previous_page(self, response, [r.review_id for r in reviews]):
+            return
+
+        for review in reviews:
+            review.update(response.meta["book_fields"])
+            yield review
+
+        yield from self.review_page_requests(
+            response, reviews, response.meta["book_fields"]
+        )
+
     def extract_book_title(self, response):
         """Extract book title"""
         title = response.css("h1.Text__title1::text").get()
@@ -133,10 +180,34 @@ class GoodreadsReviewsSpider(scrapy.Spider):
 
         return None
 
-    def extract_reviews(self, response, book_id):
-        """Extract reviews from the page with guaranteed clean text"""
-        reviews = []
-        review_cards = response.css(".ReviewCard")
+    def review_limit(self):
+        """Per-book review budget from MAX_REVIEWS_PER_BOOK (None = unlimited)"""
+        return self.settings.getint("MAX_REVIEWS_PER_BOOK") or None
+
+    def extract_reviews(self, response, book_id, limit=None):
+        """Extract reviews from the page with guaranteed clean text
+
+        Reviews without an ID of their own get a content-derived one from
+        ReviewItem, so their IDs do not depend on page order.
+        """
+        limit = limit or self.review_limit()
+
+        # Embedded Apollo data carries the full (untruncated) review text
+        reviews = [
+            ReviewItem(
+                review_id=review["review_id"],
+                book_id=book_id,
+                reviewer=review["reviewer"] or "Anonymous",
+                rating=review["rating"],
+                date=review["date"] or "Unknown date",
+                review_text=self.clean_text(review["review_text"]),
+            )
+            for review in embedded.extract_reviews(response, book_id, limit=limit)
+        ]
+        if reviews:
+            return reviews
+
+        review_cards = response.css(".ReviewCard")[:limit]
 
         for i, card in enumerate(review_cards):
             try:
@@ -168,14 +239,14 @@ class GoodreadsReviewsSpider(scrapy.Spider):
                 review_text = self.extract_review_text(card)
 
                 reviews.append(
-                    {
-                        "review_id": card.attrib.get("id", f"review_{book_id}_{i}"),
-                        "book_id": book_id,
-                        "reviewer": reviewer,
-                        "rating": rating,
-                        "date": date,
-                        "review_text": review_text,
-                    }
+                    ReviewItem(
+                        review_id=self.extract_review_id(card),
+                        book_id=book_id,
+                        reviewer=reviewer,
+                        rating=rating,
+                        date=date,
+                        review_text=review_text,
+                    )
                 )
 
             except Exception as e:
@@ -184,6 +255,17 @@ class GoodreadsReviewsSpider(scrapy.Spider):
 
         return reviews
 
+    def extract_review_id(self, card):
+        """Goodreads' own review ID for a card, or None if it has none"""
+        review_id = card.attrib.get("id")
+        if review_id:
+            return review_id
+        link = card.css('a[href*="/review/show/"]::attr(href)').get()
+        match = re.search(r"/review/show/(\d+)", link or "")
+        if match:
+            return match.group(1)
+        return None
+
     def extract_review_text(self, card):
         """Robust review text extraction with multiple fallbacks"""
 
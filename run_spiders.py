@@ -1,58 +1,274 @@
 # ===============================================
-# run_spiders.py - Script to Run Spiders
+# run_spiders.py - Sharded Multi-Process Crawl Launcher
 # ===============================================
+#
+# Splits a book ID range into N shards and crawls each shard in its own
+# process, so parsing uses every core instead of one. Each shard writes its
+# own part files (and keeps its own checkpoint, so an interrupted run can be
+# restarted shard by shard). Once every shard has finished, the parts of each
+# feed are merged into the usual output file, sorted by ID and deduplicated.
+# With --frontier the shards lease IDs from a shared queue instead of owning
+# a fixed slice, so no shard sits idle while another still has work.
+#
+# Usage: python run_spiders.py [books|reviews|combined] [--shards N]
+#                              [--start ID] [--end ID] [--frontier]
+#                              [--keep-parts]
 
-import subprocess
-import sys
+import argparse
+import csv
+import heapq
+import itertools
+import multiprocessing
 import os
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
+import sys
 
+SPIDERS = {
+    "books": "goodreads_scraper.spiders.goodreads_books.GoodreadsBooksSpider",
+    "reviews": "goodreads_scraper.spiders.goodreads_review.GoodreadsReviewsSpider",
+    "combined": "goodreads_scraper.spiders.goodreads_combined.GoodreadsCombinedSpider",
+}
 
-def run_books_spider():
-    """Run the books spider"""
-    print("Starting Goodreads Books Spider...")
+PARTS_DIR = "parts"
+# Rows of a part sorted in memory at once while merging
+MERGE_CHUNK_ROWS = 100_000
 
-    # You can run this directly or via command line
-    # Command line: scrapy crawl goodreads_books
 
-    settings = get_project_settings()
-    process = CrawlerProcess(settings)
+def load_spider(name):
+    from scrapy.utils.misc import load_object
 
-    # Import your spider
-    from goodreads_books_spider import GoodreadsBooksSpider
+    return load_object(SPIDERS[name])
 
-    process.crawl(GoodreadsBooksSpider)
-    process.start()
 
+def feed_config(spider_cls, settings):
+    """FEEDS the spider would use on its own (spider settings win)"""
+    return (spider_cls.custom_settings or {}).get("FEEDS") or settings.getdict("FEEDS")
 
-def run_reviews_spider():
-    """Run the reviews spider"""
-    print("Starting Goodreads Reviews Spider...")
 
-    # Command line: scrapy crawl goodreads_reviews
+def part_path(uri, shard):
+    stem, ext = os.path.splitext(os.path.basename(uri))
+    return os.path.join(PARTS_DIR, f"{stem}.part{shard:03d}{ext}")
+
+
+def shard_ranges(start, end, shards):
+    """Split [start, end] into at most ``shards`` contiguous inclusive ranges"""
+    total = end - start + 1
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    ranges = []
+    low = start
+    for i in range(shards):
+        high = low + size + (1 if i < extra else 0) - 1
+        ranges.append((low, high))
+        low = high + 1
+    return ranges
+
+
+def run_shard(spider_name, shard, start_id, end_id, use_frontier=False):
+    """Crawl one shard; runs in a child process"""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
 
     settings = get_project_settings()
-    process = CrawlerProcess(settings)
+    spider_cls = load_spider(spider_name)
 
-    # Import your spider
-    from goodreads_reviews_spider import GoodreadsReviewsSpider
+    feeds = {
+        part_path(uri, shard): options
+        for uri, options in feed_config(spider_cls, settings).items()
+    }
+    settings.set("FEEDS", feeds, priority="cmdline")
+    settings.set(
+        "CHECKPOINT_FILE",
+        os.path.join(
+            settings.get("CHECKPOINT_DIR", "checkpoints"),
+            f"{spider_cls.name}.shard{shard:03d}.ckpt",
+        ),
+        priority="cmdline",
+    )
+    settings.set("LOG_FILE", os.path.join(PARTS_DIR, f"shard{shard:03d}.log"))
+    if use_frontier:
+        settings.set("FRONTIER_ENABLED", True, priority="cmdline")
 
-    process.crawl(GoodreadsReviewsSpider)
+    process = CrawlerProcess(settings)
+    process.crawl(spider_cls, START_ID=start_id, END_ID=end_id)
     process.start()
 
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        spider_name = sys.argv[1]
-        if spider_name == "books":
-            run_books_spider()
-        elif spider_name == "reviews":
-            run_reviews_spider()
-        else:
-            print("Usage: python run_spiders.py [books|reviews]")
+def sort_value(value):
+    """Order numeric IDs numerically and anything else after them as text"""
+    return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+
+def raise_csv_field_limit():
+    """Allow fields as long as the longest review (the default is 128 KiB)"""
+    # sys.maxsize overflows the C long the limit is stored in on Windows
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+
+def row_key(header):
+    """Key function rows with ``header`` are sorted and deduplicated on"""
+    # Book rows are keyed by book_id; review rows by book_id, then review_id
+    columns = [header.index("book_id")] if "book_id" in header else []
+    if header[0] != "book_id":
+        columns.append(0)
+    return lambda row: [sort_value(row[i]) for i in columns]
+
+
+def write_run(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def merge_csv(uri, parts, chunk_rows=MERGE_CHUNK_ROWS):
+    """Merge part CSVs into ``uri``, sorted by ID with duplicates dropped
+
+    Parts are read in chunks of ``chunk_rows`` rows, each chunk is sorted
+    into a run file, and the runs are streamed through a k-way merge, so at
+    most one chunk is held in memory whatever the size of the parts.
+    """
+    raise_csv_field_limit()
+    header = key = None
+    runs = []
+    try:
+        for path in parts:
+            with open(path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                part_header = next(reader, None)
+                if part_header is None:
+                    continue
+                header = header or part_header
+                key = key or row_key(header)
+                while chunk := list(itertools.islice(reader, chunk_rows)):
+                    chunk.sort(key=key)
+                    runs.append(write_run(f"{path}.run{len(runs):04d}", chunk))
+
+        if header is None:
+            # Nothing was scraped; leave an empty file as a single run would
+            open(uri, "w").close()
+            return 0
+
+        files = [open(path, newline="", encoding="utf-8") for path in runs]
+        written = 0
+        try:
+            with open(uri, "w", newline="", encoding="utf-8") as out:
+                writer = csv.writer(out)
+                writer.writerow(header)
+                previous = None
+                for row in heapq.merge(*(csv.reader(f) for f in files), key=key):
+                    current = key(row)
+                    if current == previous:
+                        continue
+                    previous = current
+                    writer.writerow(row)
+                    written += 1
+        finally:
+            for f in files:
+                f.close()
+        return written
+    finally:
+        for path in runs:
+            os.remove(path)
+
+
+def merge_outputs(spider_name, shards, keep_parts=False):
+    """Merge every feed's part files into its final output file"""
+    from scrapy.utils.project import get_project_settings
+
+    spider_cls = load_spider(spider_name)
+    for uri, options in feed_config(spider_cls, get_project_settings()).items():
+        parts = [part_path(uri, i) for i in range(shards)]
+        parts = [path for path in parts if os.path.exists(path)]
+        if options.get("format", "csv") != "csv":
+            print(f"⚠️ Cannot merge {options['format']} parts for {uri}; left in {PARTS_DIR}/")
+            continue
+
+        written = merge_csv(uri, parts)
+        print(f"✅ Merged {len(parts)} parts into {uri} ({written} rows)")
+        if not keep_parts:
+            for path in parts:
+                os.remove(path)
+
+
+def run_sharded(
+    spider_name,
+    shards,
+    start_id=None,
+    end_id=None,
+    use_frontier=False,
+    keep_parts=False,
+):
+    """Crawl ``spider_name`` over [start_id, end_id] in ``shards`` processes"""
+    spider_cls = load_spider(spider_name)
+    start_id = spider_cls.START_ID if start_id is None else start_id
+    end_id = spider_cls.END_ID if end_id is None else end_id
+    if use_frontier:
+        # Every shard seeds the same range and leases from it as it goes
+        ranges = [(start_id, end_id)] * max(1, shards)
     else:
-        print("Available spiders:")
-        print("  books   - Scrape basic book information")
-        print("  reviews - Scrape book reviews (requires Selenium)")
-        print("\nUsage: python run_spiders.py [books|reviews]")
+        ranges = shard_ranges(start_id, end_id, shards)
+    os.makedirs(PARTS_DIR, exist_ok=True)
+
+    print(
+        f"Starting {spider_cls.name} over IDs {start_id}-{end_id} "
+        f"in {len(ranges)} shards..."
+    )
+
+    # Each child builds its own reactor, which a forked copy of ours would break
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for shard, (low, high) in enumerate(ranges):
+        process = context.Process(
+            target=run_shard,
+            args=(spider_name, shard, low, high, use_frontier),
+            name=f"shard{shard:03d}",
+        )
+        process.start()
+        processes.append(process)
+
+    failed = []
+    for shard, process in enumerate(processes):
+        process.join()
+        if process.exitcode != 0:
+            failed.append(shard)
+
+    if failed:
+        print(
+            f"❌ Shards {failed} failed (see {PARTS_DIR}/shardNNN.log); "
+            "rerun to resume them before merging"
+        )
+        return 1
+
+    merge_outputs(spider_name, len(ranges), keep_parts=keep_parts)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Goodreads spider in shards")
+    parser.add_argument("spider", choices=sorted(SPIDERS))
+    parser.add_argument(
+        "--shards", type=int, default=os.cpu_count() or 1, help="processes to run"
+    )
+    parser.add_argument("--start", type=int, help="first book ID (spider default)")
+    parser.add_argument("--end", type=int, help="last book ID (spider default)")
+    parser.add_argument(
+        "--frontier",
+        action="store_true",
+        help="lease IDs from the shared FRONTIER_FILE instead of fixed slices",
+    )
+    parser.add_argument(
+        "--keep-parts", action="store_true", help="keep part files after merging"
+    )
+    args = parser.parse_args(argv)
+
+    return run_sharded(
+        args.spider,
+        args.shards,
+        args.start,
+        args.end,
+        use_frontier=args.frontier,
+        keep_parts=args.keep_parts,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
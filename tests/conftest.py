@@ -0,0 +1,21 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from fixture_site import FixtureHandler, SiteURL
+
+
+@pytest.fixture
+def server(request):
+    """Base URL of a fixture site (parametrize indirectly with a
+    FixtureHandler mode to change how it answers); its ``handler.statuses``
+    lists the status of every answer"""
+    mode = getattr(request, "param", None)
+    handler = type("Handler", (FixtureHandler,), {"mode": mode, "statuses": []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield SiteURL(f"http://127.0.0.1:{httpd.server_port}", handler)
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,328 @@
+"""Local stand-in for goodreads.com used by the crawl tests
+
+The server mimics Goodreads' Next.js pages: the book page and every review
+listing page embed their reviews and the listing's ``nextPageToken`` in the
+Apollo cache of ``__NEXT_DATA__``. Only book 1 exists. Crawls run in a
+subprocess, since the Twisted reactor cannot be restarted within one test
+session.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+from parsel import Selector
+from selenium.common.exceptions import NoSuchElementException
+
+from goodreads_scraper.browser import BrowserDownloadHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seven reviews over three listing pages; cursors contain characters that
+# must be escaped in a query string
+PAGES = [[1, 2, 3], [4, 5, 6], [7]]
+CURSORS = [None, "MywxNjAw+/w==", "NiwxNjAw+/x=="]
+# Served under /v2: the same book after review 6 was deleted and it was
+# retitled
+PAGES_V2 = [[1, 2, 3], [4, 5], [7]]
+SLOW_SECONDS = 0.2
+ETAG = '"fixture-1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def review_entries(review_ids):
+    state = {}
+    for review_id in review_ids:
+        state[f"Review:kca://review/{review_id}"] = {
+            "id": f"kca://review/{review_id}",
+            "text": f"<p>Review number {review_id}</p>",
+            "rating": 4,
+            "createdAt": 1600000000000,
+            "creator": {"__ref": f"User:{review_id}"},
+            "book": {"__ref": "Book:kca://book/1"},
+        }
+        state[f"User:{review_id}"] = {"name": f"Reader {review_id}"}
+    return state
+
+
+def page_html(
+    index, book_page=False, pages=PAGES, title="Fixture Book", embedded=True
+):
+    """HTML of listing page ``index`` (0 is the book page itself)
+
+    Without ``embedded`` the page has no ``__NEXT_DATA__``, like one whose
+    reviews are only rendered client-side.
+    """
+    next_cursor = CURSORS[index + 1] if index + 1 < len(pages) else None
+    root = {
+        'getReviews({"filters":{"resourceId":"kca://work/1"},"pagination":{}})': {
+            "__typename": "BookReviewsConnection",
+            "totalCount": sum(len(page) for page in pages),
+            "edges": [
+                {"node": {"__ref": f"Review:kca://review/{i}"}} for i in pages[index]
+            ],
+            "pageInfo": {"nextPageToken": next_cursor},
+        }
+    }
+    state = {"ROOT_QUERY": root, **review_entries(pages[index])}
+    if book_page:
+        root['getBookByLegacyId({"legacyId":"1"})'] = {"__ref": "Book:kca://book/1"}
+        state["Book:kca://book/1"] = {"legacyId": 1, "title": title}
+    data = {"props": {"pageProps": {"apolloState": state}}}
+    script = (
+        f"<script id='__NEXT_DATA__' type='application/json'>{json.dumps(data)}"
+        "</script>"
+    )
+    return (
+        f"<html><body><h1 class='Text__title1'>{title}</h1>"
+        "<span class='ContributorLink__name'>Fixture Author</span>"
+        f"{script if embedded else ''}</body></html>"
+    )
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixture book; ``mode`` changes how it answers:
+
+    - "ignore_cursor": every listing page is the first one
+    - "fail_reviews": listing pages answer 500
+    - "slow": every answer takes SLOW_SECONDS
+    - "client_rendered": the book page has no embedded data
+    - "etag" / "last_modified": the book page has that validator and answers
+      a matching conditional request with 304
+    - "changing": the book's title changes on every request
+    """
+
+    mode = None
+    book_hits = 0
+    statuses = []
+
+    def send_response(self, code, message=None):
+        self.statuses.append(code)
+        super().send_response(code, message)
+
+    def do_GET(self):
+        if self.mode == "slow":
+            time.sleep(SLOW_SECONDS)
+        url = urlparse(self.path)
+        path, edition = url.path, {}
+        if path.startswith("/v2/"):
+            path = path[len("/v2") :]
+            edition = {"pages": PAGES_V2, "title": "Fixture Book, Revised"}
+        headers = {}
+        if path == "/book/show/1":
+            type(self).book_hits += 1
+            if self.mode == "changing":
+                edition["title"] = f"Fixture Book {self.book_hits}"
+            if self.mode == "etag":
+                headers["ETag"] = ETAG
+            if self.mode == "last_modified":
+                headers["Last-Modified"] = LAST_MODIFIED
+            if headers and (
+                self.headers.get("If-None-Match") == ETAG
+                or self.headers.get("If-Modified-Since") == LAST_MODIFIED
+            ):
+                self.send_response(304)
+                self.end_headers()
+                return
+            embedded = self.mode != "client_rendered"
+            body = page_html(0, book_page=True, embedded=embedded, **edition)
+        elif path == "/book/show/1/reviews" and self.mode == "fail_reviews":
+            self.send_error(500)
+            return
+        elif path == "/book/show/1/reviews":
+            cursor = parse_qs(url.query).get("after", [None])[0]
+            if self.mode == "ignore_cursor" or cursor not in CURSORS[1:]:
+                body = page_html(0, **edition)
+            else:
+                body = page_html(CURSORS.index(cursor), **edition)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+class SiteURL(str):
+    """Base URL of a running fixture site"""
+
+    def __new__(cls, url, handler):
+        site = super().__new__(cls, url)
+        site.handler = handler
+        return site
+
+
+class FakeElement:
+    def __init__(self, selector):
+        self.selector = selector
+        self.text = " ".join(selector.css("::text").getall()).strip()
+
+    def find_element(self, by, value):
+        return find_element(self.selector, by, value)
+
+    def find_elements(self, by, value):
+        return find_elements(self.selector, by, value)
+
+    def get_attribute(self, name):
+        return self.selector.attrib.get(name)
+
+
+def find_elements(selector, by, value):
+    query = selector.xpath if by == "xpath" else selector.css
+    return [FakeElement(match) for match in query(value)]
+
+
+def find_element(selector, by, value):
+    elements = find_elements(selector, by, value)
+    if not elements:
+        raise NoSuchElementException(value)
+    return elements[0]
+
+
+class FakeDriver:
+    """Stand-in for a Chrome WebDriver: "renders" a page by fetching it
+
+    Scripts return None, ``performance_log`` is what get_log() hands out
+    once, and DevTools commands are recorded in ``cdp_commands``.
+    """
+
+    def __init__(self):
+        self.page_source = ""
+        self.current_url = ""
+        self.performance_log = []
+        self.cdp_commands = []
+        self.quit_called = False
+
+    def get(self, url):
+        with urlopen(url) as response:
+            self.page_source = response.read().decode("utf-8")
+        self.current_url = url
+
+    def find_element(self, by, value):
+        return find_element(Selector(text=self.page_source), by, value)
+
+    def find_elements(self, by, value):
+        return find_elements(Selector(text=self.page_source), by, value)
+
+    def execute_script(self, script, *args):
+        return None
+
+    def execute_async_script(self, script, *args):
+        return None
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+    def get_log(self, kind):
+        log, self.performance_log = self.performance_log, []
+        return log
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FixtureBrowserHandler(BrowserDownloadHandler):
+    """BrowserDownloadHandler whose pool renders with FakeDriver"""
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.pool.driver_factory = FakeDriver
+
+
+CRAWL = """
+import sys
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {tests!r})
+from importlib import import_module
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+module, name = {spider!r}.split(":")
+base = getattr(import_module(module), name)
+
+class FixtureSpider(base):
+    allowed_domains = None
+
+    def book_request(self, book_id):
+        request = super().book_request(book_id)
+        return request.replace(
+            url=request.url.replace("https://www.goodreads.com", {base_url!r})
+        )
+
+settings = get_project_settings()
+settings.setdict({settings!r}, priority="cmdline")
+process = CrawlerProcess(settings)
+process.crawl(FixtureSpider, START_ID=1, END_ID={end_id})
+process.start()
+"""
+
+BOOKS_SPIDER = "goodreads_scraper.spiders.goodreads_books:GoodreadsBooksSpider"
+REVIEW_SPIDERS = [
+    "goodreads_scraper.spiders.goodreads_review:GoodreadsReviewsSpider",
+    "goodreads_review:GoodreadsReviewsSpider",
+]
+
+
+def start_crawl(tmp_path, spider, base_url, end_id=1, output="items.jl", **overrides):
+    """Start ``spider`` on book IDs 1..``end_id`` of the fixture site
+
+    Items go to ``tmp_path / output`` as JSON lines; returns the Popen.
+    """
+    settings = {
+        "FEEDS": {str(tmp_path / output): {"format": "jsonlines", "overwrite": True}},
+        "REVIEW_PAGINATION_ENABLED": True,
+        "REVIEW_PAGE_URL": base_url + "/book/show/{book_id}/reviews?after={cursor}",
+        "DOWNLOAD_DELAY": 0,
+        "CHECKPOINT_ENABLED": False,
+        "NEGATIVE_CACHE_ENABLED": False,
+        "RECRAWL_HISTORY_ENABLED": False,
+        "HTTPCACHE_ENABLED": False,
+        "TELNETCONSOLE_ENABLED": False,
+        **overrides,
+    }
+    script = CRAWL.format(
+        root=ROOT,
+        tests=os.path.join(ROOT, "tests"),
+        spider=spider,
+        base_url=base_url,
+        end_id=end_id,
+        settings=settings,
+    )
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE="goodreads_scraper.settings")
+    return subprocess.Popen(
+        [sys.executable, "-c", textwrap.dedent(script)],
+        cwd=tmp_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def finish_crawl(process, tmp_path, output="items.jl"):
+    """Wait for a crawl from start_crawl; return (items, log)"""
+    _, log = process.communicate(timeout=120)
+    assert process.returncode == 0, log
+    with open(tmp_path / output, encoding="utf-8") as f:
+        return [json.loads(line) for line in f], log
+
+
+def crawl(tmp_path, spider, base_url, end_id=1, **overrides):
+    """Run ``spider`` to the end; return (items, log)"""
+    process = start_crawl(tmp_path, spider, base_url, end_id, **overrides)
+    return finish_crawl(process, tmp_path)
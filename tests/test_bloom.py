@@ -0,0 +1,124 @@
+"""Bloom filter file, review dedup staging and derived review IDs"""
+
+import logging
+import multiprocessing
+from unittest import mock
+
+import pytest
+from scrapy.exceptions import DropItem
+
+from goodreads_scraper.bloom import BloomFilter
+from goodreads_scraper.items import ReviewItem
+from goodreads_scraper.pipelines import ReviewDedupPipeline
+
+
+def keys(start, stop):
+    return [f"key-{i}".encode() for i in range(start, stop)]
+
+
+def test_no_false_negatives_and_bounded_false_positives(tmp_path):
+    bloom = BloomFilter(str(tmp_path / "f.bloom"), capacity=10_000, error_rate=0.01)
+    for key in keys(0, 10_000):
+        bloom.add(key)
+    assert all(key in bloom for key in keys(0, 10_000))
+    false_positives = sum(key in bloom for key in keys(10_000, 20_000))
+    assert false_positives < 10_000 * 0.02
+    bloom.close()
+
+
+def test_persists_across_reopening(tmp_path):
+    path = str(tmp_path / "f.bloom")
+    bloom = BloomFilter(path, capacity=1000)
+    bloom.update(keys(0, 100))
+    bloom.close()
+
+    bloom = BloomFilter(path)
+    assert len(bloom) == 100
+    assert all(key in bloom for key in keys(0, 100))
+    assert not bloom.add(b"key-5")
+    bloom.close()
+
+    (tmp_path / "other").write_bytes(b"not a filter" * 10)
+    with pytest.raises(ValueError):
+        BloomFilter(str(tmp_path / "other"))
+
+
+def add_range(path, start, stop):
+    bloom = BloomFilter(path)
+    for i in range(start, stop, 10):
+        bloom.update(keys(i, i + 10))
+    bloom.close()
+
+
+def test_processes_sharing_a_file_keep_each_others_keys(tmp_path):
+    path = str(tmp_path / "f.bloom")
+    BloomFilter(path, capacity=100_000).close()
+    workers = [
+        multiprocessing.Process(target=add_range, args=(path, start, start + 2000))
+        for start in range(0, 8000, 2000)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    bloom = BloomFilter(path)
+    assert all(key in bloom for key in keys(0, 8000))
+    # Each process raised the stored count only by its own keys
+    assert len(bloom) == 8000
+    bloom.close()
+
+
+def review(text, reviewer="Reader", review_id=None):
+    return ReviewItem(
+        review_id=review_id,
+        book_id=1,
+        reviewer=reviewer,
+        date="2020-09-13",
+        review_text=text,
+        book_ratings_count=10,
+    )
+
+
+def test_derived_review_ids_are_stable():
+    first = review("A  fine\nbook.")
+    assert first.review_id.startswith("review_1_")
+    # Whitespace, case and the book's changing counts do not matter
+    assert review("a fine book.").review_id == first.review_id
+    again = review("A fine book.")
+    again.book_ratings_count = 11
+    assert again.content_hash() == first.content_hash()
+    assert review("A fine book!").review_id != first.review_id
+    assert review("A fine book.", reviewer="Other").review_id != first.review_id
+    assert review("A fine book.", review_id="kca://review/1").review_id == (
+        "kca://review/1"
+    )
+
+
+def open_pipeline(path):
+    pipeline = ReviewDedupPipeline(path, capacity=1000, error_rate=0.001)
+    pipeline.stats = mock.Mock()
+    spider = mock.Mock(logger=logging.getLogger("test"))
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def test_dedup_stages_hashes_until_reviews_are_written(tmp_path):
+    path = str(tmp_path / "reviews.bloom")
+    pipeline, spider = open_pipeline(path)
+    pipeline.process_item(review("Loved it"), spider)
+    with pytest.raises(DropItem):
+        pipeline.process_item(review("Loved  it"), spider)
+
+    # Not applied yet: as after a crash, the next run sees the review again
+    crashed, _ = open_pipeline(path)
+    crashed.process_item(review("Loved it"), spider)
+    crashed.seen.close()
+
+    pipeline.apply()
+    pipeline.engine_stopped()
+    rerun, _ = open_pipeline(path)
+    with pytest.raises(DropItem):
+        rerun.process_item(review("Loved it"), spider)
+    rerun.process_item(review("Hated it"), spider)
+    rerun.engine_stopped()
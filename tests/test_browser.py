@@ -0,0 +1,181 @@
+"""Browser escalation and the pooled browser download handler"""
+
+import json
+from unittest import mock
+
+import pytest
+from scrapy import Request
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from fixture_site import FakeDriver, crawl
+from goodreads_scraper import settings as project_settings
+from goodreads_scraper.browser import (
+    RESOURCE_TYPE_PATTERNS,
+    BrowserDownloadHandler,
+    blocked_url_patterns,
+    build_chrome_driver,
+    matches_any,
+)
+
+REVIEW_SPIDER = "goodreads_review:GoodreadsReviewsSpider"
+HANDLER = "fixture_site.FixtureBrowserHandler"
+
+
+@pytest.mark.parametrize("server", ["client_rendered"], indirect=True)
+def test_escalated_page_is_rendered_with_the_cache_on(tmp_path, server):
+    # The plain response is cached first; the escalated request shares its
+    # fingerprint and must still reach the browser
+    _, log = crawl(
+        tmp_path,
+        REVIEW_SPIDER,
+        server,
+        HTTPCACHE_ENABLED=True,
+        HTTPCACHE_DIR=str(tmp_path / "httpcache"),
+        DOWNLOAD_HANDLERS={"http": HANDLER, "https": HANDLER},
+    )
+
+    assert "Escalating" in log
+    assert "page not rendered" not in log
+    assert "📖 Book: Fixture Book by Fixture Author" in log
+    assert "'browser/pages_rendered': 1" in log
+    assert "'httpcache/hit'" not in log
+
+
+class BlockingDriver(FakeDriver):
+    """FakeDriver whose pages fetch one image unless it is blocked
+
+    Each load logs a 1,000-byte document and, when ``*.png*`` is not
+    blocked, a 5,000-byte image; a blocked image shows up as a failed load.
+    """
+
+    def __init__(self, blocked):
+        super().__init__()
+        self.blocked = blocked
+        self.loads = []
+
+    def execute_cdp_cmd(self, command, params):
+        super().execute_cdp_cmd(command, params)
+        if command == "Network.setBlockedURLs":
+            self.blocked = params["urls"]
+
+    def get(self, url):
+        super().get(url)
+        self.loads.append(bool(self.blocked))
+        if "*.png*" in self.blocked:
+            image = network_event(
+                "Network.loadingFailed", blockedReason="inspector", type="Image"
+            )
+        else:
+            image = network_event(
+                "Network.loadingFinished", requestId="2", encodedDataLength=5000
+            )
+        self.performance_log = [
+            network_event(
+                "Network.requestWillBeSent", requestId="1", request={"url": url}
+            ),
+            network_event(
+                "Network.loadingFinished", requestId="1", encodedDataLength=1000
+            ),
+            network_event(
+                "Network.requestWillBeSent",
+                requestId="2",
+                request={"url": f"{url}/a.png"},
+            ),
+            image,
+        ]
+
+    def execute_script(self, script, *args):
+        return 120 if "navigation" in script else None
+
+
+def network_event(method, **params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+def browser_settings(**overrides):
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.update(overrides)
+    return settings
+
+
+def test_blocked_resources_are_sent_to_chrome():
+    settings = browser_settings(
+        BROWSER_BLOCK_RESOURCE_TYPES=["Image", "Font"],
+        BROWSER_BLOCK_URL_PATTERNS=["*doubleclick.net*"],
+    )
+    with mock.patch("selenium.webdriver.Chrome") as chrome, mock.patch(
+        "selenium.webdriver.chrome.service.Service"
+    ):
+        driver = build_chrome_driver(settings)
+
+    assert driver is chrome.return_value
+    patterns = (
+        RESOURCE_TYPE_PATTERNS["Image"]
+        + RESOURCE_TYPE_PATTERNS["Font"]
+        + ["*doubleclick.net*"]
+    )
+    assert driver.execute_cdp_cmd.call_args_list == [
+        mock.call("Network.enable", {}),
+        mock.call("Network.setBlockedURLs", {"urls": patterns}),
+    ]
+    assert matches_any("https://cdn.example.com/cover.jpg?w=200", patterns)
+    assert not matches_any("https://www.goodreads.com/book/show/1", patterns)
+
+
+def test_nothing_is_blocked_without_patterns():
+    settings = browser_settings(
+        BROWSER_BLOCK_RESOURCE_TYPES=[], BROWSER_BLOCK_URL_PATTERNS=[]
+    )
+    with mock.patch("selenium.webdriver.Chrome") as chrome, mock.patch(
+        "selenium.webdriver.chrome.service.Service"
+    ):
+        build_chrome_driver(settings)
+    chrome.return_value.execute_cdp_cmd.assert_not_called()
+
+
+def test_sampled_pages_load_unblocked_and_stats_are_recorded(server):
+    settings = browser_settings(
+        BROWSER_BLOCK_RESOURCE_TYPES=["Image"],
+        BROWSER_BLOCK_URL_PATTERNS=[],
+        BROWSER_BLOCKING_SAMPLE_EVERY=3,
+        BROWSER_POOL_SIZE=1,
+    )
+    crawler = mock.Mock(settings=settings)
+    crawler.stats = MemoryStatsCollector(crawler)
+    with mock.patch("goodreads_scraper.browser.HTTP11DownloadHandler"):
+        handler = BrowserDownloadHandler(crawler)
+    drivers = []
+
+    def start_driver():
+        drivers.append(BlockingDriver(blocked_url_patterns(settings)))
+        return drivers[-1]
+
+    handler.pool.driver_factory = start_driver
+    # Stats are updated right away instead of on the reactor thread
+    handler.call_in_reactor = lambda function, *args: function(*args)
+
+    spider = mock.Mock()
+    for _ in range(6):
+        request = Request(server + "/book/show/1", meta={"browser": True})
+        response = handler.render(request, spider)
+        assert "Fixture Book" in response.text
+
+    [driver] = drivers
+    assert driver.loads == [True, True, False, True, True, False]
+    assert driver.blocked == RESOURCE_TYPE_PATTERNS["Image"]
+    stats = crawler.stats.get_stats()
+    assert {k: v for k, v in stats.items() if k.startswith("browser/")} == {
+        "browser/drivers_started": 1,
+        "browser/pages_rendered": 6,
+        "browser/blocked_requests": 4,
+        "browser/blocked_requests/Image": 4,
+        "browser/response_bytes": 4000,
+        "browser/page_load_ms": 480,
+        "browser/page_load_ms_max": 120,
+        "browser/sampled_pages": 2,
+        "browser/sampled_blockable_requests": 2,
+        "browser/sampled_blockable_bytes": 10000,
+        "browser/blocked_bytes_estimate": 20000,
+    }
@@ -0,0 +1,73 @@
+"""Compact dupefilter: the integer set, request keys and JOBDIR state"""
+
+from scrapy import Request
+from scrapy.utils.request import RequestFingerprinter
+
+from goodreads_scraper.dupefilter import STATE_FILE, CompactDupeFilter, CompactIntSet
+
+BASE = "https://www.goodreads.com/book/show"
+
+
+def dupefilter(path=None):
+    return CompactDupeFilter(path, fingerprinter=RequestFingerprinter())
+
+
+def test_int_set_grows_and_keeps_every_value():
+    values = CompactIntSet(capacity=8)
+    assert values.add(0)
+    assert all(values.add(i * 7919) for i in range(1, 5000))
+    assert not values.add(0)
+    assert not values.add(7919)
+
+    assert len(values) == 5000
+    assert values.nbytes >= 8 * 2 * 5000  # load factor stays under MAX_LOAD
+    assert all(i * 7919 in values for i in range(5000))
+    assert 3 not in values
+    assert sorted(values) == [i * 7919 for i in range(5000)]
+
+
+def test_books_and_review_pages_are_seen_once():
+    seen = dupefilter()
+    urls = [
+        f"{BASE}/1",
+        f"{BASE}/1/reviews",
+        f"{BASE}/1/reviews?after=MywxNjAw%2B%2Fw%3D%3D",
+        f"{BASE}/1/reviews?after=NiwxNjAw%2B%2Fx%3D%3D",
+        f"{BASE}/2/reviews?after=MywxNjAw%2B%2Fw%3D%3D",
+        f"{BASE}/1/reviews?page=2",
+    ]
+    assert [seen.request_seen(Request(url)) for url in urls] == [False] * 6
+    assert all(seen.request_seen(Request(url)) for url in urls)
+
+    assert seen.request_key(Request(f"{BASE}/1")) == ("book", 1)
+    kind, key = seen.request_key(Request(urls[2]))
+    assert kind == "other" and key >> 34 == 1
+    assert len(seen.books) == 1
+
+
+def test_book_urls_with_a_slug_are_keyed_by_fingerprint():
+    # Slug and bare URLs are different requests (one may redirect to the
+    # other), so slug URLs are not folded into the book ID
+    seen = dupefilter()
+    assert not seen.request_seen(Request(f"{BASE}/1"))
+    assert not seen.request_seen(Request(f"{BASE}/1.Fixture_Book"))
+    assert not seen.request_seen(Request(f"{BASE}/1-fixture-book"))
+    assert seen.request_seen(Request(f"{BASE}/1.Fixture_Book"))
+    assert seen.request_key(Request(f"{BASE}/1.Fixture_Book"))[1] >= 1 << 63
+
+
+def test_state_is_kept_under_jobdir(tmp_path):
+    urls = [f"{BASE}/{i}" for i in (1, 5, 90_000_000)] + [
+        f"{BASE}/5/reviews?after=abc",
+        f"{BASE}/5.Slug",
+    ]
+    first = dupefilter(str(tmp_path))
+    for url in urls:
+        first.request_seen(Request(url))
+    first.close("finished")
+    assert (tmp_path / STATE_FILE).exists()
+
+    second = dupefilter(str(tmp_path))
+    assert all(second.request_seen(Request(url)) for url in urls)
+    assert not second.request_seen(Request(f"{BASE}/2"))
+    assert not second.request_seen(Request(f"{BASE}/5/reviews?after=abd"))
@@ -0,0 +1,114 @@
+"""Embedded page data and the CSS fallback of the books spider"""
+
+import json
+from unittest import mock
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+from fixture_site import CURSORS, page_html
+from goodreads_scraper import embedded
+from goodreads_scraper.spiders.goodreads_books import GoodreadsBooksSpider
+
+URL = "https://www.goodreads.com/book/show/1"
+
+BOOK_STATE = {
+    "ROOT_QUERY": {
+        'getBookByLegacyId({"legacyId":"1"})': {"__ref": "Book:kca://book/1"}
+    },
+    "Book:kca://book/1": {
+        "legacyId": 1,
+        "title": " Embedded Book ",
+        "primaryContributorEdge": {"node": {"__ref": "Contributor:1"}},
+        "work": {"__ref": "Work:1"},
+        "details": {"isbn13": "9780000000001", "numPages": 320, "publisher": "Pub"},
+        "bookGenres": [
+            {"genre": {"__ref": "Genre:1"}},
+            {"genre": {"__ref": "Genre:2"}},
+        ],
+    },
+    # A related edition must not be picked up
+    "Book:kca://book/2": {"legacyId": 2, "title": "Other Edition"},
+    "Contributor:1": {"name": "Embedded Author"},
+    "Work:1": {
+        "stats": {
+            "averageRating": 4.1234,
+            "ratingsCount": 1234567,
+            "textReviewsCount": 8901,
+        }
+    },
+    "Genre:1": {"name": "Fantasy"},
+    "Genre:2": {"name": "Fiction"},
+}
+
+
+def html_response(body, book_id=1):
+    request = Request(URL, meta={"book_id": book_id})
+    return HtmlResponse(URL, body=body, encoding="utf-8", request=request)
+
+
+def next_data_page(state):
+    data = {"props": {"pageProps": {"apolloState": state}}}
+    return (
+        "<html><body><script id='__NEXT_DATA__' type='application/json'>"
+        f"{json.dumps(data)}</script></body></html>"
+    )
+
+
+def test_book_fields_from_embedded_data():
+    fields = embedded.extract_book(html_response(next_data_page(BOOK_STATE)), 1)
+
+    assert fields == {
+        "title": "Embedded Book",
+        "author": "Embedded Author",
+        "avg_rating": "4.12",
+        "ratings_count": "1,234,567",
+        "reviews_count": "8,901",
+        "isbn": "9780000000001",
+        "pages": "320",
+        "publisher": "Pub",
+        "genres": "Fantasy, Fiction",
+    }
+
+
+def test_next_data_is_decoded_once_per_response():
+    response = html_response(page_html(0, book_page=True))
+    with mock.patch.object(embedded.json, "loads", wraps=json.loads) as loads:
+        embedded.extract_book(response, 1)
+        reviews = embedded.extract_reviews(response, 1)
+        cursor = embedded.next_review_cursor(response)
+        last = embedded.is_last_review_page(response)
+        embedded.has_truncated_reviews(response, 1)
+
+    payloads = [call for call in loads.call_args_list if "props" in call.args[0]]
+    assert len(payloads) == 1
+    assert [review["review_id"] for review in reviews] == [
+        "kca://review/1",
+        "kca://review/2",
+        "kca://review/3",
+    ]
+    assert (cursor, last) == (CURSORS[1], False)
+
+    # A new response for the same page is decoded again
+    other = html_response(page_html(2))
+    assert embedded.next_review_cursor(other) is None
+    assert embedded.is_last_review_page(other)
+
+
+def test_spider_falls_back_to_css_without_embedded_data():
+    spider = GoodreadsBooksSpider()
+    response = html_response(page_html(0, book_page=True, embedded=False))
+    assert embedded.extract_book(response, 1) is None
+
+    [item] = spider.parse_book(response)
+    assert (item.title, item.author) == ("Fixture Book", "Fixture Author")
+
+
+def test_spider_fills_missing_embedded_fields_from_css():
+    # The fixture's embedded Book has a title but no contributor
+    spider = GoodreadsBooksSpider()
+    response = html_response(page_html(0, book_page=True, title="Embedded Title"))
+    assert embedded.extract_book(response, 1)["author"] is None
+
+    [item] = spider.parse_book(response)
+    assert (item.title, item.author) == ("Embedded Title", "Fixture Author")
@@ -0,0 +1,136 @@
+"""Parquet exporter, size-based feed batches and buffered feed storage"""
+
+import io
+import json
+import os
+from unittest import mock
+
+import pyarrow.parquet
+from scrapy.signalmanager import SignalManager
+
+from fixture_site import REVIEW_SPIDERS, start_crawl
+from goodreads_scraper.checkpoint import checkpoint_saving
+from goodreads_scraper.feeds import (
+    BufferedFeedFile,
+    BufferedFileFeedStorage,
+    ParquetItemExporter,
+)
+from goodreads_scraper.items import BookItem
+
+
+def books(count):
+    return [
+        BookItem(
+            book_id=i,
+            title=f"Book {i}",
+            author="Same Author",
+            avg_rating="4.25",
+            ratings_count="1,234",
+            genres="Fantasy, Fiction",
+        )
+        for i in range(count)
+    ]
+
+
+def export_parquet(items, **options):
+    f = io.BytesIO()
+    exporter = ParquetItemExporter(f, **options)
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+    f.seek(0)
+    return pyarrow.parquet.ParquetFile(f)
+
+
+def test_parquet_columns_are_typed_from_the_item_fields():
+    parquet = export_parquet(books(5), row_group_size=2, dictionary_columns=["author"])
+
+    schema = parquet.schema_arrow
+    assert schema.field("book_id").type == pyarrow.int64()
+    assert schema.field("ratings_count").type == pyarrow.int64()
+    assert schema.field("avg_rating").type == pyarrow.float64()
+    assert schema.field("title").type == pyarrow.string()
+    rows = parquet.read().to_pylist()
+    assert [row["book_id"] for row in rows] == [0, 1, 2, 3, 4]
+    assert (rows[0]["ratings_count"], rows[0]["avg_rating"]) == (1234, 4.25)
+    assert parquet.metadata.num_row_groups == 3
+
+
+def test_only_the_listed_columns_are_dictionary_encoded():
+    parquet = export_parquet(books(3), dictionary_columns=["author", "missing"])
+
+    row_group = parquet.metadata.row_group(0)
+    encodings = {
+        row_group.column(i).path_in_schema: row_group.column(i).encodings
+        for i in range(row_group.num_columns)
+    }
+    assert "RLE_DICTIONARY" in encodings["author"]
+    assert "RLE_DICTIONARY" not in encodings["title"]
+
+
+def test_empty_parquet_feed_is_still_a_valid_file():
+    assert export_parquet([]).metadata.num_columns == 0
+
+
+def test_feed_rolls_over_once_a_batch_reaches_its_byte_limit(tmp_path, server):
+    feed = str(tmp_path / "reviews-%(batch_id)02d.jl")
+    process = start_crawl(
+        tmp_path,
+        REVIEW_SPIDERS[0],
+        server,
+        FEEDS={feed: {"format": "jsonlines", "batch_max_bytes": 500}},
+    )
+    _, log = process.communicate(timeout=120)
+    assert process.returncode == 0, log
+
+    batches = sorted(tmp_path.glob("reviews-*.jl"))
+    assert len(batches) > 1
+    lines = []
+    for path in batches:
+        with open(path, "rb") as f:
+            batch = f.readlines()
+        lines.extend(batch)
+        # Each batch was closed by the item that took it past the limit
+        assert sum(map(len, batch[:-1])) < 500
+        if path != batches[-1]:
+            assert sum(map(len, batch)) >= 500
+    assert len({json.loads(line)["review_id"] for line in lines}) == 7
+
+
+def test_buffered_feed_is_written_and_fsynced_at_checkpoints(tmp_path):
+    path = tmp_path / "feed.jl"
+    signals = SignalManager()
+    crawler = mock.Mock(signals=signals)
+    crawler.settings.getint.return_value = 1024 * 1024
+    crawler.settings.getfloat.return_value = 3600.0
+    storage = BufferedFileFeedStorage.from_crawler(crawler, path.as_uri())
+    feed = storage.open(mock.Mock())
+    assert isinstance(feed, BufferedFeedFile)
+
+    with mock.patch("goodreads_scraper.feeds.os.fsync", wraps=os.fsync) as fsync:
+        feed.write(b'{"a": 1}\n')
+        # Below FEED_BUFFER_BYTES and FEED_BUFFER_SECONDS: still in memory
+        assert path.read_bytes() == b""
+        assert feed.tell() == 9
+
+        signals.send_catch_log(checkpoint_saving)
+        assert path.read_bytes() == b'{"a": 1}\n'
+        assert fsync.call_count == 1
+
+        feed.write(b'{"a": 2}\n')
+        feed.close()
+    assert path.read_bytes() == b'{"a": 1}\n{"a": 2}\n'
+    assert fsync.call_count == 2
+
+
+def test_buffered_feed_hands_off_full_buffers(tmp_path):
+    path = tmp_path / "feed.bin"
+    feed = BufferedFeedFile(open(path, "wb"), max_bytes=10, max_seconds=3600)
+    feed.write(b"12345")
+    feed.write(b"67890")  # reaches max_bytes
+    feed.sync()
+    assert path.read_bytes() == b"1234567890"
+    feed.write(b"x")
+    feed.close()
+    assert path.read_bytes() == b"1234567890x"
@@ -0,0 +1,82 @@
+"""Shared work queue: leasing, reporting and workers sharing one file"""
+
+import re
+import sqlite3
+import time
+
+import pytest
+
+from fixture_site import BOOKS_SPIDER, finish_crawl, start_crawl
+from goodreads_scraper.frontier import Frontier
+
+
+def leased(log):
+    match = re.search(r"'frontier/leased': (\d+)", log)
+    return int(match.group(1)) if match else 0
+
+
+def wait_for_leases(path, timeout=30):
+    """Wait until some ID of the frontier file at ``path`` is leased"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with sqlite3.connect(path) as db:
+                query = "SELECT 1 FROM frontier WHERE state = 'leased'"
+                if db.execute(query).fetchone():
+                    return
+        except sqlite3.OperationalError:
+            pass  # not created yet, or locked by the worker
+        time.sleep(0.05)
+    raise AssertionError("no ID was leased")
+
+
+def test_expired_lease_on_the_last_attempt_fails(tmp_path):
+    path = str(tmp_path / "frontier.sqlite")
+    crashed = Frontier(path, lease_seconds=0, max_attempts=2, worker="crashed")
+    crashed.seed(1, 2)
+    assert crashed.lease(2) == [1, 2]
+    crashed.report({2: "done"})
+    time.sleep(0.01)
+    # Book 1's lease expired and is taken over for its second attempt
+    assert crashed.lease(2) == [1]
+
+    time.sleep(0.01)
+    other = Frontier(path, max_attempts=2, worker="other")
+    assert other.lease(2) == []
+    assert other.counts() == {"done": 1, "failed": 1}
+
+
+def test_release_fails_ids_without_attempts_left(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), max_attempts=1)
+    frontier.seed(1, 2)
+    frontier.lease(1)
+    assert frontier.release() == 1
+    assert frontier.counts() == {"failed": 1, "pending": 1}
+
+
+@pytest.mark.parametrize("server", ["slow"], indirect=True)
+def test_a_later_worker_still_gets_work(tmp_path, server):
+    path = tmp_path / "frontier.sqlite"
+    settings = {
+        "FRONTIER_ENABLED": True,
+        "FRONTIER_FILE": str(path),
+        "FRONTIER_BATCH_SIZE": 2,
+        "CONCURRENT_REQUESTS": 2,
+    }
+    first = start_crawl(
+        tmp_path, BOOKS_SPIDER, server, end_id=30, output="1.jl", **settings
+    )
+    wait_for_leases(path)
+    second = start_crawl(
+        tmp_path, BOOKS_SPIDER, server, end_id=30, output="2.jl", **settings
+    )
+    logs = [
+        finish_crawl(first, tmp_path, "1.jl")[1],
+        finish_crawl(second, tmp_path, "2.jl")[1],
+    ]
+
+    # The first worker did not lease the whole queue up front
+    assert all(leased(log) >= 4 for log in logs), [leased(log) for log in logs]
+    with sqlite3.connect(path) as db:
+        states = dict(db.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"))
+    assert states == {"done": 1, "not_found": 29}
@@ -0,0 +1,148 @@
+"""HTTP cache revalidation, skipping unchanged pages and the SQLite storage"""
+
+import hashlib
+import os
+import time
+from unittest import mock
+
+import pytest
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.request import RequestFingerprinter
+
+from fixture_site import BOOKS_SPIDER, crawl
+from goodreads_scraper.httpcache import SqliteCacheStorage
+
+
+def crawl_twice(tmp_path, server, **overrides):
+    """Crawl the fixture book twice over one cache; return both runs"""
+    settings = {
+        "HTTPCACHE_ENABLED": True,
+        "HTTPCACHE_DIR": str(tmp_path / "httpcache"),
+        # Every cached page is stale, so the second run revalidates it
+        "HTTPCACHE_FRESHNESS_SECS": 0,
+        **overrides,
+    }
+    return [crawl(tmp_path, BOOKS_SPIDER, server, **settings) for _ in range(2)]
+
+
+@pytest.mark.parametrize(
+    "server, status",
+    [("etag", 304), ("last_modified", 304), (None, 200)],
+    indirect=["server"],
+)
+def test_unchanged_page_is_revalidated(tmp_path, server, status):
+    (first, _), (second, log) = crawl_twice(tmp_path, server)
+
+    assert server.handler.statuses == [200, status]
+    assert "'httpcache/revalidate': 1" in log
+    # The cached page is parsed as usual
+    assert [item["title"] for item in second] == [first[0]["title"]]
+
+
+@pytest.mark.parametrize("server", ["changing"], indirect=True)
+def test_changed_page_replaces_the_cached_one(tmp_path, server):
+    (first, _), (second, log) = crawl_twice(tmp_path, server)
+
+    assert "'httpcache/invalidate': 1" in log
+    assert first[0]["title"] == "Fixture Book 1"
+    assert second[0]["title"] == "Fixture Book 2"
+
+
+@pytest.mark.parametrize(
+    "server, changed",
+    [("etag", False), (None, False), ("changing", True)],
+    indirect=["server"],
+)
+def test_only_unchanged_pages_are_skipped(tmp_path, server, changed):
+    (first, _), (second, log) = crawl_twice(
+        tmp_path,
+        server,
+        HTTPCACHE_SKIP_UNCHANGED=True,
+        DELTA_ENABLED=True,
+        DELTA_STATE_FILE=str(tmp_path / "delta.sqlite"),
+        DELTA_CHANGELOG_DIR=str(tmp_path / "changes"),
+    )
+
+    assert len(first) == 1
+    if changed:
+        assert len(second) == 1
+        assert "httpcache/unchanged_skipped" not in log
+    else:
+        assert second == []
+        assert "'httpcache/unchanged_skipped': 1" in log
+
+
+def cache_storage(tmp_path, **settings):
+    settings = Settings(
+        {
+            "HTTPCACHE_DIR": str(tmp_path / "httpcache"),
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+            **settings,
+        }
+    )
+    crawler = mock.Mock(settings=settings, request_fingerprinter=RequestFingerprinter())
+    crawler.stats = MemoryStatsCollector(crawler)
+    spider = mock.Mock(crawler=crawler)
+    spider.name = "cache_test"
+    storage = SqliteCacheStorage(settings)
+    storage.open_spider(spider)
+    return storage, spider
+
+
+def store(storage, spider, url, body):
+    request = Request(url)
+    storage.store_response(spider, request, HtmlResponse(url, body=body))
+    # Access times must differ for the LRU order to be well defined
+    time.sleep(0.002)
+
+
+def test_storage_evicts_least_recently_used_entries(tmp_path):
+    # Random bodies do not compress, so each costs about 1 KB and the cache
+    # holds four of them
+    storage, spider = cache_storage(tmp_path, HTTPCACHE_MAX_BYTES=5000)
+    urls = [f"https://www.goodreads.com/book/show/{i}" for i in range(7)]
+    for url in urls[:4]:
+        store(storage, spider, url, os.urandom(1000))
+    assert storage.retrieve_response(spider, Request(urls[0])) is not None
+    time.sleep(0.002)
+    for url in urls[4:]:
+        store(storage, spider, url, os.urandom(1000))
+
+    cached = [storage.retrieve_response(spider, Request(url)) for url in urls]
+    assert [response is not None for response in cached] == [
+        True, False, False, False, True, True, True
+    ]
+    assert storage.total_bytes() <= 5000
+    assert spider.crawler.stats.get_value("httpcache/evicted") == 3
+    storage.close_spider(spider)
+
+
+def test_storage_keeps_identical_bodies_once(tmp_path):
+    storage, spider = cache_storage(tmp_path, HTTPCACHE_MAX_BYTES=0)
+    urls = [f"https://www.goodreads.com/book/show/{i}" for i in range(3)]
+    body = b"<html><body>Page not found</body></html>" + os.urandom(500)
+    for url in urls:
+        store(storage, spider, url, body)
+
+    def refs():
+        row = storage.db.execute(
+            "SELECT refs FROM bodies WHERE hash = ?", (hashlib.sha1(body).digest(),)
+        ).fetchone()
+        return row and row[0]
+
+    assert storage.db.execute("SELECT COUNT(*) FROM bodies").fetchone()[0] == 1
+    assert refs() == 3
+    assert spider.crawler.stats.get_value("httpcache/deduplicated") == 2
+
+    # The shared body is deleted with the last entry pointing at it
+    store(storage, spider, urls[0], b"changed")
+    store(storage, spider, urls[1], b"changed")
+    assert refs() == 1
+    store(storage, spider, urls[2], b"changed")
+    assert refs() is None
+    assert storage.db.execute("SELECT COUNT(*) FROM bodies").fetchone()[0] == 1
+    assert storage.retrieve_response(spider, Request(urls[2])).body == b"changed"
+    storage.close_spider(spider)
@@ -0,0 +1,120 @@
+"""Item pipelines: the delta export and the SQLite sink"""
+
+import json
+import logging
+import sqlite3
+from unittest import mock
+
+import pytest
+
+from scrapy import Request
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse
+
+from goodreads_scraper.items import BookItem, ReviewItem
+from goodreads_scraper.pipelines import DeltaExportPipeline, SqliteSinkPipeline
+
+BASE = "https://www.goodreads.com/book/show"
+
+
+def book_page(book_id, url=None, status=200, redirect_urls=None):
+    """Response to the page request of ``book_id``, answered from ``url``"""
+    request = Request(f"{BASE}/{book_id}", meta={"book_id": book_id})
+    if redirect_urls:
+        request.meta["redirect_urls"] = redirect_urls
+    return HtmlResponse(url or request.url, status=status, body=b"", request=request)
+
+
+def delta_run(tmp_path, pages, not_found=()):
+    """Run the delta export over ``pages`` of (response, items)
+
+    The callback of the pages in ``not_found`` flags them as missing. Returns
+    the run's changelog.
+    """
+    pipeline = DeltaExportPipeline(
+        str(tmp_path / "delta.sqlite"), str(tmp_path / "changes"), [], False
+    )
+    pipeline.stats = mock.Mock()
+    spider = mock.Mock(logger=logging.getLogger("test"))
+    spider.name = "books"
+    pipeline.open_spider(spider)
+    for response, items in pages:
+        pipeline.response_received(response, response.request, spider)
+        if response in not_found:
+            response.meta["not_found"] = True
+        for item in items:
+            with pytest.raises(DropItem):
+                pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+
+    with open(pipeline.changelog.name, encoding="utf-8") as f:
+        return sorted((c["op"], c["key"]) for c in map(json.loads, f))
+
+
+def test_delta_deletes_books_that_are_gone_or_redirected(tmp_path):
+    books = [BookItem(book_id=i, title=f"Book {i}") for i in range(5)]
+    first = delta_run(tmp_path, [(book_page(i), [books[i]]) for i in range(5)])
+    assert first == [("insert", str(i)) for i in range(5)]
+
+    flagged = book_page(1)
+    second = delta_run(
+        tmp_path,
+        [
+            (book_page(0), [books[0]]),
+            (flagged, []),
+            # Scraped under the old ID from the page it redirected to
+            (
+                book_page(2, url=f"{BASE}/20", redirect_urls=[f"{BASE}/2"]),
+                [BookItem(book_id=2, title="Book 20")],
+            ),
+            (book_page(3, status=404), []),
+            # Redirected to its own slug URL: still the same book
+            (
+                book_page(4, url=f"{BASE}/4.Book_4", redirect_urls=[f"{BASE}/4"]),
+                [books[4]],
+            ),
+        ],
+        not_found=[flagged],
+    )
+    assert second == [("delete", "1"), ("delete", "2"), ("delete", "3")]
+
+
+def rows(path, sql):
+    """Rows committed to the sink database so far, read on a second connection"""
+    with sqlite3.connect(path) as db:
+        return db.execute(sql).fetchall()
+
+
+def test_sqlite_sink_upserts_in_batches_and_commits_on_close(tmp_path):
+    path = str(tmp_path / "sink.sqlite")
+    pipeline = SqliteSinkPipeline(path, batch_size=3)
+    pipeline.stats = mock.Mock()
+    spider = mock.Mock(logger=logging.getLogger("test"))
+    pipeline.open_spider(spider)
+    books = "SELECT book_id, title FROM books ORDER BY book_id"
+    reviews = "SELECT review_id, rating FROM reviews ORDER BY review_id"
+
+    pipeline.process_item(BookItem(book_id=1, title="Old title"), spider)
+    pipeline.process_item(ReviewItem(review_id="r1", book_id=1, rating=2), spider)
+    assert rows(path, books) == []
+    pipeline.process_item(BookItem(book_id=2, title="Other"), spider)
+    assert rows(path, books) == [(1, "Old title"), (2, "Other")]
+    assert rows(path, reviews) == [("r1", 2.0)]
+
+    # Seen again: updated in place on the next flush, not added twice
+    pipeline.process_item(BookItem(book_id=1, title="New title"), spider)
+    pipeline.flush()
+    assert rows(path, books) == [(1, "New title"), (2, "Other")]
+    pipeline.process_item(ReviewItem(review_id="r1", book_id=1, rating=5), spider)
+    pipeline.process_item(ReviewItem(review_id="r2", book_id=2, rating=4), spider)
+    assert rows(path, reviews) == [("r1", 2.0)]
+
+    pipeline.close_spider(spider)
+    assert rows(path, reviews) == [("r1", 5.0), ("r2", 4.0)]
+    assert {"books_author", "reviews_book_id"} <= {
+        name for (name,) in rows(path, "SELECT name FROM sqlite_master")
+    }
+    pipeline.stats.inc_value.assert_any_call("sqlite_sink/books", 1)
+    assert pipeline.stats.inc_value.call_args_list.count(
+        mock.call("sqlite_sink/batches")
+    ) == 3
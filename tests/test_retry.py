@@ -0,0 +1,105 @@
+"""StatusRetryMiddleware: failure classes, delays and the retry budget"""
+
+import logging
+import time
+from email.utils import formatdate
+from unittest import mock
+
+import pytest
+from scrapy import Request
+from scrapy.http import Response
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from twisted.internet.error import TimeoutError
+
+from goodreads_scraper import settings as project_settings
+from goodreads_scraper.middlewares import StatusRetryMiddleware
+
+URL = "https://www.goodreads.com/book/show/1"
+
+
+@pytest.fixture
+def delays():
+    """Delays the middleware waited; each retry fires at once"""
+    waited = []
+
+    def defer_later(reactor, delay, function):
+        waited.append(delay)
+        return function()
+
+    with mock.patch("goodreads_scraper.middlewares.task.deferLater", defer_later):
+        yield waited
+
+
+def retry_middleware(**overrides):
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.update(overrides)
+    crawler = mock.Mock(settings=settings)
+    crawler.stats = MemoryStatsCollector(crawler)
+    spider = mock.Mock(crawler=crawler, logger=logging.getLogger("test"))
+    return StatusRetryMiddleware.from_crawler(crawler), spider
+
+
+def respond(middleware, spider, status, request=None, **headers):
+    request = request or Request(URL)
+    response = Response(URL, status=status, headers=headers, request=request)
+    return middleware.process_response(request, response, spider)
+
+
+def test_permanent_statuses_are_never_retried(delays):
+    middleware, spider = retry_middleware(RETRY_HTTP_CODES=[404, 500])
+    result = respond(middleware, spider, 404)
+
+    assert isinstance(result, Response) and result.status == 404
+    assert spider.crawler.stats.get_value("retry/permanent") == 1
+    assert delays == []
+
+
+def test_throttled_status_waits_for_retry_after(delays):
+    middleware, spider = retry_middleware()
+    result = respond(middleware, spider, 429, **{"Retry-After": "7"})
+
+    assert isinstance(result, Request) and result.meta["retry_times"] == 1
+    assert delays == [7.0]
+    assert spider.crawler.stats.get_value("retry/throttled") == 1
+    assert spider.crawler.stats.get_value("retry/backoff_ms") == 7000
+
+
+def test_retry_after_as_an_http_date(delays):
+    middleware, spider = retry_middleware()
+    date = formatdate(time.time() + 30, usegmt=True)
+    respond(middleware, spider, 503, **{"Retry-After": date})
+    later = formatdate(time.time() + 3600, usegmt=True)
+    respond(middleware, spider, 503, **{"Retry-After": later})
+    past = formatdate(time.time() - 60, usegmt=True)
+    respond(middleware, spider, 503, **{"Retry-After": past})
+
+    # Whole seconds in the date; capped at RETRY_BACKOFF_MAX; none once past
+    assert 28 <= delays[0] <= 30
+    assert delays[1] == 60.0
+    assert len(delays) == 2
+
+
+def test_transient_failures_back_off_exponentially(delays):
+    middleware, spider = retry_middleware(RETRY_TIMES=10)
+    # Full jitter draws from [0, cap]; take the cap
+    with mock.patch("goodreads_scraper.middlewares.random.uniform", max):
+        request = Request(URL)
+        for _ in range(8):
+            request = respond(middleware, spider, 500, request=request)
+        middleware.process_exception(request, TimeoutError(), spider)
+
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0, 60.0]
+
+
+def test_retries_stop_once_the_budget_is_spent(delays):
+    middleware, spider = retry_middleware(RETRY_BUDGET=2)
+    results = [respond(middleware, spider, 500) for _ in range(3)]
+
+    assert [type(result) for result in results] == [Request, Request, Response]
+    assert middleware.process_exception(Request(URL), TimeoutError(), spider) is None
+    stats = spider.crawler.stats
+    assert stats.get_value("retry/budget_spent") == 2
+    assert stats.get_value("retry/budget_remaining") == 0
+    assert stats.get_value("retry/budget_exhausted") == 2
@@ -0,0 +1,125 @@
+"""Review pagination against the local fixture site"""
+
+import json
+import sqlite3
+
+import pytest
+
+from fixture_site import PAGES, REVIEW_SPIDERS as SPIDERS, crawl as crawl_items
+
+
+def crawl(tmp_path, spider, base_url, end_id=1, **overrides):
+    """Run ``spider`` on the fixture site; return (review IDs, log)"""
+    items, log = crawl_items(tmp_path, spider, base_url, end_id, **overrides)
+    return [item["review_id"] for item in items], log
+
+
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_follows_cursor_to_the_last_page(tmp_path, server, spider):
+    review_ids, _ = crawl(tmp_path, spider, server)
+    assert sorted(review_ids) == sorted(
+        f"kca://review/{i}" for page in PAGES for i in page
+    )
+
+
+@pytest.mark.parametrize("server", ["ignore_cursor"], indirect=True)
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_stops_when_the_cursor_is_ignored(tmp_path, server, spider):
+    review_ids, log = crawl(tmp_path, spider, server)
+    # Page 2 repeats page 1: dropped, and the walk stops there
+    assert sorted(review_ids) == [f"kca://review/{i}" for i in PAGES[0]]
+    assert "'reviews/cursor_ignored': 1" in log
+
+
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_stops_at_page_and_review_budgets(tmp_path, server, spider):
+    review_ids, _ = crawl(tmp_path, spider, server, REVIEW_PAGE_BUDGET=2)
+    assert len(review_ids) == 6
+
+    review_ids, _ = crawl(tmp_path, spider, server, MAX_REVIEWS_PER_BOOK=4)
+    assert sorted(review_ids) == [f"kca://review/{i}" for i in range(1, 5)]
+
+
+def frontier_states(tmp_path, spider, server, **overrides):
+    """Crawl books 1-2 through a frontier; return {book_id: state}"""
+    path = tmp_path / "frontier.sqlite"
+    crawl(
+        tmp_path,
+        spider,
+        server,
+        end_id=2,
+        FRONTIER_ENABLED=True,
+        FRONTIER_FILE=str(path),
+        NEGATIVE_CACHE_ENABLED=True,
+        NEGATIVE_CACHE_FILE=str(tmp_path / "negative.sqlite"),
+        **overrides,
+    )
+    with sqlite3.connect(path) as db:
+        return dict(db.execute("SELECT book_id, state FROM frontier"))
+
+
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_records_outcomes_once_all_pages_are_done(tmp_path, server, spider):
+    # Book 2 answers 404, which only reaches spider middlewares as an exception
+    assert frontier_states(tmp_path, spider, server) == {1: "done", 2: "not_found"}
+    with sqlite3.connect(tmp_path / "negative.sqlite") as db:
+        assert list(db.execute("SELECT book_id, reason FROM dead_books")) == [
+            (2, "not_found")
+        ]
+
+
+@pytest.mark.parametrize("server", ["fail_reviews"], indirect=True)
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_failed_review_page_fails_the_book(tmp_path, server, spider):
+    states = frontier_states(tmp_path, spider, server, RETRY_ENABLED=False)
+    # Released for another attempt rather than recorded as done
+    assert states[1] in ("pending", "failed")
+
+
+def delta_changes(tmp_path, spider, base_url, **overrides):
+    """Crawl with the delta export on; return the run's changelog entries"""
+    changelog = tmp_path / "changelog"
+    before = set(changelog.glob("*.jl"))
+    crawl(
+        tmp_path,
+        spider,
+        base_url,
+        DELTA_ENABLED=True,
+        DELTA_STATE_FILE=str(tmp_path / "delta.sqlite"),
+        DELTA_CHANGELOG_DIR=str(changelog),
+        **overrides,
+    )
+    (path,) = set(changelog.glob("*.jl")) - before
+    with open(path, encoding="utf-8") as f:
+        return [(c["op"], c["key"]) for c in map(json.loads, f)]
+
+
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_delta_deletes_only_reviews_a_full_walk_missed(tmp_path, server, spider):
+    changes = delta_changes(tmp_path, spider, server)
+    assert sorted(changes) == sorted(
+        ("insert", f"kca://review/{i}") for page in PAGES for i in page
+    )
+
+    # A capped walk cannot tell deleted reviews from unread ones
+    assert delta_changes(tmp_path, spider, server + "/v2", MAX_REVIEWS_PER_BOOK=4) == []
+
+    # A full walk can; the new book title is not a change to its reviews
+    changes = delta_changes(tmp_path, spider, server + "/v2")
+    assert changes == [("delete", "kca://review/6")]
+
+
+@pytest.mark.parametrize("spider", SPIDERS[:1])
+def test_dedup_drops_reviews_of_earlier_runs(tmp_path, server, spider):
+    dedup = {
+        "REVIEW_DEDUP_ENABLED": True,
+        "REVIEW_DEDUP_FILE": str(tmp_path / "reviews.bloom"),
+        "REVIEW_DEDUP_CAPACITY": 1000,
+    }
+    review_ids, _ = crawl(tmp_path, spider, server, **dedup)
+    assert len(review_ids) == 7
+
+    # The revised edition has no new reviews, and the overwritten feed is empty
+    review_ids, log = crawl(tmp_path, spider, server + "/v2", **dedup)
+    assert review_ids == []
+    assert "only hold reviews that no earlier run scraped" in log
@@ -0,0 +1,52 @@
+"""Merging the part files of a sharded crawl"""
+
+import csv
+
+from run_spiders import merge_csv
+
+HEADER = ["review_id", "book_id", "review_text"]
+
+
+def write_part(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([HEADER, *rows])
+    return str(path)
+
+
+def test_parts_are_merged_sorted_and_deduplicated(tmp_path):
+    long_text = "A very long review. " * 20_000  # beyond csv's 128 KiB default
+    parts = [
+        write_part(
+            tmp_path / "a.csv",
+            [["r3", "10", "x"], ["r1", "2", long_text], ["r2", "2", "y"]],
+        ),
+        write_part(tmp_path / "b.csv", [["r9", "9", "z"], ["r1", "2", long_text]]),
+        write_part(tmp_path / "empty.csv", []),
+    ]
+    (tmp_path / "none.csv").touch()
+    parts.append(str(tmp_path / "none.csv"))
+
+    out = tmp_path / "merged.csv"
+    # Two rows per sorted run, so the parts are read in several chunks
+    assert merge_csv(str(out), parts, chunk_rows=2) == 4
+
+    with open(out, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        HEADER,
+        ["r1", "2", long_text],
+        ["r2", "2", "y"],
+        ["r9", "9", "z"],
+        ["r3", "10", "x"],
+    ]
+    # Only the parts and the merged file are left
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "a.csv", "b.csv", "empty.csv", "merged.csv", "none.csv"
+    ]
+
+
+def test_nothing_scraped_leaves_an_empty_file(tmp_path):
+    (tmp_path / "none.csv").touch()
+    out = tmp_path / "merged.csv"
+    assert merge_csv(str(out), [str(tmp_path / "none.csv")]) == 0
+    assert out.read_text() == ""